@@ -0,0 +1,106 @@
+import collections
+import threading
+
+import numpy as np
+
+MODES = ("threshold", "zscore", "ewma")
+
+
+class AnomalyDetector:
+    """Online anomaly detector doing O(1) work per reading.
+
+    Modes:
+        threshold  reading above a fixed value
+        zscore     reading more than ``z`` std devs from the rolling window
+        ewma       reading more than ``z`` std devs from an exponentially
+                   weighted mean/variance
+
+    State is kept as arrays over ``meters`` meters, so a whole tick is
+    scored with a handful of vectorized operations. Only the ``keep`` most
+    recent anomalies per meter are retained, so reading them back costs
+    O(keep) whatever the uptime.
+    """
+
+    def __init__(self, mode="threshold", threshold=180, window=60, z=3.0,
+                 alpha=0.1, min_periods=10, keep=50, meters=1):
+        if mode not in MODES:
+            raise ValueError(f"unknown anomaly mode {mode!r}, expected one of {MODES}")
+        self.mode = mode
+        self.threshold = threshold
+        self.z = z
+        self.alpha = alpha
+        self.min_periods = min_periods
+        self.keep = keep
+        self.recent = {}  # meter -> deque of its latest anomalies
+        self._lock = threading.Lock()
+
+        # Rolling window state (zscore)
+        self._window = np.zeros((window, meters), dtype=np.float64)
+        self._sum = np.zeros(meters)
+        self._sumsq = np.zeros(meters)
+        # Exponentially weighted state (ewma)
+        self._mean = np.zeros(meters)
+        self._var = np.zeros(meters)
+        self.count = 0
+
+    def update(self, timestamp, values):
+        """Feed one tick (one value per meter); return its anomaly records"""
+        values = np.atleast_1d(np.asarray(values, dtype=np.float64))
+        scores = self._score(values)
+        self._learn(values)
+        if scores is None:
+            return []
+        anomalies = [
+            {"timestamp": timestamp, "meter": meter, "consumption": value, "score": round(score, 3)}
+            for meter, value, score in zip(np.flatnonzero(~np.isnan(scores)).tolist(),
+                                           values[~np.isnan(scores)].tolist(),
+                                           scores[~np.isnan(scores)].tolist())
+        ]
+        with self._lock:
+            for anomaly in anomalies:
+                recent = self.recent.get(anomaly["meter"])
+                if recent is None:
+                    recent = self.recent[anomaly["meter"]] = collections.deque(maxlen=self.keep)
+                recent.append(anomaly)
+        return anomalies
+
+    def anomalies(self, limit=None, meter=0):
+        """Most recent anomalies of one meter, oldest first"""
+        with self._lock:
+            items = list(self.recent.get(meter, ()))
+        return items[-limit:] if limit else items
+
+    def _score(self, values):
+        """Score per meter, NaN where the reading is not anomalous"""
+        if self.mode == "threshold":
+            return np.where(values > self.threshold, values, np.nan)
+
+        if self.count < self.min_periods:
+            return None
+        if self.mode == "zscore":
+            n = min(self.count, len(self._window))
+            mean = self._sum / n
+            var = np.maximum(self._sumsq / n - mean * mean, 0.0)
+        else:
+            mean, var = self._mean, self._var
+        std = np.sqrt(var)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (values - mean) / std
+        return np.where((std > 0) & (np.abs(z) > self.z), z, np.nan)
+
+    def _learn(self, values):
+        if self.mode == "zscore":
+            i = self.count % len(self._window)
+            old = self._window[i].copy()  # zeros until the window has filled
+            self._window[i] = values
+            self._sum += values - old
+            self._sumsq += values * values - old * old
+        elif self.mode == "ewma":
+            if self.count == 0:
+                self._mean[:] = values
+            else:
+                diff = values - self._mean
+                incr = self.alpha * diff
+                self._mean += incr
+                self._var = (1 - self.alpha) * (self._var + diff * incr)
+        self.count += 1
@@ -0,0 +1,281 @@
+import bisect
+import glob
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"ANOMLOG2"
+RECORD = np.dtype([("timestamp", "<i8"), ("meter", "<i8"), ("consumption", "<f8"), ("score", "<f8")])
+INDEX_ENTRY = np.dtype([("timestamp", "<i8"), ("offset", "<i8")])
+FSYNC_POLICIES = ("always", "interval", "never")
+
+
+def to_micros(timestamp):
+    """ISO string / datetime -> int64 microseconds since the epoch"""
+    return int(np.datetime64(timestamp, "us").astype(np.int64))
+
+
+class Segment:
+    """One append-only file of fixed-size records plus its sparse index"""
+
+    def __init__(self, path):
+        self.path = path
+        self.index_path = path[:-len(".bin")] + ".idx"
+        self.index_ts = []
+        self.index_offsets = []
+        self.refresh()
+
+    def refresh(self):
+        """Load the index entries appended since the last call"""
+        try:
+            size = os.path.getsize(self.index_path)
+        except FileNotFoundError:
+            return
+        known = len(self.index_ts) * INDEX_ENTRY.itemsize
+        size -= size % INDEX_ENTRY.itemsize  # skip a torn entry
+        if size <= known:
+            return
+        with open(self.index_path, "rb") as f:
+            f.seek(known)
+            entries = np.frombuffer(f.read(size - known), dtype=INDEX_ENTRY)
+        self.index_offsets.extend(entries["offset"].tolist())
+        self.index_ts.extend(entries["timestamp"].tolist())
+
+    @property
+    def first_ts(self):
+        return int(os.path.basename(self.path)[len("segment-"):-len(".bin")])
+
+    def read(self, start, end, limit, meter=None):
+        """Records with start <= timestamp <= end, seeking via the sparse index"""
+        # Last entry strictly before ``start``: several records (one per
+        # meter) can share a timestamp, and the entry may point past some
+        i = bisect.bisect_left(self.index_ts, start) - 1
+        offset = self.index_offsets[i] if i >= 0 else len(MAGIC)
+        chunks, found = [], 0
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while found < limit:
+                raw = f.read(RECORD.itemsize * 4096)
+                raw = raw[:len(raw) - len(raw) % RECORD.itemsize]  # skip a torn tail
+                if not raw:
+                    break
+                records = np.frombuffer(raw, dtype=RECORD)
+                mask = (records["timestamp"] >= start) & (records["timestamp"] <= end)
+                if meter is not None:
+                    mask &= records["meter"] == meter
+                chunk = records[mask]
+                chunks.append(chunk[:limit - found])
+                found += len(chunks[-1])
+                if records["timestamp"][-1] > end:
+                    break
+        return np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD)
+
+    def read_tail(self, limit, meter=None):
+        """The ``limit`` newest records, reading the file backwards"""
+        chunks, found = [], 0
+        with open(self.path, "rb") as f:
+            end = f.seek(0, os.SEEK_END)
+            end -= (end - len(MAGIC)) % RECORD.itemsize  # skip a torn tail
+            while found < limit and end > len(MAGIC):
+                start = max(len(MAGIC), end - RECORD.itemsize * 4096)
+                f.seek(start)
+                records = np.frombuffer(f.read(end - start), dtype=RECORD)
+                if meter is not None:
+                    records = records[records["meter"] == meter]
+                chunks.append(records[max(len(records) - (limit - found), 0):])
+                found += len(chunks[-1])
+                end = start
+        return np.concatenate(chunks[::-1]) if chunks else np.empty(0, dtype=RECORD)
+
+
+class AnomalyStore:
+    """Anomaly log written by a background thread in batches.
+
+    Anomalies are queued by the ingest thread and written as fixed-size
+    binary records to append-only segment files. The segment rotates once
+    it grows past ``max_segment_bytes``. Every ``index_every`` records, a
+    (timestamp, offset) entry goes to a sidecar ``.idx`` file, so range
+    queries seek close to their start instead of scanning the whole log.
+
+    ``fsync`` is one of ``always`` (after every batch), ``interval`` (at
+    most every ``fsync_interval`` seconds) or ``never`` (leave it to the OS).
+
+    A ``readonly`` store starts no writer, so other processes can read a
+    log kept by the producer. Sealed segments and their indexes are loaded
+    once; a query only lists the directory again when it has changed (a
+    rotation or a removal) and reads the new index entries of the active
+    segment.
+    """
+
+    def __init__(self, directory, batch_size=256, flush_interval=1.0, fsync="interval",
+                 fsync_interval=5.0, max_segment_bytes=16 * 1024 * 1024, max_segments=0,
+                 index_every=128, queue_size=10000, readonly=False):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"unknown fsync policy {fsync!r}, expected one of {FSYNC_POLICIES}")
+        self.directory = directory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.index_every = index_every
+        self.readonly = readonly
+        self.written = 0
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()  # guards the segment list and indexes
+        self._segments = []
+        self._listed = None  # directory mtime at the last listing (readonly)
+        self._refresh_segments()
+        self._file = None
+        self._index_file = None
+        self._last_fsync = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+        if not readonly:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def submit(self, anomaly):
+        """Queue an anomaly without blocking; drop it if the writer is behind"""
+        try:
+            self._queue.put_nowait((to_micros(anomaly["timestamp"]), anomaly.get("meter", 0),
+                                    anomaly["consumption"], anomaly.get("score", 0.0)))
+        except queue.Full:
+            self.dropped += 1
+
+    def query(self, start=None, end=None, limit=1000, meter=None):
+        """Anomalies in [start, end], oldest first, as JSON-ready records"""
+        start = to_micros(start) if start is not None else np.iinfo(np.int64).min
+        end = to_micros(end) if end is not None else np.iinfo(np.int64).max
+        segments = self._current_segments()
+        firsts = [s.first_ts for s in segments]
+        chunks, found = [], 0
+        # Start from the last segment beginning strictly before ``start``: a
+        # rotation can split the records sharing one timestamp across segments
+        for segment in segments[max(bisect.bisect_left(firsts, start) - 1, 0):]:
+            if segment.first_ts > end or found >= limit:
+                break
+            chunk = segment.read(start, end, limit - found, meter)
+            chunks.append(chunk)
+            found += len(chunk)
+        return self._to_json(np.concatenate(chunks) if chunks else np.empty(0, dtype=RECORD))
+
+    def tail(self, limit=50, meter=None):
+        """The ``limit`` most recent anomalies, oldest first"""
+        chunks, found = [], 0
+        for segment in reversed(self._current_segments()):
+            if found >= limit:
+                break
+            chunks.append(segment.read_tail(limit - found, meter))
+            found += len(chunks[-1])
+        return self._to_json(np.concatenate(chunks[::-1]) if chunks else np.empty(0, dtype=RECORD))
+
+    def _current_segments(self):
+        with self._lock:
+            if self.readonly:
+                # Another process writes the log: pick up new segments and index entries
+                self._refresh_segments()
+            return list(self._segments)
+
+    def _refresh_segments(self):
+        mtime = os.stat(self.directory).st_mtime_ns
+        # A change within the clock resolution may not move the mtime: list again
+        if mtime != self._listed or time.time_ns() - mtime < 1_000_000_000:
+            self._listed = mtime
+            if self._segments:
+                # The previous active segment may have been sealed since its last refresh
+                self._segments[-1].refresh()
+            known = {segment.path: segment for segment in self._segments}
+            self._segments = [known.get(p) or Segment(p)
+                              for p in sorted(glob.glob(os.path.join(self.directory, "segment-*.bin")))]
+        if self._segments:
+            # Only the active segment still grows
+            self._segments[-1].refresh()
+
+    @staticmethod
+    def _to_json(records):
+        timestamps = np.datetime_as_string(records["timestamp"].astype("datetime64[us]"), unit="us")
+        return [
+            {"timestamp": ts, "meter": meter, "consumption": value, "score": score}
+            for ts, meter, value, score in zip(timestamps.tolist(), records["meter"].tolist(),
+                                               records["consumption"].tolist(), records["score"].tolist())
+        ]
+
+    def close(self):
+        """Flush pending anomalies and stop the writer thread"""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            if batch:
+                self._write(np.array(batch, dtype=RECORD))
+        if self._file:
+            self._sync()
+            self._file.close()
+            self._index_file.close()
+
+    def _write(self, records):
+        with self._lock:
+            if self._file is None or self._file.tell() >= self.max_segment_bytes:
+                self._rotate(int(records["timestamp"][0]))
+            segment = self._segments[-1]
+            position = self._file.tell()
+            # Index every ``index_every``-th record of the segment
+            first = (position - len(MAGIC)) // RECORD.itemsize
+            for i in range(-first % self.index_every, len(records), self.index_every):
+                entry = (int(records["timestamp"][i]), position + i * RECORD.itemsize)
+                # Offsets first: readers bisect index_ts without taking the lock
+                segment.index_offsets.append(entry[1])
+                segment.index_ts.append(entry[0])
+                self._index_file.write(np.array([entry], dtype=INDEX_ENTRY).tobytes())
+            self._file.write(records.tobytes())
+            self._file.flush()
+            self._index_file.flush()
+            self.written += len(records)
+        if self.fsync == "always" or (
+                self.fsync == "interval" and time.monotonic() - self._last_fsync >= self.fsync_interval):
+            self._sync()
+
+    def _rotate(self, first_ts):
+        if self._file:
+            self._sync()
+            self._file.close()
+            self._index_file.close()
+        path = os.path.join(self.directory, f"segment-{first_ts:020d}.bin")
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._index_file = open(path[:-len(".bin")] + ".idx", "ab")
+        if not self._segments or self._segments[-1].path != path:
+            self._segments.append(Segment(path))
+        while self.max_segments and len(self._segments) > self.max_segments:
+            oldest = self._segments.pop(0)
+            os.remove(oldest.path)
+            if os.path.exists(oldest.index_path):
+                os.remove(oldest.index_path)
+
+    def _sync(self):
+        if self.fsync != "never":
+            os.fsync(self._file.fileno())
+            os.fsync(self._index_file.fileno())
+        self._last_fsync = time.monotonic()
@@ -1,44 +1,68 @@
-from flask import Flask, render_template, jsonify
-import pandas as pd
+from flask import Flask, Response, abort, render_template, jsonify, request, stream_with_context
 import numpy as np
-import datetime
+import json
+import queue
+import atexit
 import threading
-import time
 import os
 
+from downsampling import METHODS as DOWNSAMPLING_METHODS, downsample
+from events import Broadcaster, format_sse
+from ring_buffer import RingBuffer, to_records
+from settings import (BUFFER_CAPACITY, SHM_NAME, SIM_INTERVAL, SIM_METERS,
+                      create_anomaly_store, create_detector)
+from shared_buffer import SharedRingBuffer
+from simulator import MeterSimulator
+
 app = Flask(__name__)
 
 # -------------------------------
 # Simulated Live Data
 # -------------------------------
-df = pd.DataFrame(columns=["timestamp", "consumption"])
-ANOMALY_THRESHOLD = 180  # define anomaly threshold
-ANOMALY_LOG_FILE = "anomalies.log"
-
-# Ensure log file exists
-if not os.path.exists(ANOMALY_LOG_FILE):
-    open(ANOMALY_LOG_FILE, "w").close()
+WINDOW_SIZE = 500  # readings shown on the dashboard
+# Worker of a multi-worker server (see gunicorn.conf.py): producer.py owns the
+# simulator, detector and anomaly log, and this process only reads them
+SHARED = SHM_NAME is not None
+simulator = MeterSimulator(SIM_METERS, SIM_INTERVAL)
+broadcaster = Broadcaster()  # pushes every new reading to /stream clients
+if SHARED:
+    buffer = SharedRingBuffer.attach(SHM_NAME)
+    atexit.register(buffer.close)
+    detector = None
+    anomaly_store = create_anomaly_store(readonly=True)
+else:
+    # Simulated readings are integers, exact in float32 at half the memory per meter
+    buffer = RingBuffer(BUFFER_CAPACITY, meters=SIM_METERS, dtype=np.float32)
+    detector = create_detector()
+    anomaly_store = create_anomaly_store()
+    atexit.register(anomaly_store.close)
 
 def log_anomaly(row):
-    """Append anomaly to text file"""
-    with open(ANOMALY_LOG_FILE, "a") as f:
-        f.write(f"{row['timestamp']} - Anomaly detected: {row['consumption']}\n")
+    """Queue anomaly for the background log writer"""
+    anomaly_store.submit(row)
 
-def generate_data():
-    global df
-    while True:
-        timestamp = datetime.datetime.now()
-        consumption = np.random.randint(50, 200)
-        new_row = {"timestamp": timestamp, "consumption": consumption}
-        df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
+def delta_payload(since, meter=0, limit=WINDOW_SIZE):
+    """(cursor, JSON) of the readings of one meter after ``since``"""
+    cursor, timestamps, consumption = buffer.since(since, limit=limit, meter=meter)
+    return cursor, json.dumps({"cursor": cursor, "readings": to_records(timestamps, consumption)})
+
+def ingest(timestamp, consumption):
+    """Store one tick of readings (one value per meter)"""
+    buffer.append(timestamp, consumption)
 
-        # Check for anomaly
-        if consumption > ANOMALY_THRESHOLD:
-            log_anomaly(new_row)
+    # Serialize meter 0 once and push the same payload to every stream client
+    broadcaster.publish(delta_payload(buffer.total - 1))
 
-        time.sleep(2)  # new data every 2 seconds
+    # Check for anomaly
+    timestamp = np.datetime_as_string(np.datetime64(timestamp, "us"))
+    for anomaly in detector.update(timestamp, consumption):
+        log_anomaly(anomaly)
 
-threading.Thread(target=generate_data, daemon=True).start()
+def generate_data():
+    simulator.run(ingest)  # new data every SIM_INTERVAL seconds
+
+if not SHARED:
+    threading.Thread(target=generate_data, daemon=True).start()
 
 # -------------------------------
 # Routes
@@ -47,19 +71,124 @@ threading.Thread(target=generate_data, daemon=True).start()
 def index():
     return render_template("dashboard.html")
 
+def requested_meter():
+    meter = request.args.get("meter", 0, type=int)
+    if not 0 <= meter < SIM_METERS:
+        abort(404, description=f"unknown meter {meter}")
+    return meter
+
 @app.route("/data")
 def get_data():
-    global df
-    last_data = df.tail(500).copy()  # keep last 500 records
-    last_data["timestamp"] = last_data["timestamp"].astype(str)
-    return jsonify(last_data.to_dict(orient="records"))
+    """Latest ``window`` readings (default 500), at most ``max_points`` of them
+
+    ``downsample`` picks how the window is reduced to ``max_points``:
+    ``lttb`` (visual shape) or ``minmax`` (every peak kept).
+    """
+    meter = requested_meter()
+    since = request.args.get("since", type=int)
+    if since is None:
+        window = min(request.args.get("window", WINDOW_SIZE, type=int), buffer.capacity)
+        timestamps, consumption = buffer.tail(window, meter)  # keep last 500 records by default
+        max_points = request.args.get("max_points", type=int)
+        if max_points is not None:
+            method = request.args.get("downsample", "lttb")
+            if max_points < 3 or method not in DOWNSAMPLING_METHODS:
+                return jsonify({"error": f"max_points must be >= 3 and downsample one of {DOWNSAMPLING_METHODS}"}), 400
+            keep = downsample(timestamps.astype(np.int64), consumption, max_points, method)
+            timestamps, consumption = timestamps[keep], consumption[keep]
+        return jsonify(to_records(timestamps, consumption))
+
+    # Delta mode: only the readings the client has not seen yet
+    _, payload = delta_payload(since, meter)
+    return Response(payload, mimetype="application/json")
+
+@app.route("/stream")
+def stream():
+    """Server-Sent Events feed of new readings, resumable via Last-Event-ID"""
+    meter = requested_meter()
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    if SHARED:
+        return shared_stream(since, meter)
+    subscription = broadcaster.subscribe()
+
+    def events():
+        try:
+            cursor, data = delta_payload(since if since is not None else buffer.total - WINDOW_SIZE, meter)
+            yield format_sse(data, cursor)
+            while True:
+                try:
+                    event_cursor, data = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                if event_cursor <= cursor:
+                    continue  # already sent with the backlog
+                if event_cursor > cursor + 1 or meter != 0:
+                    # Dropped events while the client was slow, or another meter
+                    # than the pre-serialized one: read the delta from the buffer
+                    event_cursor, data = delta_payload(cursor, meter)
+                cursor = event_cursor
+                yield format_sse(data, cursor)
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def shared_stream(since, meter):
+    """/stream for a worker: poll the shared buffer counter for new rows"""
+    def events():
+        cursor, data = delta_payload(since if since is not None else buffer.total - WINDOW_SIZE, meter)
+        yield format_sse(data, cursor)
+        while True:
+            if not buffer.wait(cursor, timeout=15):
+                yield ": keep-alive\n\n"
+                continue
+            cursor, data = delta_payload(cursor, meter)
+            yield format_sse(data, cursor)
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/anomalies")
 def get_anomalies():
-    global df
-    anomalies = df[df['consumption'] > ANOMALY_THRESHOLD].tail(50).copy()
-    anomalies["timestamp"] = anomalies["timestamp"].astype(str)
-    return jsonify(anomalies.to_dict(orient="records"))
+    meter = requested_meter()
+    if SHARED:
+        return jsonify(anomaly_store.tail(50, meter))
+    return jsonify(detector.anomalies(50, meter))
+
+@app.route("/anomalies/history")
+def get_anomaly_history():
+    """Range query over the persisted anomaly log (ISO timestamps)"""
+    try:
+        records = anomaly_store.query(request.args.get("start"), request.args.get("end"),
+                                      limit=min(request.args.get("limit", 1000, type=int), 10000),
+                                      meter=request.args.get("meter", type=int))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(records)
+
+@app.route("/stats")
+def get_stats():
+    """Simulator throughput and anomaly log counters, for load testing"""
+    if SHARED:
+        # Counters of the producer process are not visible here
+        return jsonify({
+            "meters": buffer.meters,
+            "interval": SIM_INTERVAL,
+            "ticks": buffer.total,
+            "buffer_capacity": buffer.capacity,
+            "shared_buffer": buffer.name,
+            "worker_pid": os.getpid(),
+        })
+    return jsonify({
+        **simulator.stats(),
+        "buffer_capacity": BUFFER_CAPACITY,
+        "anomalies_written": anomaly_store.written,
+        "anomalies_dropped": anomaly_store.dropped,
+    })
 
 # -------------------------------
 # Run Flask
@@ -0,0 +1,73 @@
+import numpy as np
+
+# Time-series reduction methods: Largest-Triangle-Three-Buckets (visual
+# shape) or min/max per bucket (every peak kept). Same algorithms as
+# energy_predictor/utils/downsampling.py, kept here so the dashboard runs
+# on its own requirements; tests/test_downsampling.py fails if they diverge.
+METHODS = ("lttb", "minmax")
+
+
+def downsample(x, y, max_points, method="lttb"):
+    """Sorted indices of at most ``max_points`` points to draw (x, y)
+
+    ``lttb`` always keeps the first and last points; ``minmax`` keeps the
+    extremes of each bucket, which need not include them. The indices
+    also apply to the other columns of the series.
+    """
+    if method not in METHODS:
+        raise ValueError(f"unknown method {method!r}, expected one of {METHODS}")
+    if method == "minmax":
+        return minmax(y, max_points)
+    return lttb(x, y, max_points)
+
+
+def lttb(x, y, max_points):
+    """Largest-Triangle-Three-Buckets
+
+    Interior points are split into ``max_points - 2`` buckets; each keeps
+    the point forming the largest triangle with the previously selected
+    point and the mean of the next bucket. Only the selection, which
+    depends on the previous point, loops over the buckets.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)  # bucket i: [edges[i], edges[i + 1])
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # The last bucket is compared with the last point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, max_points):
+    """Minimum and maximum of each of ``max_points // 2`` buckets, in linear time"""
+    n = len(y)
+    if max_points >= n or max_points < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    starts = np.linspace(0, n, max_points // 2 + 1).astype(np.int64)[:-1]
+    sizes = np.diff(np.append(starts, n))
+    bucket = np.repeat(np.arange(len(starts)), sizes)
+
+    indices = []
+    for extreme in (np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)):
+        hits = np.flatnonzero(y == np.repeat(extreme, sizes))
+        # First occurrence of the extreme in each bucket
+        _, first = np.unique(bucket[hits], return_index=True)
+        indices.append(hits[first])
+    return np.unique(np.concatenate(indices))
@@ -0,0 +1,43 @@
+import queue
+import threading
+
+
+class Broadcaster:
+    """Fan out pre-serialized events to every connected stream client.
+
+    Each subscriber gets its own bounded queue; a client that stops reading
+    loses events instead of slowing down the producer, and catches up
+    through the ``since`` cursor when it reconnects.
+    """
+
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.maxsize)
+        with self._lock:
+            self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock:
+            self._subscribers.discard(q)
+
+    def publish(self, event):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for q in subscribers:
+            try:
+                q.put_nowait(event)
+            except queue.Full:
+                pass
+
+
+def format_sse(data, event_id=None):
+    """Encode one Server-Sent Events message"""
+    message = f"data: {data}\n\n"
+    if event_id is not None:
+        message = f"id: {event_id}\n" + message
+    return message
@@ -0,0 +1,31 @@
+"""Multi-worker deployment: ``gunicorn -c gunicorn.conf.py app:app``
+
+The master starts one producer process before forking the workers; every
+worker attaches to its shared-memory buffer instead of simulating its own
+data, so all of them serve the same readings and anomalies.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", 4))
+worker_class = "gthread"  # /stream holds a thread per client
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+
+_producer = None
+
+
+def on_starting(server):
+    global _producer
+    name = os.environ.setdefault("DASHBOARD_SHM_NAME", f"energy_dashboard_{os.getpid()}")
+    import producer
+    _producer = multiprocessing.Process(target=producer.run, args=(name,), name="dashboard-producer")
+    _producer.start()
+    producer.wait_ready(name, _producer)
+    server.log.info("Producer %s writing to shared buffer %s", _producer.pid, name)
+
+
+def on_exit(server):
+    if _producer is not None and _producer.is_alive():
+        _producer.terminate()
+        _producer.join(10)
@@ -0,0 +1,59 @@
+"""Single writer of the shared live buffer, for multi-worker servers.
+
+Runs the simulator, the anomaly detector and the anomaly log writer in one
+process and publishes every tick to a shared-memory ``SharedRingBuffer``
+that the web workers attach to (see gunicorn.conf.py).
+
+    DASHBOARD_SHM_NAME=energy_dashboard python producer.py
+"""
+import signal
+import sys
+import time
+
+import numpy as np
+
+from settings import BUFFER_CAPACITY, SHM_NAME, SIM_INTERVAL, SIM_METERS, create_anomaly_store, create_detector
+from shared_buffer import SharedRingBuffer
+from simulator import MeterSimulator
+
+
+def run(name):
+    """Produce readings into the segment ``name`` until SIGTERM/SIGINT"""
+    # Turn SIGTERM into SystemExit so the finally block below runs
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    buffer = SharedRingBuffer.create(name, BUFFER_CAPACITY, meters=SIM_METERS, dtype=np.float32)
+    detector = create_detector()
+    anomaly_store = create_anomaly_store()
+    simulator = MeterSimulator(SIM_METERS, SIM_INTERVAL)
+
+    def ingest(timestamp, consumption):
+        buffer.append(timestamp, consumption)
+        timestamp = np.datetime_as_string(np.datetime64(timestamp, "us"))
+        for anomaly in detector.update(timestamp, consumption):
+            anomaly_store.submit(anomaly)
+
+    try:
+        simulator.run(ingest)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        anomaly_store.close()
+        buffer.close()
+
+
+def wait_ready(name, process, timeout=10.0):
+    """Block until the producer ``process`` has created its segment"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not process.is_alive():
+            raise RuntimeError(f"producer exited with code {process.exitcode}")
+        try:
+            SharedRingBuffer.attach(name, timeout=0).close()
+            return
+        except FileNotFoundError:
+            time.sleep(0.05)
+    raise TimeoutError(f"shared buffer {name!r} not created after {timeout}s")
+
+
+if __name__ == "__main__":
+    run(SHM_NAME or "energy_dashboard")
@@ -0,0 +1,67 @@
+import threading
+
+import numpy as np
+
+
+class RingBuffer:
+    """Fixed-capacity columnar buffer of (timestamp, consumption) readings.
+
+    Each row holds one timestamp and the consumption of ``meters`` meters
+    (row-major, so appending a tick is one contiguous write and reading a
+    meter is a strided column view).
+
+    Every row is written twice, at ``i`` and ``i + capacity``, so the
+    most recent ``n <= capacity`` rows always sit in one contiguous
+    slice and can be handed out as NumPy views without copying.
+    """
+
+    def __init__(self, capacity, meters=1, dtype=np.float64):
+        if capacity <= 0 or meters <= 0:
+            raise ValueError("capacity and meters must be positive")
+        self.capacity = capacity
+        self.meters = meters
+        self.timestamps = np.zeros(2 * capacity, dtype="datetime64[us]")
+        self.consumption = np.zeros((2 * capacity, meters), dtype=dtype)
+        self.total = 0  # number of rows ever appended
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, timestamp, consumption):
+        """Store one row (a scalar or one value per meter) in O(meters)"""
+        with self._lock:
+            i = self.total % self.capacity
+            ts = np.datetime64(timestamp, "us")
+            self.timestamps[i] = self.timestamps[i + self.capacity] = ts
+            self.consumption[i] = self.consumption[i + self.capacity] = consumption
+            self.total += 1
+
+    def tail(self, n, meter=0):
+        """Return views on the ``n`` most recent (timestamps, consumption)"""
+        with self._lock:
+            n = min(n, len(self))
+            end = self.total % self.capacity + self.capacity
+            return self.timestamps[end - n:end], self.consumption[end - n:end, meter]
+
+    def since(self, cursor, limit=None, meter=0):
+        """Return (cursor, timestamps, consumption) for rows after ``cursor``
+
+        ``cursor`` is the row count a client has already seen; rows that
+        have been overwritten in the meantime are skipped.
+        """
+        with self._lock:
+            total = self.total
+            n = max(0, total - max(cursor, 0))
+            n = min(n, len(self), limit if limit is not None else n)
+            end = total % self.capacity + self.capacity
+            return total, self.timestamps[end - n:end], self.consumption[end - n:end, meter]
+
+
+def to_records(timestamps, consumption):
+    """Serialize buffer views into the JSON records served to the dashboard"""
+    return [
+        {"timestamp": ts, "consumption": value}
+        for ts, value in zip(np.datetime_as_string(timestamps, unit="us").tolist(),
+                             consumption.tolist())
+    ]
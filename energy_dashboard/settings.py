@@ -0,0 +1,35 @@
+import os
+
+from anomaly_detector import AnomalyDetector
+from anomaly_store import AnomalyStore
+
+# -------------------------------
+# Shared by the app and the producer process
+# -------------------------------
+SIM_METERS = int(os.getenv("SIM_METERS", 1))  # simulated meters
+SIM_INTERVAL = float(os.getenv("SIM_INTERVAL", 2))  # seconds between ticks
+BUFFER_CAPACITY = int(os.getenv("BUFFER_CAPACITY", 10000))  # ticks kept in memory
+ANOMALY_THRESHOLD = 180  # define anomaly threshold
+# Shared-memory segment of the producer; unset runs everything in-process
+SHM_NAME = os.getenv("DASHBOARD_SHM_NAME")
+
+
+def create_detector():
+    return AnomalyDetector(
+        mode=os.getenv("ANOMALY_MODE", "threshold"),  # threshold, zscore or ewma
+        threshold=ANOMALY_THRESHOLD,
+        window=int(os.getenv("ANOMALY_WINDOW", 60)),
+        z=float(os.getenv("ANOMALY_Z", 3.0)),
+        alpha=float(os.getenv("ANOMALY_EWMA_ALPHA", 0.1)),
+        meters=SIM_METERS,
+    )
+
+
+def create_anomaly_store(readonly=False):
+    return AnomalyStore(
+        os.getenv("ANOMALY_LOG_DIR", "anomaly_log"),
+        fsync=os.getenv("ANOMALY_LOG_FSYNC", "interval"),  # always, interval or never
+        max_segment_bytes=int(os.getenv("ANOMALY_LOG_SEGMENT_BYTES", 16 * 1024 * 1024)),
+        max_segments=int(os.getenv("ANOMALY_LOG_MAX_SEGMENTS", 0)),  # 0 keeps every segment
+        readonly=readonly,
+    )
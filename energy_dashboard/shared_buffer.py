@@ -0,0 +1,118 @@
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+# Header slots (int64) at the start of the segment
+STARTED, TOTAL, CAPACITY, METERS, DTYPE = range(5)
+HEADER_SLOTS = 8
+
+
+class SharedRingBuffer:
+    """RingBuffer living in a ``multiprocessing.shared_memory`` segment.
+
+    One producer process appends; any number of worker processes attach by
+    name and read. The layout is the one of ``RingBuffer`` (every row
+    mirrored at ``i`` and ``i + capacity``) behind a small int64 header.
+
+    Two counters replace the lock. ``started`` is bumped before a row is
+    written and ``total`` once it is complete. A reader copies the window
+    it needs (never the whole series) and keeps it if the writes started
+    meanwhile cannot have reached it, retrying otherwise. Reading ``n``
+    rows therefore only retries when ``capacity - n`` rows were appended
+    during the copy.
+    """
+
+    def __init__(self, shm, owner):
+        self._shm = shm
+        self.owner = owner
+        self.name = shm.name
+        self._header = np.ndarray(HEADER_SLOTS, dtype=np.int64, buffer=shm.buf)
+        self.capacity = int(self._header[CAPACITY])
+        self.meters = int(self._header[METERS])
+        dtype = np.dtype(chr(self._header[DTYPE]))
+        offset = self._header.nbytes
+        self.timestamps = np.ndarray(2 * self.capacity, dtype="datetime64[us]", buffer=shm.buf, offset=offset)
+        offset += self.timestamps.nbytes
+        self.consumption = np.ndarray((2 * self.capacity, self.meters), dtype=dtype, buffer=shm.buf, offset=offset)
+
+    @classmethod
+    def create(cls, name, capacity, meters=1, dtype=np.float64):
+        """Allocate the segment (producer side)"""
+        if capacity <= 0 or meters <= 0:
+            raise ValueError("capacity and meters must be positive")
+        dtype = np.dtype(dtype)
+        size = 8 * HEADER_SLOTS + 2 * capacity * (8 + meters * dtype.itemsize)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray(HEADER_SLOTS, dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[CAPACITY], header[METERS], header[DTYPE] = capacity, meters, ord(dtype.char)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name, timeout=10.0):
+        """Open an existing segment (worker side), waiting for the producer to create it"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                shm = shared_memory.SharedMemory(name=name)
+                break
+            except FileNotFoundError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        # Only the producer may unlink the segment; before Python 3.13 the
+        # resource tracker would otherwise remove it when a worker exits
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return cls(shm, owner=False)
+
+    @property
+    def total(self):
+        """Number of rows ever appended"""
+        return int(self._header[TOTAL])
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def append(self, timestamp, consumption):
+        """Store one row (producer only)"""
+        total = self.total
+        self._header[STARTED] = total + 1
+        i = total % self.capacity
+        self.timestamps[i] = self.timestamps[i + self.capacity] = np.datetime64(timestamp, "us")
+        self.consumption[i] = self.consumption[i + self.capacity] = consumption
+        self._header[TOTAL] = total + 1
+
+    def tail(self, n, meter=0):
+        """Copies of the ``n`` most recent (timestamps, consumption)"""
+        _, timestamps, consumption = self.since(0, limit=n, meter=meter)
+        return timestamps, consumption
+
+    def since(self, cursor, limit=None, meter=0):
+        """Return (cursor, timestamps, consumption) for rows after ``cursor``, as copies"""
+        while True:
+            total = self.total
+            n = max(0, total - max(cursor, 0))
+            n = min(n, total, self.capacity, limit if limit is not None else n)
+            end = total % self.capacity + self.capacity
+            timestamps = self.timestamps[end - n:end].copy()
+            consumption = self.consumption[end - n:end, meter].copy()
+            # Rows written after ``total`` land in the window once they lap it
+            if int(self._header[STARTED]) - total <= self.capacity - n:
+                return total, timestamps, consumption
+
+    def wait(self, cursor, timeout, poll=0.1):
+        """Block until rows past ``cursor`` exist; False on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.total <= cursor:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def close(self):
+        """Detach; the producer also removes the segment"""
+        del self._header, self.timestamps, self.consumption
+        self._shm.close()
+        if self.owner:
+            self._shm.unlink()
@@ -0,0 +1,45 @@
+import datetime
+import time
+
+import numpy as np
+
+
+class MeterSimulator:
+    """Vectorized load generator: one batch of readings for every meter per tick"""
+
+    def __init__(self, meters=1, interval=2.0, low=50, high=200, seed=None):
+        self.meters = meters
+        self.interval = interval
+        self.low = low
+        self.high = high
+        self.ticks = 0
+        self.last_tick_seconds = 0.0  # time spent handling the last tick
+        self.started_at = None
+        self._rng = np.random.default_rng(seed)
+
+    def tick(self):
+        """Draw one reading per meter as a single array"""
+        return datetime.datetime.now(), self._rng.integers(self.low, self.high, size=self.meters)
+
+    def run(self, handle):
+        """Call ``handle(timestamp, values)`` every ``interval`` seconds, forever"""
+        self.started_at = time.monotonic()
+        next_tick = self.started_at
+        while True:
+            start = time.monotonic()
+            handle(*self.tick())
+            self.ticks += 1
+            self.last_tick_seconds = time.monotonic() - start
+            # Schedule against the clock so slow ticks do not drift the rate
+            next_tick = max(next_tick + self.interval, time.monotonic())
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started_at if self.started_at else 0.0
+        return {
+            "meters": self.meters,
+            "interval": self.interval,
+            "ticks": self.ticks,
+            "readings_per_second": round(self.ticks * self.meters / elapsed, 2) if elapsed else 0.0,
+            "last_tick_ms": round(self.last_tick_seconds * 1000, 3),
+        }
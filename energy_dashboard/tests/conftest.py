@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Dashboard modules use flat imports (ring_buffer, anomaly_store, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
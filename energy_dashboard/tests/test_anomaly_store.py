@@ -0,0 +1,137 @@
+import os
+import time
+
+import pytest
+
+import anomaly_store
+from anomaly_store import AnomalyStore
+
+
+def timestamp(second):
+    return f"2024-01-01T00:00:{second:02d}"
+
+
+def write(store, records):
+    for record in records:
+        store.submit(record)
+    store.close()
+
+
+@pytest.mark.parametrize("index_every", [1, 3, 128])
+def test_query_returns_every_meter_of_a_shared_timestamp(tmp_path, index_every):
+    store = AnomalyStore(str(tmp_path), index_every=index_every)
+    records = [{"timestamp": timestamp(second), "meter": meter, "consumption": 190.0, "score": 1.0}
+               for second in range(3) for meter in range(10)]
+    write(store, records)
+
+    reader = AnomalyStore(str(tmp_path), readonly=True)
+    result = reader.query(start=timestamp(1), end=timestamp(1))
+
+    assert sorted(r["meter"] for r in result) == list(range(10))
+
+
+def test_query_across_segments_split_inside_a_timestamp(tmp_path):
+    # Small segments: rotation happens between records of the same tick
+    store = AnomalyStore(str(tmp_path), batch_size=7, flush_interval=0.01,
+                         max_segment_bytes=64, index_every=2)
+    for second in range(4):
+        for meter in range(10):
+            store.submit({"timestamp": timestamp(second), "meter": meter, "consumption": 190.0})
+    store.close()
+
+    reader = AnomalyStore(str(tmp_path), readonly=True)
+    assert len(reader._current_segments()) > 1
+    assert len(reader.query(start=timestamp(2), end=timestamp(2))) == 10
+    assert len(reader.query(start=timestamp(1))) == 30
+
+
+def fill(directory, seconds, meters=2, **options):
+    store = AnomalyStore(directory, flush_interval=0.01, **options)
+    write(store, [{"timestamp": timestamp(second), "meter": meter, "consumption": float(second * 10 + meter),
+                   "score": 3.0} for second in range(seconds) for meter in range(meters)])
+    return AnomalyStore(directory, readonly=True)
+
+
+def test_query_bounds_are_inclusive_and_ordered(tmp_path):
+    reader = fill(str(tmp_path), 30, index_every=4)
+
+    result = reader.query(start=timestamp(10), end=timestamp(12))
+
+    assert [r["timestamp"] for r in result] == [f"{timestamp(s)}.000000" for s in (10, 10, 11, 11, 12, 12)]
+    assert reader.query(start=timestamp(40)) == []
+
+
+def test_query_limit_and_meter_filter(tmp_path):
+    reader = fill(str(tmp_path), 30, batch_size=4, index_every=4, max_segment_bytes=256)
+
+    limited = reader.query(start=timestamp(5), limit=3)
+    meter_one = reader.query(start=timestamp(5), end=timestamp(20), meter=1)
+
+    assert [r["consumption"] for r in limited] == [50.0, 51.0, 60.0]
+    assert [r["consumption"] for r in meter_one] == [s * 10 + 1.0 for s in range(5, 21)]
+
+
+def test_tail_returns_the_newest_records_across_segments(tmp_path):
+    reader = fill(str(tmp_path), 30, batch_size=4, max_segment_bytes=256)
+    assert len(reader._current_segments()) > 1
+
+    assert [r["consumption"] for r in reader.tail(3)] == [281.0, 290.0, 291.0]
+    assert [r["consumption"] for r in reader.tail(3, meter=0)] == [270.0, 280.0, 290.0]
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    reader = fill(str(tmp_path), 5)
+    path = reader._current_segments()[-1].path
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 5)  # crash in the middle of a record
+
+    assert len(reader.query()) == 10
+    assert reader.tail(1)[0]["consumption"] == 41.0
+
+
+def test_max_segments_drops_the_oldest_files(tmp_path):
+    reader = fill(str(tmp_path), 30, batch_size=4, max_segment_bytes=256, max_segments=2)
+
+    segments = reader._current_segments()
+    assert len(segments) == 2
+    assert reader.query()[0]["timestamp"] > timestamp(0)
+
+
+def test_unknown_fsync_policy_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        AnomalyStore(str(tmp_path), fsync="sometimes")
+
+
+def test_readonly_store_loads_sealed_segments_once(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    fill(directory, 20, batch_size=4, max_segment_bytes=256)
+    reader = AnomalyStore(directory, readonly=True)
+    assert len(reader.query()) == 40
+
+    loaded = []
+    refresh = anomaly_store.Segment.refresh
+    monkeypatch.setattr(anomaly_store.Segment, "refresh", lambda self: loaded.append(self.path) or refresh(self))
+    # Directory untouched for more than the mtime resolution window
+    monkeypatch.setattr(anomaly_store.time, "time_ns", lambda: os.stat(directory).st_mtime_ns + 10 ** 10)
+    for _ in range(5):
+        assert len(reader.query()) == 40
+
+    assert set(loaded) == {reader._current_segments()[-1].path}
+
+
+def test_readonly_store_sees_new_records_and_segments(tmp_path):
+    directory = str(tmp_path)
+    writer = AnomalyStore(directory, batch_size=4, flush_interval=0.01, max_segment_bytes=256, index_every=2)
+    reader = AnomalyStore(directory, readonly=True)
+    for batch in range(3):
+        for second in range(batch * 10, batch * 10 + 10):
+            for meter in range(2):
+                writer.submit({"timestamp": timestamp(second), "meter": meter, "consumption": 1.0})
+        deadline = time.monotonic() + 5
+        while writer.written < (batch + 1) * 20 and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert len(reader.query()) == (batch + 1) * 20
+        assert len(reader.query(start=timestamp(second), end=timestamp(second))) == 2
+    writer.close()
+    assert len(reader._current_segments()) > 1
@@ -0,0 +1,93 @@
+import ast
+import importlib.util
+import os
+
+import numpy as np
+import pytest
+
+import downsampling
+from downsampling import downsample
+
+PREDICTOR_COPY = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir,
+                              "energy_predictor", "utils", "downsampling.py")
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=float), rng.normal(size=n)
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_short_series_is_returned_whole(method):
+    x, y = series(50)
+    assert downsample(x, y, 100, method).tolist() == list(range(50))
+
+
+def test_lttb_keeps_the_endpoints_and_the_budget():
+    x, y = series(10_000)
+    indices = downsample(x, y, 500, "lttb")
+
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    x, y = series(10_000)
+    y[1234], y[8765] = 50.0, -50.0
+    indices = downsample(x, y, 200, "minmax")
+
+    assert len(indices) <= 200
+    assert (np.diff(indices) > 0).all()
+    assert {1234, 8765} <= set(indices.tolist())
+
+
+def test_minmax_may_drop_the_endpoints():
+    y = np.array([0.5, 1.0, 0.0, 0.5, 0.5, 1.0, 0.0, 0.5])
+    indices = downsample(np.arange(len(y)), y, 4, "minmax")
+
+    assert indices.tolist() == [1, 2, 5, 6]
+
+
+def test_unknown_method_is_rejected():
+    x, y = series(10)
+    with pytest.raises(ValueError):
+        downsample(x, y, 5, "median")
+
+
+class _IgnoreText(ast.NodeTransformer):
+    """Blank out docstrings and messages, which are translated between the copies"""
+
+    def visit_Constant(self, node):
+        return ast.Constant("") if isinstance(node.value, str) else node
+
+    def visit_JoinedStr(self, node):
+        return ast.Constant("")
+
+
+@pytest.fixture
+def predictor_copy():
+    if not os.path.exists(PREDICTOR_COPY):
+        pytest.skip("energy_predictor is not checked out next to the dashboard")
+    spec = importlib.util.spec_from_file_location("predictor_downsampling", PREDICTOR_COPY)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_copy_has_the_same_code_as_energy_predictor(predictor_copy):
+    def shape(path):
+        with open(path, encoding="utf-8") as f:
+            return ast.dump(_IgnoreText().visit(ast.parse(f.read())))
+
+    assert downsampling.METHODS == predictor_copy.METHODS
+    assert shape(downsampling.__file__) == shape(PREDICTOR_COPY)
+
+
+@pytest.mark.parametrize("n, max_points", [(5, 3), (1000, 64), (5000, 500), (5000, 7)])
+def test_copy_selects_the_same_points_as_energy_predictor(predictor_copy, n, max_points):
+    x, y = series(n, seed=n)
+    y = y.round(1)  # ties between extremes
+    for method in downsampling.METHODS:
+        assert (downsample(x, y, max_points, method)
+                == predictor_copy.downsample(x, y, max_points, method)).all()
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from ring_buffer import RingBuffer, to_records
+
+
+def timestamp(second):
+    return np.datetime64("2024-01-01T00:00:00", "us") + np.timedelta64(second, "s")
+
+
+def fill(buffer, start, stop):
+    for second in range(start, stop):
+        buffer.append(timestamp(second), [second * 10 + meter for meter in range(buffer.meters)])
+
+
+@pytest.mark.parametrize("count", [3, 8, 13, 40])
+def test_tail_is_the_latest_rows_in_order(count):
+    buffer = RingBuffer(8, meters=2)
+    fill(buffer, 0, count)
+
+    timestamps, consumption = buffer.tail(8, meter=1)
+
+    expected = list(range(max(0, count - 8), count))
+    assert timestamps.tolist() == [timestamp(s).item() for s in expected]
+    assert consumption.tolist() == [s * 10 + 1.0 for s in expected]
+
+
+def test_tail_after_wraparound_is_a_view_without_copy():
+    buffer = RingBuffer(5)
+    fill(buffer, 0, 12)
+
+    timestamps, consumption = buffer.tail(5)
+
+    assert np.shares_memory(consumption, buffer.consumption)
+    assert np.shares_memory(timestamps, buffer.timestamps)
+    assert consumption.tolist() == [70.0, 80.0, 90.0, 100.0, 110.0]
+
+
+def test_since_skips_rows_already_seen_and_overwritten():
+    buffer = RingBuffer(4)
+    fill(buffer, 0, 3)
+    cursor, _, consumption = buffer.since(0)
+    assert (cursor, consumption.tolist()) == (3, [0.0, 10.0, 20.0])
+
+    fill(buffer, 3, 10)
+    cursor, _, consumption = buffer.since(cursor)
+
+    # Rows 3 to 5 were overwritten before the client came back
+    assert (cursor, consumption.tolist()) == (10, [60.0, 70.0, 80.0, 90.0])
+    assert buffer.since(cursor)[1].size == 0
+
+
+def test_since_limit_returns_the_most_recent_rows():
+    buffer = RingBuffer(10)
+    fill(buffer, 0, 6)
+
+    _, _, consumption = buffer.since(0, limit=2)
+
+    assert consumption.tolist() == [40.0, 50.0]
+
+
+def test_to_records_serializes_timestamps_and_values():
+    buffer = RingBuffer(4)
+    fill(buffer, 0, 2)
+
+    records = to_records(*buffer.tail(2))
+
+    assert records == [{"timestamp": "2024-01-01T00:00:00.000000", "consumption": 0.0},
+                       {"timestamp": "2024-01-01T00:00:01.000000", "consumption": 10.0}]
+
+
+def test_capacity_must_be_positive():
+    with pytest.raises(ValueError):
+        RingBuffer(0)
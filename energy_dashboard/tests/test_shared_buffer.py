@@ -0,0 +1,80 @@
+import threading
+import uuid
+
+import numpy as np
+import pytest
+
+from shared_buffer import STARTED, SharedRingBuffer
+
+
+def timestamp(second):
+    return np.datetime64("2024-01-01T00:00:00", "us") + np.timedelta64(second, "s")
+
+
+@pytest.fixture
+def producer():
+    buffer = SharedRingBuffer.create(f"test-{uuid.uuid4().hex[:12]}", capacity=64, meters=2)
+    yield buffer
+    buffer.close()
+
+
+def test_attached_reader_sees_the_producer_rows(producer):
+    for second in range(100):
+        producer.append(timestamp(second), [second, -second])
+    reader = SharedRingBuffer.attach(producer.name, timeout=0)
+
+    timestamps, consumption = reader.tail(10, meter=1)
+    cursor, _, since = reader.since(95)
+
+    assert (reader.capacity, reader.meters, len(reader)) == (64, 2, 64)
+    assert timestamps[-1] == timestamp(99)
+    assert consumption.tolist() == [-float(s) for s in range(90, 100)]
+    assert (cursor, since.tolist()) == (100, [95.0, 96.0, 97.0, 98.0, 99.0])
+    reader.close()
+
+
+def test_reads_are_consistent_while_the_producer_writes(producer):
+    reader = SharedRingBuffer.attach(producer.name, timeout=0)
+    stop = threading.Event()
+
+    def write():
+        second = 0
+        while not stop.is_set():
+            producer.append(timestamp(second), [second, second])
+            second += 1
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        for _ in range(2000):
+            timestamps, consumption = reader.tail(16)
+            # A torn copy would mix rows from two laps of the ring
+            assert (np.diff(consumption) == 1).all()
+            assert (timestamps == timestamp(0) + consumption.astype("timedelta64[s]")).all()
+    finally:
+        stop.set()
+        writer.join()
+        reader.close()
+
+
+def test_read_retries_while_a_lapping_write_is_in_progress(producer):
+    for second in range(10):
+        producer.append(timestamp(second), [second, second])
+    # A write started far enough ahead to reach the rows being copied
+    producer._header[STARTED] = producer.total + producer.capacity
+    restore = threading.Timer(0.05, lambda: producer._header.__setitem__(STARTED, producer.total))
+    restore.start()
+
+    _, consumption = producer.tail(10)
+
+    restore.join()
+    assert consumption.tolist() == [float(s) for s in range(10)]
+
+
+def test_closing_the_producer_removes_the_segment():
+    buffer = SharedRingBuffer.create(f"test-{uuid.uuid4().hex[:12]}", capacity=4)
+    name = buffer.name
+    buffer.close()
+
+    with pytest.raises(FileNotFoundError):
+        SharedRingBuffer.attach(name, timeout=0)
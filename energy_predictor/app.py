@@ -1,33 +1,60 @@
-import os
 from datetime import datetime, timedelta
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+import atexit
+import click
+from flask import (Flask, Response, render_template, request, jsonify, redirect, url_for,
+                   stream_with_context)
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
-import pandas as pd
 import numpy as np
+import hmac
 import json
-from dotenv import load_dotenv
-import plotly
-import plotly.express as px
-from model import EnergyPredictor
+import queue
+import time
+from config import Config
+from model import SARIMAX_MAX_ROWS, SarimaxForecaster, train_model
+from model_registry import ModelRegistry
+from utils.cache import ResponseCache
+from utils.charts import (CHART_FORMATS, ENCODINGS, encode_column, historical_figure, iso_dates,
+                          prediction_figure)
 from utils.database import MongoDBHandler
-from utils.notifications import NotificationManager
-
-# Charger les variables d'environnement
-load_dotenv()
+from utils.downsampling import METHODS as DOWNSAMPLING_METHODS, downsample
+from utils.importer import ConsumptionImporter
+from utils.ingest import IngestBuffer, parse_readings, validate_readings
+from utils.notifications import NotificationManager, NotificationRelay
+from utils.pubsub import PubSub
+from utils.scheduler import ForecastScheduler
 
 app = Flask(__name__)
-app.secret_key = os.getenv('SECRET_KEY', 'your-secret-key-here')
-
-# Configuration MongoDB
-app.config['MONGO_URI'] = os.getenv('MONGO_URI', 'mongodb://localhost:27017/energy_dashboard')
+# Tous les réglages (variables d'environnement et .env) sont lus dans config.py
+app.config.from_object(Config)
 
 # Initialiser les handlers
-db_handler = MongoDBHandler(app.config['MONGO_URI'])
+db_handler = MongoDBHandler(
+    app.config['MONGO_URI'],
+    storage_mode=app.config['CONSUMPTION_STORAGE'],
+    user_cache_ttl=app.config['USER_CACHE_TTL'],
+    user_cache_size=app.config['USER_CACHE_MAX_ENTRIES']
+)
+# Idempotent : les index existants ne sont pas recréés
+db_handler.create_indexes()
 print("*************")
 print(app.config['MONGO_URI'])
 print("*************")
-notification_manager = NotificationManager(db_handler)
+notification_broker = PubSub()
+notification_manager = NotificationManager(db_handler, notification_broker)
+# Notifications créées par le planificateur ou la CLI (autres processus), relues dans MongoDB
+notification_relay = NotificationRelay(db_handler, notification_broker,
+                                       interval=app.config['NOTIFICATION_RELAY_SECONDS'])
+
+# Registre des modèles : chargé une fois au démarrage, partagé entre les requêtes
+model_registry = ModelRegistry(app.config['MODEL_DIR'])
+model_registry.load(app.config['MODEL_VERSION'])
+
+# Cache des réponses de consommation/prévision, invalidé à l'arrivée de nouvelles données
+response_cache = ResponseCache(
+    max_entries=app.config['CACHE_MAX_ENTRIES'],
+    ttl=app.config['CACHE_TTL']
+)
 
 # Configuration Flask-Login
 login_manager = LoginManager()
@@ -111,39 +138,86 @@ def dashboard():
 @login_required
 def get_current_consumption():
     """Récupérer la consommation actuelle"""
-    try:
+    def build():
         # Récupérer les données des dernières 24 heures
         end_date = datetime.utcnow()
         start_date = end_date - timedelta(days=1)
         
-        consumption_data = db_handler.get_consumption_data(start_date, end_date)
-        
-        # Calculer la consommation totale
-        total_consumption = sum(item['value'] for item in consumption_data)
+        # Total, nombre de points et heure de pointe lus dans les cumuls horaires
+        summary = db_handler.get_rollup_summary(start_date, end_date)
+        total_consumption = summary['total']
         
         # Calculer la consommation moyenne par heure
-        hourly_data = {}
-        for item in consumption_data:
-            hour = item['timestamp'].hour
-            hourly_data[hour] = hourly_data.get(hour, 0) + item['value']
+        avg_consumption = total_consumption / 24 if summary['count'] > 0 else 0
         
-        avg_consumption = total_consumption / 24 if len(hourly_data) > 0 else 0
-        
-        return jsonify({
+        return {
             'total_consumption': round(total_consumption, 2),
             'avg_consumption': round(avg_consumption, 2),
-            'peak_hour': max(hourly_data, key=hourly_data.get) if hourly_data else None,
-            'data_points': len(consumption_data)
-        })
+            'peak_hour': summary['peak_hour'],
+            'data_points': summary['count']
+        }
+    
+    try:
+        # Cumuls de tous les utilisateurs : une seule entrée partagée
+        return jsonify(response_cache.get_or_compute(('current',), build))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def chart_options(options):
+    """Format ('columns' ou 'plotly'), encodage ('json' ou 'float32') et réduction demandés
+    
+    max_points borne le nombre de points de chaque série (méthode
+    downsample=lttb ou minmax) ; absent, toutes les valeurs sont renvoyées.
+    """
+    chart_format = options.get('format', 'columns')
+    encoding = options.get('encoding', 'json')
+    if chart_format not in CHART_FORMATS or encoding not in ENCODINGS:
+        raise ValueError(f"Format attendu parmi {CHART_FORMATS}, encodage parmi {ENCODINGS}")
+    max_points = options.get('max_points')
+    if max_points is not None:
+        max_points = int(max_points)
+        if max_points < 3:
+            raise ValueError("max_points doit être au moins 3")
+    method = options.get('downsample', 'lttb')
+    if method not in DOWNSAMPLING_METHODS:
+        raise ValueError(f"Réduction attendue parmi {DOWNSAMPLING_METHODS}")
+    return chart_format, encoding, max_points, method
+
+MAX_PREDICTION_DAYS = 365
+
+def prediction_days(data):
+    """Horizon demandé (champ days, 7 par défaut), de 1 à MAX_PREDICTION_DAYS jours"""
+    try:
+        days = int(data.get('days', 7))
+    except (TypeError, ValueError):
+        days = 0
+    if not 1 <= days <= MAX_PREDICTION_DAYS:
+        raise ValueError(f"Horizon invalide (1 à {MAX_PREDICTION_DAYS} jours)")
+    return days
+
+def reduce_series(dates, values, max_points, method):
+    """Garder au plus max_points points (dates ISO ou datetime), pics compris"""
+    if max_points is None or len(values) <= max_points:
+        return list(dates), list(values)
+    x = np.array(dates, dtype='datetime64[us]').astype(np.int64)
+    keep = downsample(x, values, max_points, method).tolist()
+    return [dates[i] for i in keep], [values[i] for i in keep]
+
 @app.route('/api/consumption/historical')
 @login_required
 def get_historical_data():
-    """Récupérer les données historiques"""
+    """Récupérer les données historiques
+    
+    Par défaut, les dates et valeurs sont renvoyées en colonnes et le
+    navigateur construit le graphique ; format=plotly renvoie l'ancienne
+    figure sérialisée.
+    """
     try:
         period = request.args.get('period', '7d')  # 7d, 30d, 90d
+        try:
+            chart_format, encoding, max_points, method = chart_options(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         if period == '7d':
             days = 7
@@ -152,108 +226,231 @@ def get_historical_data():
         else:
             days = 90
         
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        
-        consumption_data = db_handler.get_consumption_data(start_date, end_date)
-        
-        # Organiser les données par jour
-        daily_data = {}
-        for item in consumption_data:
-            date_str = item['timestamp'].strftime('%Y-%m-%d')
-            if date_str not in daily_data:
-                daily_data[date_str] = 0
-            daily_data[date_str] += item['value']
-        
-        # Créer le graphique
-        dates = list(daily_data.keys())
-        values = list(daily_data.values())
+        def build():
+            end_date = datetime.utcnow()
+            start_date = end_date - timedelta(days=days)
+            
+            # Organiser les données par jour (cumuls journaliers)
+            daily_data = {
+                bucket['bucket'].strftime('%Y-%m-%d'): bucket['total']
+                for bucket in db_handler.get_rollup_buckets(start_date, end_date, unit='day')
+            }
+            
+            dates, values = reduce_series(list(daily_data.keys()), list(daily_data.values()),
+                                          max_points, method)
+            
+            if chart_format == 'plotly':
+                return {'graph': historical_figure(dates, values, days), 'data': daily_data}
+            return {'days': days, 'dates': dates, 'values': encode_column(values, encoding)}
         
-        fig = px.line(
-            x=dates, 
-            y=values,
-            title=f'Consommation énergétique - {days} derniers jours',
-            labels={'x': 'Date', 'y': 'Consommation (kWh)'}
-        )
-        
-        graph_json = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-        return jsonify({'graph': graph_json, 'data': daily_data})
+        key = ('historical', days, chart_format, encoding, max_points, method)
+        return jsonify(response_cache.get_or_compute(key, build))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+class InsufficientDataError(ValueError):
+    """Historique trop court pour prédire"""
+
+def compute_forecast(days_to_predict):
+    """Calculer une prévision à partir des 90 derniers jours
+    
+    Returns:
+        (document de prévision {'predictions', 'dates', 'metadata'}, version du modèle)
+    """
+    # Récupérer les données historiques pour l'entraînement
+    end_date = datetime.utcnow()
+    start_date = end_date - timedelta(days=90)  # 90 jours d'historique
+    
+    # Données déjà au format attendu par le modèle (index timestamp, colonne value)
+    df = db_handler.get_consumption_frame(start_date, end_date)
+    
+    if len(df) < 10:
+        raise InsufficientDataError('Données insuffisantes pour la prédiction')
+    
+    # Utiliser le modèle actif (une seule lecture : version cohérente pour le calcul)
+    model_version, predictor = model_registry.get()
+    predictions = predictor.predict(df, days_to_predict)
+    
+    # Créer les dates de prédiction
+    prediction_dates = [end_date + timedelta(days=i+1) for i in range(days_to_predict)]
+    
+    # Historique récent (7 derniers jours), conservé pour le graphique
+    recent = df[df.index > df.index[-1] - timedelta(days=7)]
+    
+    return {
+        'predictions': predictions.tolist(),
+        'dates': [d.strftime('%Y-%m-%d') for d in prediction_dates],
+        'metadata': {
+            'days': days_to_predict,
+            'recent_dates': recent.index.to_pydatetime().tolist(),
+            'recent_values': recent['value'].tolist()
+        }
+    }, model_version
+
+def save_forecast(user_id, forecast, model_version):
+    """Enregistrer une prévision calculée hors requête
+    
+    Le cache n'est pas touché : le précalcul tourne dans le processus du
+    planificateur, et les réponses en cache sont indexées sur la prévision
+    enregistrée qu'elles servent.
+    """
+    db_handler.save_prediction(user_id, forecast, model_version=model_version)
+
+forecast_scheduler = ForecastScheduler(
+    compute_forecast,
+    save_forecast,
+    db_handler,
+    interval_minutes=app.config['FORECAST_INTERVAL_MINUTES'],
+    horizons=[int(days) for days in app.config['FORECAST_HORIZONS'].split(',')]
+)
+
+def refit_active_model():
+    """Réestimer le modèle SARIMAX actif et activer la nouvelle version
+    
+    Seule opération coûteuse du moteur : entre deux réestimations, les
+    nouvelles heures sont absorbées par filtrage à chaque prévision.
+    Lancée par le planificateur, l'activation passe par le pointeur
+    partagé du registre : les workers web chargent la nouvelle version à
+    leur requête suivante.
+    """
+    _, predictor = model_registry.get()
+    if not isinstance(predictor.model, SarimaxForecaster):
+        return None
+    end_date = datetime.utcnow()
+    df = db_handler.get_consumption_frame(end_date - timedelta(hours=SARIMAX_MAX_ROWS), end_date)
+    version = f"sarimax-{end_date:%Y%m%d%H%M}"
+    # Les paramètres actuels servent de point de départ : convergence rapide
+    train_model(df, model_registry.artifact_path(version), engine='sarimax',
+                start_params=predictor.model.params)
+    return model_registry.activate(version)
+
+MODEL_REFIT_HOURS = app.config['MODEL_REFIT_HOURS']
+# Analyse des tendances de tous les utilisateurs (0 la désactive)
+TREND_SCAN_HOURS = app.config['TREND_SCAN_HOURS']
+
+def run_scheduler():
+    """Planifier précalcul, réestimation et analyse des tendances, puis bloquer
+    
+    À lancer dans un seul processus (flask run-scheduler) : démarrées dans
+    chaque worker web, ces tâches tourneraient autant de fois qu'il y a de
+    workers, et les réestimations écriraient le même artefact en parallèle.
+    """
+    if MODEL_REFIT_HOURS > 0:
+        forecast_scheduler.every(MODEL_REFIT_HOURS * 60, refit_active_model, 'refit')
+    if TREND_SCAN_HOURS > 0:
+        forecast_scheduler.every(TREND_SCAN_HOURS * 60, notification_manager.scan_users, 'trend-scan')
+    forecast_scheduler.start(background=False)
+
 @app.route('/api/predict', methods=['POST'])
 @login_required
 def predict_consumption():
-    """Prédire la consommation future"""
+    """Prédire la consommation future (prévision précalculée si disponible)"""
     try:
-        data = request.json
-        days_to_predict = int(data.get('days', 7))
-        
-        # Récupérer les données historiques pour l'entraînement
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=90)  # 90 jours d'historique
+        data = request.json or {}
+        user_id = current_user.id
+        try:
+            days_to_predict = prediction_days(data)
+            chart_format, encoding, max_points, method = chart_options({**request.args, **data})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        historical_data = db_handler.get_consumption_data(start_date, end_date)
+        # Prévision précalculée la plus récente, si elle couvre l'horizon demandé
+        max_age = timedelta(minutes=2 * forecast_scheduler.interval_minutes)
+        stored = db_handler.get_latest_forecast(days_to_predict, max_age=max_age)
         
-        if len(historical_data) < 10:
-            return jsonify({'error': 'Données insuffisantes pour la prédiction'}), 400
+        def build():
+            if stored:
+                forecast = {
+                    'predictions': stored['predictions'][:days_to_predict],
+                    'dates': stored['dates'][:days_to_predict],
+                    'metadata': stored['metadata']
+                }
+                model_version = stored['model_version']
+                computed_at = stored['created_at']
+            else:
+                forecast, model_version = compute_forecast(days_to_predict)
+                db_handler.save_prediction(user_id, forecast, model_version=model_version)
+                computed_at = datetime.utcnow()
+            
+            predictions = np.array(forecast['predictions'])
+            recent_dates, recent_values = reduce_series(iso_dates(forecast['metadata']['recent_dates']),
+                                                        forecast['metadata']['recent_values'],
+                                                        max_points, method)
+            
+            response = {
+                'predictions': forecast['predictions'],
+                'dates': forecast['dates'],
+                # Vérifier les tendances pour les notifications
+                'trend_warnings': notification_manager.check_trends(predictions),
+                'model_version': model_version,
+                'computed_at': computed_at.isoformat()
+            }
+            if chart_format == 'plotly':
+                response['graph'] = prediction_figure(forecast['dates'], predictions, recent_dates,
+                                                      recent_values, days_to_predict)
+            else:
+                response['days'] = days_to_predict
+                response['recent'] = {'dates': recent_dates,
+                                      'values': encode_column(recent_values, encoding)}
+                if encoding != 'json':
+                    response['predictions'] = encode_column(forecast['predictions'], encoding)
+            return response
         
-        # Préparer les données pour le modèle
-        df = pd.DataFrame([{
-            'timestamp': item['timestamp'],
-            'value': item['value']
-        } for item in historical_data])
-        
-        df.set_index('timestamp', inplace=True)
-        
-        # Utiliser le modèle pour prédire
-        predictor = EnergyPredictor()
-        predictions = predictor.predict(df, days_to_predict)
-        
-        # Créer les dates de prédiction
-        prediction_dates = [end_date + timedelta(days=i+1) for i in range(days_to_predict)]
-        
-        # Créer le graphique
-        fig = px.line(
-            x=prediction_dates,
-            y=predictions,
-            title=f'Prédiction de consommation - {days_to_predict} prochains jours',
-            labels={'x': 'Date', 'y': 'Consommation prédite (kWh)'}
-        )
-        
-        # Ajouter une ligne pour l'historique récent
-        recent_dates = [item['timestamp'] for item in historical_data[-7:]]
-        recent_values = [item['value'] for item in historical_data[-7:]]
-        
-        fig.add_scatter(
-            x=recent_dates,
-            y=recent_values,
-            mode='lines',
-            name='Historique récent',
-            line=dict(color='gray', dash='dash')
-        )
-        
-        graph_json = json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
-        
-        # Vérifier les tendances pour les notifications
-        trend_notifications = notification_manager.check_trends(predictions)
+        # Un nouveau précalcul (écrit par un autre processus) change la clé
+        key = ('predict', user_id, stored['_id'] if stored else None, days_to_predict,
+               chart_format, encoding, max_points, method)
+        return jsonify(response_cache.get_or_compute(key, build))
+    except InsufficientDataError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/predict/jobs', methods=['POST'])
+@login_required
+def submit_prediction_job():
+    """Lancer une prévision ad hoc en arrière-plan"""
+    try:
+        try:
+            days_to_predict = prediction_days(request.json or {})
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
+        job_id = forecast_scheduler.submit(days_to_predict, current_user.id)
         return jsonify({
-            'predictions': predictions.tolist(),
-            'dates': [d.strftime('%Y-%m-%d') for d in prediction_dates],
-            'graph': graph_json,
-            'trend_warnings': trend_notifications
-        })
+            'job_id': job_id,
+            'status': 'pending',
+            'status_url': url_for('get_prediction_job', job_id=job_id)
+        }), 202
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/predict/jobs/<job_id>')
+@login_required
+def get_prediction_job(job_id):
+    """Suivre l'état d'un job de prévision"""
+    job = forecast_scheduler.get_job(job_id)
+    if not job or job['user_id'] != current_user.id:
+        return jsonify({'error': 'Job introuvable'}), 404
+    
+    response = {
+        'job_id': job['_id'],
+        'status': job['status'],
+        'days': job['days'],
+        'created_at': job['created_at'].isoformat()
+    }
+    if job['status'] == 'done':
+        response['result'] = {key: job['result'][key] for key in ('predictions', 'dates', 'model_version')}
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    return jsonify(response)
+
 @app.route('/api/notifications')
 @login_required
 def get_notifications():
     """Récupérer les notifications"""
     try:
         notifications = db_handler.get_notifications(current_user.id)
-        unread_count = sum(1 for n in notifications if not n.get('read', False))
+        unread_count = db_handler.count_unread_notifications(current_user.id)
         
         return jsonify({
             'notifications': notifications,
@@ -267,11 +464,114 @@ def get_notifications():
 def mark_notifications_read():
     """Marquer les notifications comme lues"""
     try:
-        db_handler.mark_all_notifications_read(current_user.id)
+        notification_manager.mark_all_read(current_user.id)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/notifications/unread-count')
+@login_required
+def get_unread_count():
+    """Nombre de notifications non lues, sans charger les documents"""
+    return jsonify({'unread_count': db_handler.count_unread_notifications(current_user.id)})
+
+@app.route('/api/notifications/stream')
+@login_required
+def notifications_stream():
+    """Server-Sent Events : compteur de non lues puis chaque nouvelle notification"""
+    user_id = current_user.id
+    subscription = notification_relay.subscribe(user_id)
+    
+    def events():
+        try:
+            # Abonné avant le comptage : aucune notification ne tombe entre les deux
+            unread = {'event': 'unread', 'unread_count': db_handler.count_unread_notifications(user_id)}
+            yield f"event: unread\ndata: {json.dumps(unread)}\n\n"
+            while True:
+                try:
+                    message = subscription.get(timeout=15)
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['event']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            notification_relay.unsubscribe(user_id, subscription)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+MAX_BATCH_SERIES = app.config['MAX_BATCH_SERIES']
+
+@app.route('/api/predict/batch', methods=['POST'])
+@login_required
+def predict_batch():
+    """Prédire la consommation de plusieurs séries (sources) en un appel"""
+    try:
+        data = request.json or {}
+        series_ids = list(dict.fromkeys(data.get('series', [])))
+        try:
+            days_to_predict = prediction_days(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if not series_ids:
+            return jsonify({'error': 'Aucune série demandée'}), 400
+        if len(series_ids) > MAX_BATCH_SERIES:
+            return jsonify({'error': f'Au plus {MAX_BATCH_SERIES} séries par requête'}), 400
+        
+        end_date = datetime.utcnow()
+        start_date = end_date - timedelta(days=90)  # 90 jours d'historique
+        
+        # Historique de toutes les séries en une requête
+        histories = db_handler.get_consumption_frames(start_date, end_date, series_ids)
+        missing = [series_id for series_id, df in histories.items() if len(df) < 10]
+        histories = {series_id: df for series_id, df in histories.items() if len(df) >= 10}
+        
+        model_version, predictor = model_registry.get()
+        forecasts = predictor.predict_batch(histories, days_to_predict) if histories else {}
+        
+        dates = [(end_date + timedelta(days=i+1)).strftime('%Y-%m-%d') for i in range(days_to_predict)]
+        
+        # Une seule insertion pour toutes les séries
+        db_handler.save_prediction(current_user.id, [{
+            'predictions': predictions.tolist(),
+            'dates': dates,
+            'metadata': {'days': days_to_predict, 'series': series_id}
+        } for series_id, predictions in forecasts.items()], model_version=model_version)
+        
+        return jsonify({
+            'forecasts': {series_id: predictions.tolist() for series_id, predictions in forecasts.items()},
+            'dates': dates,
+            'missing': missing,
+            'model_version': model_version
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/models')
+@login_required
+def list_models():
+    """Lister les versions de modèle disponibles et la version active"""
+    active_version, _ = model_registry.get()
+    return jsonify({'active': active_version, 'versions': model_registry.versions()})
+
+@app.route('/api/models/activate', methods=['POST'])
+@login_required
+def activate_model():
+    """Basculer à chaud sur une autre version de modèle (tous les workers suivent le pointeur)"""
+    try:
+        if current_user.role != 'admin':
+            return jsonify({'error': 'Non autorisé'}), 403
+        
+        version = (request.json or {}).get('version')
+        active_version = model_registry.activate(version or model_registry.latest())
+        response_cache.invalidate('predict')
+        return jsonify({'success': True, 'active': active_version})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/historique')
 @login_required
 def historique():
@@ -287,6 +587,62 @@ def predictions():
 def notifications_page():
     return render_template('notifications.html', user=current_user)
 
+# Ingestion des relevés envoyés par les passerelles
+INGEST_TOKEN = app.config['INGEST_TOKEN']
+MAX_INGEST_BYTES = app.config['MAX_INGEST_BYTES']
+ingest_buffer = IngestBuffer(
+    db_handler,
+    # Seules les réponses lues dans les cumuls sont périmées : les prévisions
+    # suivent la cadence du précalcul
+    on_flush=lambda batch: response_cache.invalidate('current', 'historical'),
+    batch_size=app.config['INGEST_BATCH_SIZE'],
+    flush_interval=app.config['INGEST_FLUSH_INTERVAL'],
+    max_pending=app.config['INGEST_MAX_PENDING']
+)
+# Les relevés acceptés (202) mais pas encore écrits ne sont pas perdus à l'arrêt
+atexit.register(ingest_buffer.close)
+
+def ingest_authorized():
+    """Jeton de passerelle (Authorization: Bearer) si INGEST_TOKEN est défini, sinon session"""
+    if INGEST_TOKEN:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {INGEST_TOKEN}')
+    return current_user.is_authenticated
+
+@app.route('/api/ingest', methods=['POST'])
+def ingest_readings():
+    """Recevoir un lot de relevés (application/x-ndjson ou application/msgpack)"""
+    if not ingest_authorized():
+        return jsonify({'error': 'Non autorisé'}), 401
+    if request.content_length and request.content_length > MAX_INGEST_BYTES:
+        return jsonify({'error': 'Lot trop volumineux'}), 413
+    
+    try:
+        frame = parse_readings(request.get_data(), request.content_type or '')
+    except Exception as e:
+        return jsonify({'error': f'Lot illisible: {e}'}), 400
+    if frame.empty:
+        return jsonify({'error': 'Lot vide'}), 400
+    
+    readings, rejected = validate_readings(frame)
+    if not ingest_buffer.submit(readings):
+        response = jsonify({'error': 'File d\'ingestion pleine, réessayez plus tard'})
+        response.headers['Retry-After'] = str(max(1, int(ingest_buffer.flush_interval)))
+        return response, 429
+    return jsonify({'accepted': len(readings), 'rejected': rejected}), 202
+
+@app.route('/api/ingest/stats')
+@login_required
+def ingest_stats():
+    """Compteurs de l'ingestion (en attente, écrits, refusés)"""
+    return jsonify(ingest_buffer.stats())
+
+@app.route('/api/cache/stats')
+@login_required
+def cache_stats():
+    """Compteurs du cache de réponses et du cache des utilisateurs"""
+    users = db_handler.user_cache.stats() if db_handler.user_cache else None
+    return jsonify({**response_cache.stats(), 'users': users})
+
 # Route pour générer des données de démonstration
 @app.route('/api/generate-demo-data', methods=['POST'])
 @login_required
@@ -296,10 +652,113 @@ def generate_demo_data():
         if current_user.role != 'admin':
             return jsonify({'error': 'Non autorisé'}), 403
         
-        db_handler.generate_demo_data()
-        return jsonify({'success': True, 'message': 'Données de démonstration générées'})
+        inserted = db_handler.generate_demo_data()
+        response_cache.invalidate()
+        return jsonify({'success': True, 'message': 'Données de démonstration générées', 'inserted': inserted})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Commandes CLI (flask --app app <commande>)
+@app.cli.command('init-db')
+def init_db_command():
+    """Créer les index MongoDB (aussi fait à chaque démarrage)"""
+    if not db_handler.create_indexes():
+        raise click.ClickException("Certains index n'ont pas pu être créés")
+
+@app.cli.command('run-scheduler')
+def run_scheduler_command():
+    """Processus unique des tâches périodiques (prévisions, réestimation, tendances)"""
+    click.echo(f"Précalcul toutes les {forecast_scheduler.interval_minutes} min, "
+               f"réestimation toutes les {MODEL_REFIT_HOURS} h, tendances toutes les {TREND_SCAN_HOURS} h")
+    run_scheduler()
+
+@app.cli.command('rebuild-rollups')
+@click.option('--source', default=None, help='Limiter le recalcul à une source')
+@click.option('--start', type=click.DateTime(), default=None, help='Premier jour recalculé (UTC)')
+@click.option('--end', type=click.DateTime(), default=None, help='Dernier jour recalculé (UTC, inclus)')
+def rebuild_rollups_command(source, start, end):
+    """Recalculer les cumuls horaires/journaliers depuis les relevés bruts
+    
+    Chemin de réparation lorsque l'écriture des cumuls a échoué après celle
+    des relevés (rollup_failed dans /api/ingest/stats).
+    """
+    written = db_handler.rebuild_rollups(source, start, end)
+    click.echo(f"Cumuls recalculés: {written}")
+
+@app.cli.command('train-model')
+@click.option('--version', required=True, help='Version de l\'artefact (energy_model-<version>.joblib)')
+@click.option('--days', default=365, show_default=True, help='Jours d\'historique utilisés')
+@click.option('--source', default=None, help='Limiter l\'entraînement à une source')
+@click.option('--n-estimators', default=100, show_default=True)
+@click.option('--engine', type=click.Choice(['forest', 'sarimax']), default='forest', show_default=True,
+              help='forest : régression sur features ; sarimax : modèle espace d\'états incrémental')
+@click.option('--activate', is_flag=True, help='Activer la version une fois entraînée')
+def train_model_command(version, days, source, n_estimators, engine, activate):
+    """Entraîner le modèle horaire hors ligne et enregistrer l'artefact"""
+    end_date = datetime.utcnow()
+    df = db_handler.get_consumption_frame(end_date - timedelta(days=days), end_date, source)
+    path = model_registry.artifact_path(version)
+    train_model(df, path, n_estimators=n_estimators, engine=engine)
+    click.echo(f"Modèle entraîné sur {len(df)} relevés: {path}")
+    if activate:
+        model_registry.activate(version)
+
+@app.cli.command('generate-demo-data')
+@click.option('--days', default=90, show_default=True)
+@click.option('--sources', default=1, show_default=True, help='Nombre de sources (demo, demo-1, ...)')
+@click.option('--users', default=1, show_default=True, help='Nombre d\'utilisateurs par source')
+@click.option('--batch-size', default=10000, show_default=True, help='Documents par insert_many')
+@click.option('--workers', default=4, show_default=True, help='Threads d\'écriture')
+@click.option('--seed', default=None, type=int)
+def generate_demo_data_command(days, sources, users, batch_size, workers, seed):
+    """Générer un jeu de données synthétique (tests de charge)"""
+    names = ['demo'] + [f'demo-{i}' for i in range(1, sources)]
+    user_ids = [None] if users == 1 else [f'demo-user-{i}' for i in range(users)]
+    start = time.perf_counter()
+    inserted = db_handler.generate_demo_data(days, sources=names, user_ids=user_ids,
+                                             batch_size=batch_size, workers=workers, seed=seed)
+    click.echo(f"{inserted} relevés générés en {time.perf_counter() - start:.1f}s")
+
+@app.cli.command('import-csv')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--source', required=True, help='Source associée aux relevés importés')
+@click.option('--user-id', default=None)
+@click.option('--time-column', default='Datetime', show_default=True)
+@click.option('--value-column', default=None, help='Colonne des valeurs (défaut : première autre colonne)')
+@click.option('--unit', default='kWh', show_default=True)
+@click.option('--chunksize', default=50000, show_default=True, help='Lignes lues par lot')
+@click.option('--reorder-hours', default=168, show_default=True, help='Fenêtre de réordonnancement')
+@click.option('--no-clip', is_flag=True, help='Ne pas écrêter aux quantiles 1 %/99 %')
+def import_csv_command(path, source, user_id, time_column, value_column, unit, chunksize,
+                       reorder_hours, no_clip):
+    """Importer un export CSV de compteur (nettoyage du notebook, en flux)"""
+    importer = ConsumptionImporter(db_handler, source, user_id=user_id, unit=unit,
+                                   time_column=time_column, value_column=value_column,
+                                   chunksize=chunksize, reorder_hours=reorder_hours,
+                                   quantiles=None if no_clip else (0.01, 0.99))
+    stats = importer.import_csv(path)
+    click.echo(f"{stats['inserted']} relevés importés ({stats['rows']} lignes lues, "
+               f"{stats['duplicates']} doublons, {stats['late']} lignes hors ordre ignorées, "
+               f"{stats['filled']} heures interpolées, {stats['clipped']} valeurs écrêtées)")
+
+@app.cli.command('scan-trends')
+@click.option('--days', default=28, show_default=True, help='Jours d\'historique analysés')
+@click.option('--source', default=None, help='Limiter l\'analyse à une source')
+def scan_trends_command(days, source):
+    """Analyser les tendances de tous les utilisateurs et créer les alertes (tâche nocturne)"""
+    start = time.perf_counter()
+    created = notification_manager.scan_users(days, source=source)
+    click.echo(f"{created} notifications créées en {time.perf_counter() - start:.1f}s")
+
+@app.cli.command('migrate-buckets')
+@click.option('--source', default=None, help='Limiter la migration à une source')
+@click.option('--batch-size', default=10000, show_default=True, help='Relevés par lot')
+@click.option('--delete-raw', is_flag=True, help='Supprimer les relevés bruts après migration')
+def migrate_buckets_command(source, batch_size, delete_raw):
+    """Convertir les relevés bruts au format buckets journaliers"""
+    migrated = db_handler.migrate_to_buckets(source, batch_size, delete_raw)
+    click.echo(f"{migrated} relevés migrés vers consumption_buckets")
+    click.echo("Définissez CONSUMPTION_STORAGE=buckets pour lire ce format")
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,165 @@
+"""Backtest par origine glissante des moteurs de prévision
+
+Usage :
+    python backtest.py PJME_hourly.csv --folds 12 --horizon-days 7 --workers 4
+
+Chaque pli entraîne un modèle sur les `train_days` jours qui précèdent
+l'origine puis prévoit les `horizon_days` jours suivants. Les plis sont
+répartis sur un pool de processus ; l'erreur porte sur les moyennes
+journalières renvoyées par EnergyPredictor.predict().
+
+Chaque pli s'exécute dans un processus neuf : le pic mémoire rapporté est
+la hausse du RSS maximal du processus pendant l'entraînement et la
+prévision, allocations natives (arbres, Kalman) comprises.
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import resource
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from model import (EnergyPredictor, MIN_HISTORY_HOURS, SARIMAX_MAX_ROWS, SarimaxForecaster,
+                   to_hourly, training_matrix)
+
+MODELS = ('simulate', 'forest', 'sarimax')
+
+_series = None  # série horaire complète, transmise une fois par processus
+_baseline_rss = 0
+
+
+def load_csv(path, time_column='Datetime', value_column='PJME_MW'):
+    """Lire une série horaire (format PJME) en DataFrame index timestamp, colonne 'value'"""
+    df = pd.read_csv(path, usecols=[time_column, value_column], parse_dates=[time_column])
+    df = df.rename(columns={time_column: 'timestamp', value_column: 'value'}).set_index('timestamp')
+    return to_hourly(df).to_frame('value')
+
+
+def rolling_origins(n_hours, folds, horizon_hours, step_hours, train_hours):
+    """Origines des plis, la dernière laissant juste `horizon_hours` heures à prévoir"""
+    last = n_hours - horizon_hours
+    origins = [last - i * step_hours for i in range(folds)][::-1]
+    return [origin for origin in origins if origin - train_hours >= 0]
+
+
+def fit_model(name, train, n_estimators=100):
+    """Entraîner un moteur sur l'historique de train"""
+    predictor = EnergyPredictor()
+    if name == 'forest':
+        X, y = training_matrix(train)
+        predictor.model.set_params(n_estimators=n_estimators, n_jobs=1)
+        predictor.model.fit(X, y)
+    elif name == 'sarimax':
+        predictor.model = SarimaxForecaster.fit(train, max_rows=min(len(train), SARIMAX_MAX_ROWS))
+    return predictor
+
+
+def run_fold(task):
+    """Entraîner puis évaluer un moteur sur un pli (exécuté dans un processus du pool)"""
+    name, fold, origin, train_hours, horizon_days, n_estimators = task
+    train = _series.iloc[origin - train_hours:origin]
+    actual = _series['value'].to_numpy()[origin:origin + horizon_days * 24]
+    actual = actual.reshape(horizon_days, 24).mean(axis=1)
+    
+    start = time.perf_counter()
+    predictor = fit_model(name, train, n_estimators)
+    fit_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    predicted = predictor.predict(train, horizon_days)
+    predict_seconds = time.perf_counter() - start
+    
+    error = np.abs(predicted - actual)
+    return {
+        'model': name,
+        'fold': fold,
+        'origin': _series.index[origin],
+        'mae': error.mean(),
+        'mape': 100 * (error / np.abs(actual)).mean(),
+        'fit_seconds': fit_seconds,
+        'predict_seconds': predict_seconds,
+        'peak_mb': (_max_rss() - _baseline_rss) / 2 ** 20
+    }
+
+
+def _max_rss():
+    """RSS maximal du processus, en octets"""
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _init_worker(series):
+    global _series, _baseline_rss
+    _series = series
+    # Imports faits ici pour ne pas les compter dans le temps d'entraînement
+    import sklearn.ensemble  # noqa: F401
+    import statsmodels.tsa.statespace.sarimax  # noqa: F401
+    warnings.simplefilter('ignore')  # avertissements de convergence SARIMAX
+    _baseline_rss = _max_rss()
+
+
+def backtest(series, models=MODELS, folds=12, horizon_days=7, step_days=None, train_days=56,
+             workers=None, n_estimators=100):
+    """Évaluer chaque moteur sur les mêmes plis
+    
+    Returns:
+        DataFrame d'une ligne par (modèle, pli)
+    """
+    horizon_hours = horizon_days * 24
+    train_hours = max(train_days * 24, MIN_HISTORY_HOURS + 1)
+    origins = rolling_origins(len(series), folds, horizon_hours,
+                              (step_days or horizon_days) * 24, train_hours)
+    if not origins:
+        raise ValueError("Série trop courte pour le nombre de plis demandé")
+    
+    tasks = [(name, fold, origin, train_hours, horizon_days, n_estimators)
+             for fold, origin in enumerate(origins) for name in models]
+    # Les plis SARIMAX (les plus longs) partent en premier
+    tasks.sort(key=lambda task: task[0] != 'sarimax')
+    # Un processus par pli : le pic mémoire de l'un ne masque pas celui du suivant
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(series,),
+                             max_tasks_per_child=1) as pool:
+        rows = list(pool.map(run_fold, tasks))
+    return pd.DataFrame(rows).sort_values(['model', 'fold']).reset_index(drop=True)
+
+
+def summarize(results):
+    """Moyenne par moteur : précision et coût côte à côte"""
+    return results.groupby('model')[
+        ['mae', 'mape', 'fit_seconds', 'predict_seconds', 'peak_mb']
+    ].agg(['mean', 'max']).round(3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('csv', help='Série horaire (colonnes Datetime, PJME_MW par défaut)')
+    parser.add_argument('--time-column', default='Datetime')
+    parser.add_argument('--value-column', default='PJME_MW')
+    parser.add_argument('--models', default=','.join(MODELS), help='Moteurs séparés par des virgules')
+    parser.add_argument('--folds', type=int, default=12)
+    parser.add_argument('--horizon-days', type=int, default=7)
+    parser.add_argument('--step-days', type=int, default=None, help='Écart entre origines (défaut : horizon)')
+    parser.add_argument('--train-days', type=int, default=56, help='Fenêtre d\'entraînement de chaque pli')
+    parser.add_argument('--n-estimators', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', help='Écrire le détail par pli dans ce CSV')
+    args = parser.parse_args()
+    
+    models = [name.strip() for name in args.models.split(',')]
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        parser.error(f"Moteurs inconnus: {', '.join(sorted(unknown))}")
+    
+    series = load_csv(args.csv, args.time_column, args.value_column)
+    print(f"{len(series)} heures, du {series.index[0]} au {series.index[-1]}")
+    results = backtest(series, models, args.folds, args.horizon_days, args.step_days,
+                       args.train_days, args.workers, args.n_estimators)
+    if args.output:
+        results.to_csv(args.output, index=False)
+    print(summarize(results).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -8,12 +8,49 @@ class Config:
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-production')
     
     # MongoDB Configuration
-    MONGO_URI = os.getenv('MONGO_URI')
+    MONGO_URI = os.getenv('MONGO_URI', 'mongodb://localhost:27017/energy_dashboard')
+    # Consumption storage: 'documents' (one per reading) or 'buckets' (one per day)
+    CONSUMPTION_STORAGE = os.getenv('CONSUMPTION_STORAGE', 'documents')
     
     # Application Settings
     APP_NAME = os.getenv('APP_NAME', 'Energy Predictor')
     DEBUG = os.getenv('FLASK_ENV') == 'development'
     
+    # Model Registry: the version in MODEL_DIR/active_version (shared by every
+    # process), else MODEL_VERSION, else the latest artifact; the default
+    # MODEL_DIR is the models/ folder next to this file, whatever the working directory
+    MODEL_DIR = os.getenv('MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models'))
+    MODEL_VERSION = os.getenv('MODEL_VERSION')
+    # Full SARIMAX refit cadence; new hours are filtered in between (0 disables)
+    MODEL_REFIT_HOURS = int(os.getenv('MODEL_REFIT_HOURS', 168))
+    # Nightly trend scan over every user's daily totals (0 disables)
+    TREND_SCAN_HOURS = int(os.getenv('TREND_SCAN_HOURS', 24))
+    
+    # Forecast precomputation (refresh cadence and stored horizons, in days),
+    # run by a single `flask run-scheduler` process
+    FORECAST_INTERVAL_MINUTES = int(os.getenv('FORECAST_INTERVAL_MINUTES', 60))
+    FORECAST_HORIZONS = os.getenv('FORECAST_HORIZONS', '7,30')
+    # Upper bound on the number of series in one /api/predict/batch call
+    MAX_BATCH_SERIES = int(os.getenv('MAX_BATCH_SERIES', 5000))
+    
+    # Bulk ingestion (gateway token, write-behind batching and backpressure)
+    INGEST_TOKEN = os.getenv('INGEST_TOKEN')
+    INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 5000))
+    INGEST_FLUSH_INTERVAL = float(os.getenv('INGEST_FLUSH_INTERVAL', 1.0))
+    INGEST_MAX_PENDING = int(os.getenv('INGEST_MAX_PENDING', 100000))
+    MAX_INGEST_BYTES = int(os.getenv('MAX_INGEST_BYTES', 10 * 1024 * 1024))
+    
+    # How often each web worker reads new notifications written by other
+    # processes (scheduler, CLI) and pushes them to open tabs (seconds)
+    NOTIFICATION_RELAY_SECONDS = float(os.getenv('NOTIFICATION_RELAY_SECONDS', 2.0))
+    
+    # Response cache for consumption/forecast endpoints (seconds, entries)
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 60))
+    CACHE_MAX_ENTRIES = int(os.getenv('CACHE_MAX_ENTRIES', 512))
+    # Session user lookups (seconds, entries; a TTL of 0 disables the cache)
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 300))
+    USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 1024))
+    
     # Email Configuration
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
@@ -3,13 +3,227 @@ import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import os
+import threading
+
+# Features horaires : calendrier, retards et moyennes glissantes. Toutes ne
+# dépendent que des valeurs antérieures à t-24h, ce qui permet de prévoir
+# 24 heures d'un coup à partir de l'historique et des blocs déjà prévus.
+FEATURES = ['hour', 'dayofweek', 'month', 'lag_24', 'lag_168', 'rolling_mean_24', 'rolling_mean_168']
+BLOCK_HOURS = 24
+MIN_HISTORY_HOURS = 168 + 24  # fenêtre la plus longue (168h) décalée de 24h
+
+def to_hourly(historical_data):
+    """Ramener un DataFrame (index timestamp, colonne 'value') à un pas horaire régulier"""
+    series = historical_data['value'].sort_index().resample('h').mean()
+    return series.interpolate(method='time', limit_direction='both')
+
+def build_features(timestamps, values, positions):
+    """Calculer la matrice de features pour les positions demandées
+    
+    Args:
+        timestamps: datetime64 des positions (même longueur que positions)
+        values: série horaire complète (historique puis prévisions)
+        positions: indices des heures cibles dans values
+    
+    Returns:
+        Array (len(positions), len(FEATURES))
+    """
+    positions = np.asarray(positions)
+    hours = np.asarray(timestamps, dtype='datetime64[h]').astype(np.int64)
+    # Somme cumulée : chaque moyenne glissante devient une différence
+    csum = np.concatenate(([0.0], np.cumsum(values[:positions.max() + 1 - BLOCK_HOURS])))
+    end = positions - BLOCK_HOURS + 1  # fenêtres terminées à t-24 inclus
+    
+    features = np.empty((len(positions), len(FEATURES)))
+    features[:, 0] = hours % 24
+    features[:, 1] = (hours // 24 + 3) % 7  # 1970-01-01 était un jeudi
+    features[:, 2] = np.asarray(timestamps, dtype='datetime64[M]').astype(np.int64) % 12 + 1
+    features[:, 3] = values[positions - 24]
+    features[:, 4] = values[positions - 168]
+    features[:, 5] = (csum[end] - csum[end - 24]) / 24
+    features[:, 6] = (csum[end] - csum[end - 168]) / 168
+    return features
+
+def training_matrix(historical_data):
+    """Construire (X, y) pour l'entraînement à partir de l'historique horaire"""
+    series = to_hourly(historical_data)
+    values = series.to_numpy(dtype=np.float64)
+    positions = np.arange(MIN_HISTORY_HOURS, len(values))
+    if len(positions) == 0:
+        raise ValueError(f"Au moins {MIN_HISTORY_HOURS + 1} heures d'historique sont nécessaires")
+    X = build_features(series.index.to_numpy()[positions], values, positions)
+    return X, values[positions]
+
+# Moteur espace d'états : les paramètres sont estimés une fois, puis les
+# nouvelles heures sont absorbées par filtrage de Kalman (sans réestimation).
+SARIMAX_ORDER = (1, 1, 1)
+SARIMAX_SEASONAL_ORDER = (1, 1, 1, 24)
+SARIMAX_MAX_ROWS = 20000  # heures utilisées pour l'estimation
+SARIMAX_WINDOW_HOURS = 24 * 28  # heures conservées pour reconstruire l'état
+
+class SarimaxForecaster:
+    """SARIMAX estimé hors ligne et mis à jour de façon incrémentale
+    
+    Seuls les paramètres et une fenêtre récente sont persistés : au
+    chargement, la fenêtre est filtrée avec ces paramètres (quelques
+    dixièmes de seconde) au lieu de réestimer le modèle. Les nouvelles
+    heures complètes sont ensuite ajoutées à l'état par extend().
+    """
+    
+    def __init__(self, params, window, order=SARIMAX_ORDER, seasonal_order=SARIMAX_SEASONAL_ORDER,
+                 window_hours=SARIMAX_WINDOW_HOURS):
+        self.params = np.asarray(params, dtype=np.float64)
+        self.order = tuple(order)
+        self.seasonal_order = tuple(seasonal_order)
+        self.window_hours = window_hours
+        self._lock = threading.Lock()
+        self._window = window.iloc[-window_hours:]
+        self._results = self._filter(self._window)
+    
+    @classmethod
+    def fit(cls, historical_data, max_rows=SARIMAX_MAX_ROWS, start_params=None, maxiter=50):
+        """Estimer les paramètres sur les `max_rows` dernières heures
+        
+        Comme dans update(), la dernière heure est considérée en cours et
+        n'entre pas dans l'état : predict_hourly() prévoit alors à partir de
+        l'heure qui suit le dernier relevé, juste après fit() comme après update().
+        """
+        series = to_hourly(historical_data).iloc[:-1].iloc[-max_rows:]
+        if len(series) < 2 * SARIMAX_SEASONAL_ORDER[3] + 2:
+            raise ValueError("Historique trop court pour estimer le modèle SARIMAX")
+        model = cls._model(series, SARIMAX_ORDER, SARIMAX_SEASONAL_ORDER)
+        # low_memory : seuls les paramètres estimés sont conservés
+        results = model.fit(start_params=start_params, disp=False, maxiter=maxiter, low_memory=True)
+        return cls(results.params, series)
+    
+    @classmethod
+    def from_state(cls, state):
+        """Reconstruire le modèle à partir de l'état persisté par state()"""
+        index = pd.date_range(state['window_start'], periods=len(state['window']), freq='h')
+        # Copies : les tableaux peuvent être des memmap en lecture seule
+        window = pd.Series(np.array(state['window'], dtype=np.float64), index=index)
+        return cls(np.array(state['params']), window,
+                   state['order'], state['seasonal_order'], state['window_hours'])
+    
+    def state(self):
+        """Paramètres et fenêtre récente, tout ce qu'il faut pour recharger"""
+        with self._lock:
+            window = self._window
+        return {
+            'engine': 'sarimax',
+            'order': self.order,
+            'seasonal_order': self.seasonal_order,
+            'params': self.params,
+            'window': window.to_numpy(dtype=np.float64),
+            'window_start': window.index[0],
+            'window_hours': self.window_hours
+        }
+    
+    @property
+    def last_timestamp(self):
+        return self._window.index[-1]
+    
+    def update(self, historical_data):
+        """Absorber les heures complètes postérieures au dernier état
+        
+        Returns:
+            Nombre d'heures ajoutées
+        """
+        # La dernière heure est en cours : elle n'est pas encore définitive
+        series = to_hourly(historical_data).iloc[:-1]
+        with self._lock:
+            new = series[series.index > self.last_timestamp]
+            if new.empty:
+                return 0
+            if new.index[0] != self.last_timestamp + pd.Timedelta(hours=1):
+                # Trou dans les données : repartir de la fenêtre la plus récente
+                if len(series) < MIN_HISTORY_HOURS:
+                    return 0
+                self._window = series.iloc[-self.window_hours:]
+                self._results = self._filter(self._window)
+            else:
+                self._results = self._results.extend(self._prepare(new))
+                self._window = pd.concat((self._window, new)).iloc[-self.window_hours:]
+        return len(new)
+    
+    def forecast(self, hours):
+        """Prévoir les `hours` heures qui suivent le dernier état"""
+        with self._lock:
+            results = self._results
+        return np.maximum(np.asarray(results.forecast(hours)), 0)
+    
+    def predict_hourly(self, historical_data, hours):
+        """Mettre l'état à jour puis prévoir les `hours` heures après le dernier relevé"""
+        if len(historical_data):
+            self.update(historical_data)
+        # +1 : l'heure en cours n'a pas été absorbée
+        return self.forecast(hours + 1)[1:]
+    
+    def forecast_series(self, historical_data, hours):
+        """Prévoir une autre série avec les mêmes paramètres, sans toucher à l'état"""
+        series = to_hourly(historical_data).iloc[-self.window_hours:]
+        if len(series) < MIN_HISTORY_HOURS:
+            return None
+        return np.maximum(np.asarray(self._filter(series.iloc[:-1]).forecast(hours + 1))[1:], 0)
+    
+    def _filter(self, series):
+        model = self._model(series, self.order, self.seasonal_order)
+        return model.filter(self.params, cov_type='none')
+    
+    @staticmethod
+    def _prepare(series):
+        """Copie à index horaire explicite (fréquence et unité attendues par statsmodels)
+        
+        Le nom est fixé : extend() aligne les nouvelles heures sur le nom de
+        la série d'origine.
+        """
+        series = series.rename('value')
+        series.index = series.index.as_unit('ns')
+        series.index.freq = 'h'
+        return series
+    
+    @classmethod
+    def _model(cls, series, order, seasonal_order):
+        from statsmodels.tsa.statespace.sarimax import SARIMAX
+        return SARIMAX(cls._prepare(series), order=order, seasonal_order=seasonal_order)
+
+def train_model(historical_data, model_path, n_estimators=100, engine='forest', start_params=None):
+    """Entraîner hors ligne et écrire l'artefact chargé par EnergyPredictor(model_path=...)
+    
+    engine='sarimax' estime le modèle espace d'états et ne persiste que ses
+    paramètres et une fenêtre récente.
+    """
+    import joblib
+    predictor = EnergyPredictor()
+    os.makedirs(os.path.dirname(model_path) or '.', exist_ok=True)
+    if engine == 'sarimax':
+        predictor.model = SarimaxForecaster.fit(historical_data, start_params=start_params)
+        joblib.dump(predictor.model.state(), model_path)
+        return predictor
+    predictor.model.set_params(n_estimators=n_estimators)
+    X, y = training_matrix(historical_data)
+    predictor.model.fit(X, y)
+    joblib.dump(predictor.model, model_path)
+    return predictor
 
 class EnergyPredictor:
-    def __init__(self, model_path=None):
-        """Initialiser le prédicteur d'énergie"""
+    def __init__(self, model_path=None, mmap_mode='r'):
+        """Initialiser le prédicteur d'énergie
+        
+        Les artefacts .joblib sont ouverts avec mmap_mode : seuls les
+        tableaux numpy simples de l'artefact (état SARIMAX) sont projetés en
+        mémoire partagée. Les arbres d'une RandomForest sont des objets
+        sklearn, désérialisés en mémoire privée dans chaque processus.
+        """
         if model_path and os.path.exists(model_path):
-            with open(model_path, 'rb') as f:
-                self.model = pickle.load(f)
+            if model_path.endswith('.joblib'):
+                import joblib
+                self.model = joblib.load(model_path, mmap_mode=mmap_mode)
+                if isinstance(self.model, dict) and self.model.get('engine') == 'sarimax':
+                    self.model = SarimaxForecaster.from_state(self.model)
+            else:
+                with open(model_path, 'rb') as f:
+                    self.model = pickle.load(f)
         else:
             # Modèle par défaut (simplifié)
             self.model = self.create_default_model()
@@ -32,12 +246,13 @@ class EnergyPredictor:
             Array des prédictions
         """
         try:
-            # Si un vrai modèle est chargé
-            if hasattr(self.model, 'predict'):
-                # Préparer les features pour la prédiction
-                X_future = self.prepare_future_features(days_to_predict)
-                predictions = self.model.predict(X_future)
-                return predictions
+            # Si un vrai modèle entraîné est chargé
+            if self.is_fitted() and len(historical_data) > 0:
+                hourly = self.predict_hourly(historical_data, days_to_predict * 24)
+                if hourly is not None:
+                    # Moyenne horaire de chaque jour prévu
+                    return hourly.reshape(days_to_predict, 24).mean(axis=1)
+                return self.simulate_predictions(historical_data, days_to_predict)
             else:
                 # Simulation de prédiction pour la démo
                 return self.simulate_predictions(historical_data, days_to_predict)
@@ -74,7 +289,97 @@ class EnergyPredictor:
         
         return np.array(predictions)
     
-    def prepare_future_features(self, days_to_predict):
+    def predict_batch(self, histories, days_to_predict):
+        """Prédire plusieurs séries en empilant leurs features
+        
+        Pour chaque bloc de 24h, les features de toutes les séries sont
+        concaténées et passées au modèle en un seul appel.
+        
+        Args:
+            histories: dictionnaire {identifiant: DataFrame (index timestamp, colonne 'value')}
+            days_to_predict: Nombre de jours à prédire
+        
+        Returns:
+            Dictionnaire {identifiant: array des prédictions journalières}
+        """
+        hours = days_to_predict * 24
+        results = {}
+        stacked = []  # (identifiant, values, timestamps, n_history)
+        if isinstance(self.model, SarimaxForecaster):
+            # Mêmes paramètres, état filtré séparément pour chaque série
+            for series_id, historical_data in histories.items():
+                hourly = self.model.forecast_series(historical_data, hours) if len(historical_data) else None
+                results[series_id] = (hourly.reshape(days_to_predict, 24).mean(axis=1) if hourly is not None
+                                      else self.simulate_predictions(historical_data, days_to_predict))
+            return results
+        
+        for series_id, historical_data in histories.items():
+            series = to_hourly(historical_data) if len(historical_data) else None
+            if not self.is_fitted() or series is None or len(series) < MIN_HISTORY_HOURS:
+                results[series_id] = self.simulate_predictions(historical_data, days_to_predict)
+                continue
+            last = series.index[-1].to_datetime64().astype('datetime64[h]')
+            stacked.append((
+                series_id,
+                np.concatenate((series.to_numpy(dtype=np.float64), np.empty(hours))),
+                np.concatenate((series.index.to_numpy().astype('datetime64[h]'),
+                                last + np.arange(1, hours + 1).astype('timedelta64[h]'))),
+                len(series)
+            ))
+        
+        for offset in range(0, hours, BLOCK_HOURS):
+            if not stacked:
+                break
+            blocks = []
+            for _, values, timestamps, n_history in stacked:
+                positions = np.arange(n_history + offset, n_history + min(offset + BLOCK_HOURS, hours))
+                blocks.append((values, positions, self.prepare_future_features(values, timestamps, positions)))
+            predictions = np.maximum(self.model.predict(np.vstack([X for _, _, X in blocks])), 0)
+            start = 0
+            for values, positions, _ in blocks:
+                values[positions] = predictions[start:start + len(positions)]
+                start += len(positions)
+        
+        for series_id, values, _, n_history in stacked:
+            results[series_id] = values[n_history:].reshape(days_to_predict, 24).mean(axis=1)
+        return results
+    
+    def is_fitted(self):
+        """Le modèle est-il entraîné sur les features de build_features ?"""
+        if isinstance(self.model, SarimaxForecaster):
+            return True
+        return getattr(self.model, 'n_features_in_', None) == len(FEATURES)
+    
+    def predict_hourly(self, historical_data, hours):
+        """Prévoir les `hours` prochaines heures après le dernier relevé
+        
+        Les prévisions sont produites par blocs de 24h : les features d'un
+        bloc ne dépendent que de l'historique et des blocs précédents.
+        
+        Returns:
+            Array des prévisions horaires, ou None si l'historique est trop court
+        """
+        if isinstance(self.model, SarimaxForecaster):
+            return self.model.predict_hourly(historical_data, hours)
+        
+        series = to_hourly(historical_data)
+        if len(series) < MIN_HISTORY_HOURS:
+            return None
+        
+        n_history = len(series)
+        values = np.concatenate((series.to_numpy(dtype=np.float64), np.empty(hours)))
+        last = series.index[-1].to_datetime64().astype('datetime64[h]')
+        timestamps = np.concatenate((
+            series.index.to_numpy().astype('datetime64[h]'),
+            last + np.arange(1, hours + 1).astype('timedelta64[h]')
+        ))
+        
+        for start in range(n_history, n_history + hours, BLOCK_HOURS):
+            positions = np.arange(start, min(start + BLOCK_HOURS, n_history + hours))
+            X = self.prepare_future_features(values, timestamps, positions)
+            values[positions] = np.maximum(self.model.predict(X), 0)  # Pas de valeurs négatives
+        return values[n_history:]
+    
+    def prepare_future_features(self, values, timestamps, positions):
         """Préparer les features pour les prédictions futures"""
-        # À implémenter selon les besoins de votre modèle
-        pass
\ No newline at end of file
+        return build_features(timestamps[positions], values, positions)
\ No newline at end of file
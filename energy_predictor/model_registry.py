@@ -0,0 +1,129 @@
+import glob
+import os
+import threading
+
+from model import EnergyPredictor
+
+ARTIFACT_PREFIX = 'energy_model-'
+ARTIFACT_SUFFIX = '.joblib'
+DEFAULT_VERSION = 'default'
+ACTIVE_POINTER = 'active_version'
+
+
+class ModelRegistry:
+    """Registre des modèles partagé par toutes les requêtes et tous les threads
+    
+    Les artefacts versionnés (models/energy_model-<version>.joblib) sont
+    chargés une seule fois. La version active est remplacée de façon atomique
+    par activate() : les requêtes en cours terminent avec l'ancien modèle.
+    
+    activate() écrit aussi la version dans un pointeur partagé
+    (models/active_version, remplacé d'un bloc). À chaque get(), un stat du
+    pointeur suffit pour voir qu'un autre processus (worker web,
+    planificateur, commande CLI) a changé de version : elle est alors
+    chargée, et tous les processus servent la même version.
+    """
+    
+    def __init__(self, model_dir):
+        self.model_dir = model_dir
+        self._lock = threading.Lock()
+        self._active = None  # tuple (version, predictor), remplacé en bloc
+        self._pointer = None  # (inode, mtime) du pointeur déjà pris en compte
+    
+    def artifact_path(self, version):
+        """Chemin de l'artefact d'une version"""
+        return os.path.join(self.model_dir, f'{ARTIFACT_PREFIX}{version}{ARTIFACT_SUFFIX}')
+    
+    def pointer_path(self):
+        """Chemin du pointeur vers la version active"""
+        return os.path.join(self.model_dir, ACTIVE_POINTER)
+    
+    def versions(self):
+        """Versions disponibles, de la plus ancienne à la plus récente"""
+        paths = glob.glob(os.path.join(self.model_dir, f'{ARTIFACT_PREFIX}*{ARTIFACT_SUFFIX}'))
+        paths.sort(key=os.path.getmtime)
+        return [os.path.basename(p)[len(ARTIFACT_PREFIX):-len(ARTIFACT_SUFFIX)] for p in paths]
+    
+    def latest(self):
+        """Version la plus récente, ou le modèle par défaut s'il n'y a aucun artefact"""
+        available = self.versions()
+        return available[-1] if available else DEFAULT_VERSION
+    
+    def load(self, version=None):
+        """Charger au démarrage la version du pointeur, sinon celle demandée (ou la plus récente)
+        
+        version (MODEL_VERSION) ne sert qu'en l'absence de pointeur : un
+        worker redémarré reprend la version activée entre-temps.
+        """
+        if self._sync():
+            return self._active[0]
+        return self.activate(version or self.latest())
+    
+    def activate(self, version):
+        """Charger une version, la rendre active sans redémarrage et la publier aux autres processus"""
+        self._swap(version)
+        try:
+            self._write_pointer(version)
+        except OSError as e:
+            print(f"Erreur lors de l'écriture du pointeur de version: {e}")
+        return version
+    
+    def get(self):
+        """Retourner (version, predictor) actifs ; à lire une fois par requête"""
+        self._sync()
+        active = self._active
+        if active is None:
+            self.load()
+            active = self._active
+        return active
+    
+    def _swap(self, version):
+        if version == DEFAULT_VERSION:
+            predictor = EnergyPredictor()
+        else:
+            path = self.artifact_path(version)
+            if not os.path.exists(path):
+                raise ValueError(f"Version de modèle inconnue: {version}")
+            predictor = EnergyPredictor(model_path=path)
+        
+        # Le chargement se fait hors verrou, seul l'échange est protégé
+        with self._lock:
+            self._active = (version, predictor)
+    
+    def _sync(self):
+        """Charger la version du pointeur si un autre processus l'a changée
+        
+        Returns:
+            True si le pointeur existe et que sa version est active
+        """
+        try:
+            stat = os.stat(self.pointer_path())
+        except FileNotFoundError:
+            return False
+        token = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            # Un seul thread recharge ; les autres servent l'ancienne version en attendant
+            if token == self._pointer:
+                return self._active is not None
+            self._pointer = token
+        
+        try:
+            with open(self.pointer_path()) as f:
+                version = f.read().strip()
+            if self._active is None or self._active[0] != version:
+                self._swap(version)
+            return True
+        except (OSError, ValueError) as e:
+            print(f"Erreur lors du chargement de la version active partagée: {e}")
+            return self._active is not None
+    
+    def _write_pointer(self, version):
+        # Fichier temporaire puis os.replace : un lecteur voit l'ancienne ou la nouvelle version
+        os.makedirs(self.model_dir, exist_ok=True)
+        tmp_path = f'{self.pointer_path()}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(version)
+        stat = os.stat(tmp_path)  # os.replace conserve inode et date de modification
+        os.replace(tmp_path, self.pointer_path())
+        with self._lock:
+            self._pointer = (stat.st_ino, stat.st_mtime_ns)
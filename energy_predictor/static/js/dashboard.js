@@ -9,9 +9,7 @@ class EnergyDashboard {
         this.loadHistoricalData('7d');
         this.setupEventListeners();
         this.checkNotifications();
-        
-        // Vérifier les notifications toutes les 30 secondes
-        setInterval(() => this.checkNotifications(), 30000);
+        this.subscribeNotifications();
     }
 
     setupEventListeners() {
@@ -75,14 +73,15 @@ class EnergyDashboard {
                 container.innerHTML = '<div class="loading"><div class="spinner"></div></div>';
             }
             
-            const response = await fetch(`/api/consumption/historical?period=${period}`);
+            // Colonnes float32 : la figure est construite ici, pas sur le serveur
+            const response = await fetch(`/api/consumption/historical?period=${period}&encoding=float32`);
             const data = await response.json();
             
             if (data.error) {
                 throw new Error(data.error);
             }
             
-            this.renderHistoricalChart(data.graph);
+            this.renderHistoricalChart(data);
         } catch (error) {
             console.error('Erreur lors du chargement des données historiques:', error);
             this.showError('Impossible de charger les données historiques');
@@ -112,7 +111,7 @@ class EnergyDashboard {
                 throw new Error(data.error);
             }
             
-            this.renderPredictionChart(data.graph);
+            this.renderPredictionChart(data);
             this.handleTrendWarnings(data.trend_warnings);
             
         } catch (error) {
@@ -121,9 +120,39 @@ class EnergyDashboard {
         }
     }
 
+    subscribeNotifications() {
+        // Sans EventSource, interroger le compteur toutes les 30 secondes
+        if (!window.EventSource) {
+            setInterval(() => this.checkNotifications(), 30000);
+            return;
+        }
+        
+        // Filet de sécurité (flux coupé par un proxy, badge remis à zéro
+        // depuis un autre worker) : relire le compteur toutes les 5 minutes
+        setInterval(() => this.checkNotifications(), 300000);
+        
+        // Le serveur pousse le compteur à la connexion (et à chaque reconnexion
+        // automatique) puis chaque nouvelle notification
+        const source = new EventSource('/api/notifications/stream');
+        source.addEventListener('unread', (e) => {
+            this.updateNotificationBadge(JSON.parse(e.data).unread_count);
+        });
+        source.addEventListener('notification', (e) => {
+            const data = JSON.parse(e.data);
+            this.updateNotificationBadge(data.unread_count);
+            if (window.location.pathname.includes('notifications')) {
+                this.checkNotifications();
+            } else if (data.notification.level === 'critical') {
+                this.showAlert(data.notification.title, data.notification.message, 'danger');
+            }
+        });
+    }
+
     async checkNotifications() {
         try {
-            const response = await fetch('/api/notifications');
+            // La liste complète n'est utile que sur la page des notifications
+            const onNotificationsPage = window.location.pathname.includes('notifications');
+            const response = await fetch(onNotificationsPage ? '/api/notifications' : '/api/notifications/unread-count');
             const data = await response.json();
             
             if (data.error) {
@@ -133,7 +162,7 @@ class EnergyDashboard {
             this.updateNotificationBadge(data.unread_count);
             
             // Si nous sommes sur la page des notifications, les afficher
-            if (window.location.pathname.includes('notifications')) {
+            if (onNotificationsPage) {
                 this.displayNotifications(data.notifications);
             }
             
@@ -194,12 +223,42 @@ class EnergyDashboard {
         if (dataPointsElement) dataPointsElement.textContent = data.data_points;
     }
 
-    renderHistoricalChart(graphJson) {
+    // Colonne renvoyée par l'API : liste JSON ou {dtype: 'float32', data: base64}
+    decodeColumn(column) {
+        if (Array.isArray(column)) return column;
+        const bytes = Uint8Array.from(atob(column.data), c => c.charCodeAt(0));
+        return Array.from(new Float32Array(bytes.buffer));
+    }
+
+    // Figure Plotly : celle du serveur (format=plotly) ou construite à partir des colonnes
+    buildFigure(data, traces, layout) {
+        if (data.graph) return JSON.parse(data.graph);
+        return {
+            data: traces,
+            layout: Object.assign({
+                template: 'plotly',
+                legend: { orientation: 'h' },
+                margin: { t: 60, r: 20, b: 50, l: 60 }
+            }, layout)
+        };
+    }
+
+    renderHistoricalChart(data) {
         const container = document.getElementById('historical-chart');
         if (!container) return;
         
         try {
-            const graph = JSON.parse(graphJson);
+            const graph = this.buildFigure(data, data.graph ? [] : [{
+                x: data.dates,
+                y: this.decodeColumn(data.values),
+                type: 'scatter',
+                mode: 'lines',
+                name: 'Consommation'
+            }], {
+                title: { text: `Consommation énergétique - ${data.days} derniers jours` },
+                xaxis: { title: { text: 'Date' } },
+                yaxis: { title: { text: 'Consommation (kWh)' } }
+            });
             Plotly.newPlot(container, graph.data, graph.layout, {
                 responsive: true,
                 displayModeBar: true
@@ -210,12 +269,29 @@ class EnergyDashboard {
         }
     }
 
-    renderPredictionChart(graphJson) {
+    renderPredictionChart(data) {
         const container = document.getElementById('prediction-chart');
         if (!container) return;
         
         try {
-            const graph = JSON.parse(graphJson);
+            const graph = this.buildFigure(data, data.graph ? [] : [{
+                x: data.dates,
+                y: this.decodeColumn(data.predictions),
+                type: 'scatter',
+                mode: 'lines',
+                name: 'Prédiction'
+            }, {
+                x: data.recent.dates,
+                y: this.decodeColumn(data.recent.values),
+                type: 'scatter',
+                mode: 'lines',
+                name: 'Historique récent',
+                line: { color: 'gray', dash: 'dash' }
+            }], {
+                title: { text: `Prédiction de consommation - ${data.days} prochains jours` },
+                xaxis: { title: { text: 'Date' } },
+                yaxis: { title: { text: 'Consommation prédite (kWh)' } }
+            });
             Plotly.newPlot(container, graph.data, graph.layout, {
                 responsive: true,
                 displayModeBar: true
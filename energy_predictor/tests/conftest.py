@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# Les modules de l'application s'importent depuis energy_predictor/ (utils.*, model...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db_handler(monkeypatch):
+    """MongoDBHandler sur une base mongomock en mémoire"""
+    mongomock = pytest.importorskip('mongomock')
+    import utils.database
+    
+    # pymongo >= 4.9 passe sort= aux UpdateOne, que mongomock ne connaît pas encore
+    add_update = mongomock.collection.BulkOperationBuilder.add_update
+    monkeypatch.setattr(mongomock.collection.BulkOperationBuilder, 'add_update',
+                        lambda self, *args, sort=None, **kwargs: add_update(self, *args, **kwargs))
+    
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(utils.database, 'MongoClient', lambda *args, **kwargs: client)
+    return utils.database.MongoDBHandler('mongodb://test', storage_mode='documents', user_cache_ttl=0)
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+
+
+def profile(index):
+    hours = index.hour.to_numpy()
+    return 100 + 20 * np.sin(2 * np.pi * hours / 24) + hours
+
+
+@pytest.fixture
+def series(monkeypatch):
+    index = pd.date_range('2024-03-01', periods=20 * 24, freq='h')
+    frame = pd.DataFrame({'value': profile(index)}, index=index)
+    monkeypatch.setattr(backtest, '_series', frame)
+    return frame
+
+
+def test_sarimax_fold_forecast_matches_the_test_window(series):
+    origin, train_hours = 15 * 24, 10 * 24
+    train = series.iloc[origin - train_hours:origin]
+
+    predictor = backtest.fit_model('sarimax', train)
+    hourly = predictor.predict_hourly(train, 24)
+
+    # Heures prévues = les 24 premières heures du pli de test, sans décalage
+    np.testing.assert_allclose(hourly, series['value'].to_numpy()[origin:origin + 24], atol=1.0)
+
+
+def test_run_fold_scores_sarimax_on_its_own_horizon(series):
+    result = backtest.run_fold(('sarimax', 0, 15 * 24, 10 * 24, 2, 10))
+
+    assert result['origin'] == series.index[15 * 24]
+    assert result['mae'] < 1.0
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from utils.cache import ResponseCache
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = ResponseCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute(('k',), compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cache.stats()['coalesced'] < 7:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == [42] * 8
+    assert cache.get_or_compute(('k',), compute) == 42 and cache.stats()['hits'] == 1
+
+
+def test_failed_computation_is_not_cached():
+    cache = ResponseCache()
+
+    def fail():
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute(('k',), fail)
+    assert cache.get_or_compute(('k',), lambda: 1) == 1
+
+
+def test_invalidate_namespaces_keeps_the_others():
+    cache = ResponseCache()
+    cache.get_or_compute(('current',), lambda: 'c')
+    cache.get_or_compute(('historical', 7), lambda: 'h')
+    cache.get_or_compute(('predict', 'u1', 7), lambda: 'p')
+
+    cache.invalidate('current', 'historical')
+
+    assert cache.get_or_compute(('current',), lambda: 'new') == 'new'
+    assert cache.get_or_compute(('historical', 7), lambda: 'new') == 'new'
+    assert cache.get_or_compute(('predict', 'u1', 7), lambda: 'new') == 'p'
+
+
+def test_invalidate_during_computation_drops_the_result():
+    cache = ResponseCache()
+
+    def compute():
+        cache.invalidate('current')
+        return 'stale'
+
+    assert cache.get_or_compute(('current',), compute) == 'stale'
+    assert cache.get_or_compute(('current',), lambda: 'fresh') == 'fresh'
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from utils.downsampling import downsample
+
+
+def series(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.arange(n, dtype=float), rng.normal(size=n)
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_short_series_is_returned_whole(method):
+    x, y = series(50)
+    assert downsample(x, y, 100, method).tolist() == list(range(50))
+
+
+def test_lttb_keeps_the_endpoints_and_the_budget():
+    x, y = series(10_000)
+    indices = downsample(x, y, 500, "lttb")
+
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(y) - 1
+    assert (np.diff(indices) > 0).all()
+
+
+def test_minmax_keeps_every_bucket_extreme():
+    x, y = series(10_000)
+    y[1234], y[8765] = 50.0, -50.0
+    indices = downsample(x, y, 200, "minmax")
+
+    assert len(indices) <= 200
+    assert (np.diff(indices) > 0).all()
+    assert {1234, 8765} <= set(indices.tolist())
+
+
+def test_minmax_may_drop_the_endpoints():
+    y = np.array([0.5, 1.0, 0.0, 0.5, 0.5, 1.0, 0.0, 0.5])
+    indices = downsample(np.arange(len(y)), y, 4, "minmax")
+
+    assert indices.tolist() == [1, 2, 5, 6]
+
+
+def test_unknown_method_is_rejected():
+    x, y = series(10)
+    with pytest.raises(ValueError):
+        downsample(x, y, 5, "median")
@@ -0,0 +1,138 @@
+from datetime import datetime
+import json
+
+import msgpack
+import pytest
+
+from utils.ingest import IngestBuffer, parse_readings, validate_readings
+
+NOW = datetime(2024, 3, 1, 12)
+
+
+def ndjson(*readings):
+    return '\n'.join(json.dumps(reading) for reading in readings).encode()
+
+
+def validate(*readings):
+    return validate_readings(parse_readings(ndjson(*readings), 'application/x-ndjson'), now=NOW)
+
+
+def test_epoch_and_iso_timestamps_in_one_batch():
+    readings, rejected = validate(
+        {'ts': 1709290800, 'v': 1.5, 's': 'm1'},              # 2024-03-01T11:00:00Z
+        {'ts': '2024-03-01T10:00:00Z', 'v': 2.0, 's': 'm1'},
+        {'ts': '2024-03-01T09:00:00+01:00', 'v': 2.5, 's': 'm1'},
+    )
+
+    assert rejected == 0
+    assert readings['timestamp'].tolist() == [datetime(2024, 3, 1, 11), datetime(2024, 3, 1, 10),
+                                              datetime(2024, 3, 1, 8)]
+
+
+def test_numeric_batch_is_epoch_seconds():
+    readings, rejected = validate({'ts': 1709290800, 'v': 1, 's': 'm1'}, {'ts': 1709290860.5, 'v': 1, 's': 'm1'})
+
+    assert rejected == 0
+    assert readings['timestamp'].iloc[1] == datetime(2024, 3, 1, 11, 1, 0, 500000)
+
+
+@pytest.mark.parametrize('timestamp', [
+    5,                          # epoch 1970
+    '1999-12-31T23:59:59Z',     # avant MIN_TIMESTAMP
+    '2024-03-01T12:10:00Z',     # dans le futur au-delà de la dérive tolérée
+    'hier',
+    True,
+    None,
+])
+def test_rejects_bad_timestamps(timestamp):
+    readings, rejected = validate({'ts': timestamp, 'v': 1, 's': 'm1'}, {'ts': '2024-03-01T10:00:00Z', 'v': 1, 's': 'm1'})
+
+    assert rejected == 1
+    assert len(readings) == 1
+
+
+@pytest.mark.parametrize('reading', [
+    {'v': -1, 's': 'm1'},
+    {'v': float('nan'), 's': 'm1'},
+    {'v': 'beaucoup', 's': 'm1'},
+    {'v': 1, 's': ''},
+    {'v': 1},
+])
+def test_rejects_bad_values_and_sources(reading):
+    readings, rejected = validate({'ts': '2024-03-01T10:00:00Z', **reading})
+
+    assert rejected == 1
+    assert readings.empty
+
+
+def test_mixed_key_styles_keep_every_reading():
+    readings, rejected = validate(
+        {'timestamp': '2024-03-01T10:00:00Z', 'value': 1.0, 'source': 'm1', 'user_id': 'alice'},
+        {'ts': '2024-03-01T11:00:00Z', 'v': 2.0, 's': 'm2'},
+    )
+
+    assert rejected == 0
+    assert readings['source'].tolist() == ['m1', 'm2']
+    assert readings['value'].tolist() == [1.0, 2.0]
+    assert readings['user_id'].tolist() == ['alice', None]
+
+
+def test_msgpack_columns_with_scalar_source():
+    # 11:00 et 14:00 UTC : la seconde est dans le futur
+    body = msgpack.packb({'ts': [1709290800, 1709301600], 'v': [1.0, 2.0], 's': 'm1'})
+
+    readings, rejected = validate_readings(parse_readings(body, 'application/msgpack'), now=NOW)
+
+    assert rejected == 1
+    assert readings['source'].tolist() == ['m1']
+
+
+def ingest_batch(db_handler, batch, **kwargs):
+    """Passer un lot par le tampon et retourner (stats, lots reçus par on_flush)"""
+    flushed = []
+    buffer = IngestBuffer(db_handler, flush_interval=0.01, on_flush=flushed.append, **kwargs)
+    buffer._pending.extend(batch)
+    buffer.close()
+    return buffer.stats(), flushed
+
+
+def readings_at(*hours):
+    return [{'timestamp': datetime(2024, 3, 1, hour), 'value': 1.0, 'unit': 'kWh', 'source': 'm1',
+             'user_id': None} for hour in hours]
+
+
+def test_flush_accounts_for_a_partial_bulk_write(db_handler):
+    duplicate = readings_at(9)[0]
+    db_handler.db.consumption.insert_one(duplicate)
+    batch = readings_at(10, 11)
+    batch.insert(1, {**readings_at(9)[0], '_id': duplicate['_id']})  # clé dupliquée
+
+    stats, flushed = ingest_batch(db_handler, batch)
+
+    assert (stats['flushed'], stats['failed'], stats['rollup_failed']) == (2, 1, 0)
+    assert [point['timestamp'].hour for point in flushed[0]] == [10, 11]
+    # Seuls les relevés écrits entrent dans les cumuls
+    assert sorted(doc['bucket'].hour for doc in db_handler.db.consumption_hourly.find()) == [10, 11]
+
+
+def test_rollup_failure_is_counted_separately(db_handler, monkeypatch):
+    def fail(data_points):
+        raise RuntimeError('cumuls indisponibles')
+    monkeypatch.setattr(db_handler, 'update_rollups', fail)
+
+    stats, flushed = ingest_batch(db_handler, readings_at(10, 11))
+
+    assert (stats['flushed'], stats['failed'], stats['rollup_failed']) == (2, 0, 2)
+    assert db_handler.db.consumption.count_documents({}) == 2
+    assert len(flushed) == 1
+
+
+def test_close_drains_pending_readings(db_handler):
+    buffer = IngestBuffer(db_handler, batch_size=100, flush_interval=60)
+    buffer._pending.extend(readings_at(*range(5)))
+    assert db_handler.db.consumption.count_documents({}) == 0
+
+    buffer.close()
+
+    assert db_handler.db.consumption.count_documents({}) == 5
+    assert buffer.stats()['flushed'] == 5
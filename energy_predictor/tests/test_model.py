@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from model import EnergyPredictor, SarimaxForecaster, to_hourly, training_matrix
+
+
+def profile(index):
+    """Profil journalier asymétrique : un décalage d'une heure se voit"""
+    hours = index.hour.to_numpy()
+    return 100 + 20 * np.sin(2 * np.pi * hours / 24) + hours
+
+
+def history(days=10):
+    index = pd.date_range('2024-03-01', periods=days * 24, freq='h')
+    return pd.DataFrame({'value': profile(index)}, index=index)
+
+
+def next_hours(df, hours):
+    return pd.date_range(df.index[-1] + pd.Timedelta(hours=1), periods=hours, freq='h')
+
+
+def test_sarimax_forecast_starts_at_the_hour_after_the_last_reading():
+    df = history()
+    forecaster = SarimaxForecaster.fit(df, maxiter=10)
+
+    # Même état après fit() qu'après update() : la dernière heure n'est pas absorbée
+    assert forecaster.last_timestamp == df.index[-2]
+    np.testing.assert_allclose(forecaster.predict_hourly(df, 24), profile(next_hours(df, 24)), atol=1.0)
+
+
+def test_sarimax_and_forest_forecast_the_same_hours():
+    df = history()
+    forest = EnergyPredictor()
+    forest.model.set_params(n_estimators=20)
+    forest.model.fit(*training_matrix(df))
+    sarimax = EnergyPredictor()
+    sarimax.model = SarimaxForecaster.fit(df, maxiter=10)
+
+    expected = profile(next_hours(df, 24))
+    for predictor in (forest, sarimax):
+        hourly = predictor.predict_hourly(df, 24)
+        assert np.argmax(hourly) == np.argmax(expected)
+        assert np.argmin(hourly) == np.argmin(expected)
+
+
+def test_update_after_fit_absorbs_only_complete_hours():
+    df = history()
+    forecaster = SarimaxForecaster.fit(df.iloc[:-24], maxiter=10)
+
+    added = forecaster.update(df)
+
+    assert added == 24
+    assert forecaster.last_timestamp == to_hourly(df).index[-2]
@@ -0,0 +1,68 @@
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from model import SarimaxForecaster, train_model
+from model_registry import DEFAULT_VERSION, ModelRegistry
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    for version in ('v1', 'v2'):
+        joblib.dump({'version': version}, tmp_path / f'energy_model-{version}.joblib')
+    return str(tmp_path)
+
+
+def test_activation_reaches_the_other_processes(model_dir):
+    worker, scheduler = ModelRegistry(model_dir), ModelRegistry(model_dir)
+    worker.load('v1')
+    scheduler.load()
+    assert scheduler.get()[0] == 'v1'
+
+    scheduler.activate('v2')
+
+    version, predictor = worker.get()
+    assert version == 'v2' and predictor.model == {'version': 'v2'}
+
+
+def test_restarted_worker_follows_the_pointer_not_its_startup_version(model_dir):
+    ModelRegistry(model_dir).activate('v2')
+
+    assert ModelRegistry(model_dir).load('v1') == 'v2'
+
+
+def test_unknown_version_in_the_pointer_keeps_the_active_model(model_dir):
+    worker = ModelRegistry(model_dir)
+    worker.load('v1')
+    with open(os.path.join(model_dir, 'active_version.tmp'), 'w') as f:
+        f.write('v9')
+    os.replace(os.path.join(model_dir, 'active_version.tmp'), os.path.join(model_dir, 'active_version'))
+
+    assert worker.get()[0] == 'v1'
+
+
+def test_pointer_is_replaced_without_leftovers(model_dir):
+    registry = ModelRegistry(model_dir)
+    registry.activate('v1')
+    registry.activate(DEFAULT_VERSION)
+
+    assert sorted(os.listdir(model_dir)) == ['active_version', 'energy_model-v1.joblib', 'energy_model-v2.joblib']
+    with open(os.path.join(model_dir, 'active_version')) as f:
+        assert f.read() == DEFAULT_VERSION
+
+
+def test_refit_in_the_scheduler_reaches_the_web_workers(tmp_path):
+    index = pd.date_range('2024-03-01', periods=5 * 24, freq='h')
+    df = pd.DataFrame({'value': 100 + 10 * np.sin(2 * np.pi * index.hour / 24)}, index=index)
+    web, scheduler = ModelRegistry(str(tmp_path)), ModelRegistry(str(tmp_path))
+    web.load()
+
+    train_model(df, scheduler.artifact_path('sarimax-1'), engine='sarimax')
+    scheduler.activate('sarimax-1')
+
+    version, predictor = web.get()
+    assert version == 'sarimax-1'
+    assert isinstance(predictor.model, SarimaxForecaster)
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from utils.notifications import NotificationManager, NotificationRelay
+
+
+def insert_daily_totals(db_handler, user_id, values, end_date):
+    """Cumuls journaliers se terminant la veille de end_date"""
+    last_day = datetime(end_date.year, end_date.month, end_date.day) - timedelta(days=1)
+    db_handler.db.consumption_daily.insert_many([
+        {'source': 'demo', 'user_id': user_id, 'bucket': last_day - timedelta(days=len(values) - 1 - i),
+         'sum': float(value), 'count': 24, 'min': 0.0, 'max': float(value)}
+        for i, value in enumerate(values)
+    ])
+
+
+def test_scan_users_is_idempotent(db_handler):
+    end_date = datetime(2024, 3, 1, 3)
+    # Semaine en forte hausse : tendance, pic et hausse hebdomadaire
+    insert_daily_totals(db_handler, 'alice', [100] * 14 + [100, 120, 140, 160, 180, 200, 400], end_date)
+    insert_daily_totals(db_handler, 'bob', [100] * 21, end_date)
+    manager = NotificationManager(db_handler)
+    
+    created = manager.scan_users(days=21, end_date=end_date)
+    
+    assert created > 0
+    assert db_handler.db.notifications.count_documents({'user_id': 'bob'}) == 0
+    # Sans index unique : l'upsert suffit à ne rien dupliquer
+    assert manager.scan_users(days=21, end_date=end_date) == 0
+    assert db_handler.db.notifications.count_documents({}) == created
+    
+    # Un autre jour donne de nouvelles alertes
+    assert manager.scan_users(days=21, end_date=end_date + timedelta(hours=1)) == 0
+    assert manager.scan_users(days=21, end_date=end_date + timedelta(days=1)) > 0
+
+
+def test_scan_users_with_unique_index(db_handler):
+    end_date = datetime(2024, 3, 1, 3)
+    insert_daily_totals(db_handler, 'alice', [100] * 14 + [200] * 7, end_date)
+    db_handler.create_indexes()
+    manager = NotificationManager(db_handler)
+    
+    created = manager.scan_users(days=21, end_date=end_date)
+    
+    assert created >= 1
+    assert manager.scan_users(days=21, end_date=end_date) == 0
+    notification = db_handler.db.notifications.find_one({'metadata.kind': 'week_increase'})
+    assert notification['dedupe_key'] == 'alice:week_increase:2024-03-01'
+
+
+def test_create_notifications_returns_inserted_documents(db_handler):
+    inserted = db_handler.create_notifications([
+        {'user_id': 'alice', 'title': 'A', 'message': 'a', 'dedupe_key': 'alice:peak:2024-03-01'},
+        {'user_id': 'alice', 'title': 'B', 'message': 'b'},
+    ])
+    again = db_handler.create_notifications([
+        {'user_id': 'alice', 'title': 'A', 'message': 'a', 'dedupe_key': 'alice:peak:2024-03-01'},
+    ])
+    
+    assert [document['title'] for document in inserted] == ['A', 'B']
+    assert all('_id' in document for document in inserted)
+    assert again == []
+    assert db_handler.db.notifications.count_documents({}) == 2
+
+
+def test_check_trends_single_series():
+    manager = NotificationManager(db_handler=None)
+    
+    findings = manager.check_trends(np.array([100, 110, 125, 300, 130]))
+    
+    assert [finding['level'] for finding in findings] == ['warning', 'critical']
+    assert manager.check_trends([]) == []
+
+
+def test_scan_users_describes_past_consumption(db_handler):
+    end_date = datetime(2024, 3, 1, 3)
+    insert_daily_totals(db_handler, 'alice', [100] * 20 + [400], end_date)
+    
+    NotificationManager(db_handler).scan_users(days=21, end_date=end_date)
+    
+    peak = db_handler.db.notifications.find_one({'metadata.kind': 'peak'})
+    assert peak['title'] == 'Pic de consommation'
+    assert peak['message'] == 'Pic de 400.0 kWh le 29/02/2024'
+    assert all('prévu' not in notification['message'] for notification in db_handler.db.notifications.find())
+
+
+def test_relay_pushes_notifications_created_by_another_process(db_handler):
+    from utils.pubsub import PubSub
+    
+    # Worker web : PubSub local et relais ; le planificateur n'a pas de broker
+    broker = PubSub()
+    relay = NotificationRelay(db_handler, broker, interval=3600)
+    subscription = relay.subscribe('alice')
+    scheduler = NotificationManager(db_handler)
+    
+    scheduler.create_notification('alice', 'Titre', 'Premier')
+    scheduler.create_notification('alice', 'Titre', 'Second')
+    scheduler.create_notification('bob', 'Titre', 'Sans onglet ouvert')
+    assert relay.poll() == 1
+    
+    message = subscription.get_nowait()
+    assert (message['event'], message['unread_count']) == ('notification', 2)
+    assert message['notification']['message'] == 'Second'
+    # Déjà relayée : pas de doublon au passage suivant malgré le recouvrement
+    assert relay.poll() == 0
+    assert subscription.empty()
+
+
+def test_relay_counts_unread_only_for_listeners(db_handler, monkeypatch):
+    from utils.pubsub import PubSub
+    
+    relay = NotificationRelay(db_handler, PubSub(), interval=3600)
+    counts = []
+    count_unread = db_handler.count_unread_notifications
+    monkeypatch.setattr(db_handler, 'count_unread_notifications',
+                        lambda user_id: counts.append(user_id) or count_unread(user_id))
+    
+    NotificationManager(db_handler).create_notification('alice', 'Titre', 'Message')
+    assert relay.poll() == 0
+    
+    subscription = relay.subscribe('alice')
+    NotificationManager(db_handler).create_notification('alice', 'Titre', 'Message')
+    assert relay.poll() == 1
+    assert counts == ['alice']
+    
+    relay.unsubscribe('alice', subscription)
+    assert relay.poll() == 0
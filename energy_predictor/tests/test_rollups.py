@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta
+
+
+def readings(day, hours, value=1.0):
+    return [{'timestamp': day + timedelta(hours=hour, minutes=30), 'value': value, 'unit': 'kWh',
+             'source': 'm1', 'user_id': None} for hour in hours]
+
+
+def daily(db_handler):
+    return {doc['bucket'].day: (doc['sum'], doc['count']) for doc in db_handler.db.consumption_daily.find()}
+
+
+def test_rebuild_rollups_repairs_a_range(db_handler):
+    first, second = datetime(2024, 3, 1), datetime(2024, 3, 2)
+    db_handler.insert_consumption(readings(first, range(24)) + readings(second, range(24)))
+    # Relevés écrits sans leurs cumuls (échec entre les deux écritures)
+    db_handler.store_readings(readings(second, range(3), value=5.0))
+    assert daily(db_handler)[2] == (24.0, 24)
+
+    db_handler.rebuild_rollups(start_date=second + timedelta(hours=5), end_date=second + timedelta(hours=6))
+
+    assert daily(db_handler) == {1: (24.0, 24), 2: (39.0, 27)}
+    hourly = {doc['bucket']: doc['count'] for doc in db_handler.db.consumption_hourly.find()}
+    assert len(hourly) == 48
+    assert hourly[second] == 2
+
+
+def test_create_indexes_reports_failures_without_skipping_others(db_handler):
+    day = datetime(2024, 3, 1)
+    # Buckets scindés par des upserts concurrents : l'index unique échoue
+    db_handler.db.consumption_buckets.insert_many([
+        {'source': 'm1', 'user_id': None, 'day': day, 'offsets': [0], 'values': [1.0], 'count': 1},
+        {'source': 'm1', 'user_id': None, 'day': day, 'offsets': [1], 'values': [1.0], 'count': 1},
+    ])
+
+    assert db_handler.create_indexes() is False
+
+    indexes = db_handler.db.notifications.index_information()
+    assert any(index['key'] == [('user_id', 1), ('read', 1)] for index in indexes.values())
+    assert db_handler.create_indexes() is False  # toujours idempotent
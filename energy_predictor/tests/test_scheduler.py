@@ -0,0 +1,46 @@
+import time
+
+from utils.scheduler import ForecastScheduler
+
+
+def forecast(days):
+    return {'predictions': [1.0] * days, 'dates': [f'2024-03-{day + 1:02d}' for day in range(days)],
+            'metadata': {'days': days}}, 'v1'
+
+
+def wait_for(scheduler, job_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = scheduler.get_job(job_id)
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.01)
+    raise AssertionError('job non terminé')
+
+
+def test_job_state_is_readable_from_another_worker(db_handler):
+    saved = []
+    worker = ForecastScheduler(forecast, lambda *args: saved.append(args), db_handler)
+    other_worker = ForecastScheduler(forecast, lambda *args: None, db_handler)
+
+    job_id = worker.submit(3, 'u1')
+    job = wait_for(other_worker, job_id)
+
+    assert (job['status'], job['user_id'], job['days']) == ('done', 'u1', 3)
+    assert job['result'] == {'predictions': [1.0] * 3, 'dates': ['2024-03-01', '2024-03-02', '2024-03-03'],
+                             'model_version': 'v1'}
+    assert saved[0][0] == 'u1' and saved[0][1]['metadata']['kind'] == 'job'
+
+
+def test_failed_job_keeps_its_error(db_handler):
+    def fail(days):
+        raise ValueError('Données insuffisantes pour la prédiction')
+    scheduler = ForecastScheduler(fail, lambda *args: None, db_handler)
+
+    job = wait_for(ForecastScheduler(fail, lambda *args: None, db_handler), scheduler.submit(7, 'u1'))
+
+    assert (job['status'], job['error']) == ('failed', 'Données insuffisantes pour la prédiction')
+
+
+def test_unknown_job_is_none(db_handler):
+    assert ForecastScheduler(forecast, lambda *args: None, db_handler).get_job('inconnu') is None
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class _Flight:
+    """Calcul en cours pour une clé, partagé par les requêtes identiques"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """Cache des réponses d'API : TTL, éviction LRU et calcul unique par clé
+    
+    Les clés sont des tuples dont le premier élément est un espace de noms
+    ('current', 'historical', 'predict', ...) : invalidate() vide un ou
+    plusieurs espaces, ou tout le cache. Lorsque plusieurs requêtes
+    identiques arrivent sur une entrée absente, une seule calcule la
+    valeur ; les autres attendent son résultat (ou son exception).
+    """
+    
+    def __init__(self, max_entries=512, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()  # clé -> (expiration, valeur)
+        self._flights = {}
+        self._generation = 0  # incrémenté à chaque invalidation
+        self._lock = threading.Lock()
+    
+    def get_or_compute(self, key, compute, ttl=None):
+        """Valeur en cache, ou compute() exécuté une seule fois pour toutes les requêtes en attente"""
+        leader = False
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            flight = self._flights.get(key)
+            if flight:
+                self.coalesced += 1
+            else:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+                leader, generation = True, self._generation
+        
+        if not leader:
+            flight.done.wait()
+            if flight.error:
+                raise flight.error
+            return flight.value
+        
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                # Une invalidation pendant le calcul rend la valeur périmée
+                if flight.error is None and generation == self._generation:
+                    self._entries[key] = (time.monotonic() + (ttl or self.ttl), flight.value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.done.set()
+        return flight.value
+    
+    def invalidate(self, *namespaces):
+        """Supprimer les entrées des espaces de noms donnés (toutes si aucun)"""
+        with self._lock:
+            self._generation += 1
+            if not namespaces:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if key[0] in namespaces]:
+                del self._entries[key]
+    
+    def discard(self, *keys):
+        """Supprimer des entrées précises (et les calculs en cours qui les rempliraient)"""
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+    
+    def stats(self):
+        """Compteurs du cache"""
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'coalesced': self.coalesced}
@@ -0,0 +1,57 @@
+import base64
+import json
+
+import numpy as np
+
+# Formats de réponse des graphiques : colonnes brutes (le navigateur construit
+# la figure) ou figure Plotly sérialisée côté serveur (ancien format)
+CHART_FORMATS = ('columns', 'plotly')
+ENCODINGS = ('json', 'float32')
+
+
+def encode_column(values, encoding='json'):
+    """Colonne numérique en liste JSON, ou en float32 little-endian base64"""
+    if encoding == 'float32':
+        data = np.asarray(values, dtype='<f4').tobytes()
+        return {'dtype': 'float32', 'data': base64.b64encode(data).decode('ascii')}
+    return [float(value) for value in values]
+
+
+def iso_dates(dates):
+    """Dates (datetime ou chaînes) en chaînes ISO 8601"""
+    return [date if isinstance(date, str) else date.isoformat() for date in dates]
+
+
+def historical_figure(dates, values, days):
+    """Figure Plotly de l'historique, sérialisée (format 'plotly')"""
+    import plotly
+    import plotly.express as px
+    fig = px.line(
+        x=dates, 
+        y=values,
+        title=f'Consommation énergétique - {days} derniers jours',
+        labels={'x': 'Date', 'y': 'Consommation (kWh)'}
+    )
+    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
+
+
+def prediction_figure(dates, predictions, recent_dates, recent_values, days):
+    """Figure Plotly de la prévision et de l'historique récent (format 'plotly')"""
+    import plotly
+    import plotly.express as px
+    fig = px.line(
+        x=dates,
+        y=predictions,
+        title=f'Prédiction de consommation - {days} prochains jours',
+        labels={'x': 'Date', 'y': 'Consommation prédite (kWh)'}
+    )
+    
+    # Ajouter une ligne pour l'historique récent
+    fig.add_scatter(
+        x=recent_dates,
+        y=recent_values,
+        mode='lines',
+        name='Historique récent',
+        line=dict(color='gray', dash='dash')
+    )
+    return json.dumps(fig, cls=plotly.utils.PlotlyJSONEncoder)
@@ -1,20 +1,60 @@
-from pymongo import MongoClient, ASCENDING, DESCENDING
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo import MongoClient, ASCENDING, DESCENDING, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
 from datetime import datetime, timedelta
-import random
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from itertools import islice
 import os
+import numpy as np
+import pandas as pd
 from dotenv import load_dotenv
+from utils.cache import ResponseCache
 
 load_dotenv()
 
+# Collections de cumuls (sum, count, min, max) par source/utilisateur
+ROLLUP_COLLECTIONS = {'hour': 'consumption_hourly', 'day': 'consumption_daily'}
+
+# Modes de stockage des relevés : un document par relevé, ou un document par
+# source/utilisateur et par jour avec les valeurs regroupées dans des tableaux
+STORAGE_MODES = ('documents', 'buckets')
+
+# Durée de conservation des jobs de prévision ad hoc (secondes)
+PREDICTION_JOB_TTL = 7 * 24 * 3600
+
+def bucket_start(timestamp, unit):
+    """Tronquer un datetime au début de son heure ou de son jour"""
+    if unit == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def bucket_ceil(timestamp, unit):
+    """Début du premier bucket entièrement postérieur ou égal à timestamp"""
+    start = bucket_start(timestamp, unit)
+    if start == timestamp:
+        return start
+    return start + (timedelta(hours=1) if unit == 'hour' else timedelta(days=1))
+
 class MongoDBHandler:
-    def __init__(self, mongo_uri=None):
+    def __init__(self, mongo_uri=None, storage_mode=None, user_cache_ttl=None, user_cache_size=None):
         if mongo_uri is None:
             mongo_uri = os.getenv('MONGO_URI')
         
         if not mongo_uri:
             raise ValueError("MONGO_URI n'est pas défini dans les variables d'environnement")
         
+        if storage_mode is None:
+            storage_mode = os.getenv('CONSUMPTION_STORAGE', 'documents')
+        if storage_mode not in STORAGE_MODES:
+            raise ValueError(f"Mode de stockage inconnu: {storage_mode}")
+        self.storage_mode = storage_mode
+        
+        # Cache des utilisateurs chargés à chaque requête authentifiée (0 le désactive)
+        if user_cache_ttl is None:
+            user_cache_ttl = int(os.getenv('USER_CACHE_TTL', 300))
+        if user_cache_size is None:
+            user_cache_size = int(os.getenv('USER_CACHE_MAX_ENTRIES', 1024))
+        self.user_cache = ResponseCache(max_entries=user_cache_size, ttl=user_cache_ttl) if user_cache_ttl > 0 else None
+        
         try:
             self.client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
             # Tester la connexion
@@ -36,27 +76,483 @@ class MongoDBHandler:
         except ConnectionFailure as e:
             return False, f"Échec de connexion: {e}"
     
-    def get_consumption_data(self, start_date, end_date, source=None):
-        """Récupérer les données de consommation dans une période"""
-        collection = self.db.consumption
+    def get_consumption_frame(self, start_date, end_date, source=None, batch_size=10000):
+        """Récupérer les relevés d'une période sous forme de DataFrame
         
-        query = {
-            'timestamp': {'$gte': start_date, '$lte': end_date}
-        }
+        Seuls timestamp/value sont projetés et les documents sont décodés par
+        lots directement dans des tableaux NumPy préalloués (agrandis par
+        doublement), sans passer par des listes de dictionnaires.
         
+        Returns:
+            DataFrame indexé par 'timestamp' avec une colonne 'value' (float64)
+        """
+        try:
+            if self.storage_mode == 'buckets':
+                timestamps, values = self._fetch_bucket_arrays(start_date, end_date, source, batch_size)
+            else:
+                timestamps, values = self._fetch_document_arrays(start_date, end_date, source, batch_size)
+        except Exception as e:
+            print(f"Erreur lors de la récupération des données: {e}")
+            timestamps, values = np.empty(0, dtype='datetime64[ms]'), np.empty(0)
+        
+        return pd.DataFrame({'value': values}, index=pd.DatetimeIndex(timestamps, name='timestamp'))
+    
+    def get_consumption_frames(self, start_date, end_date, sources, batch_size=10000):
+        """Récupérer l'historique de plusieurs sources en une seule requête $in
+        
+        Returns:
+            Dictionnaire {source: DataFrame indexé par timestamp}, une entrée
+            par source demandée (vide si aucune donnée)
+        """
+        timestamps = {source: [] for source in sources}
+        values = {source: [] for source in sources}
+        try:
+            if self.storage_mode == 'buckets':
+                cursor = (self.db.consumption_buckets
+                          .find({'source': {'$in': list(sources)},
+                                 'day': {'$gte': bucket_start(start_date, 'day'), '$lte': end_date}},
+                                {'_id': 0, 'source': 1, 'day': 1, 'offsets': 1, 'values': 1})
+                          .batch_size(max(1, batch_size // 24)))
+                for bucket in cursor:
+                    day = np.datetime64(bucket['day'], 'ms')
+                    timestamps[bucket['source']].append(
+                        day + np.asarray(bucket['offsets'], dtype='timedelta64[ms]'))
+                    values[bucket['source']].append(np.asarray(bucket['values'], dtype=np.float64))
+            else:
+                cursor = (self.db.consumption
+                          .find({'source': {'$in': list(sources)},
+                                 'timestamp': {'$gte': start_date, '$lte': end_date}},
+                                {'_id': 0, 'source': 1, 'timestamp': 1, 'value': 1})
+                          .batch_size(batch_size))
+                while True:
+                    chunk = list(islice(cursor, batch_size))
+                    if not chunk:
+                        break
+                    for doc in chunk:
+                        timestamps[doc['source']].append(doc['timestamp'])
+                        values[doc['source']].append(doc['value'])
+        except Exception as e:
+            print(f"Erreur lors de la récupération des données: {e}")
+        
+        frames = {}
+        start, end = np.datetime64(start_date, 'ms'), np.datetime64(end_date, 'ms')
+        for source in sources:
+            if self.storage_mode == 'buckets' and timestamps[source]:
+                ts, vals = np.concatenate(timestamps[source]), np.concatenate(values[source])
+            else:
+                ts = np.array(timestamps[source], dtype='datetime64[ms]')
+                vals = np.array(values[source], dtype=np.float64)
+            keep = (ts >= start) & (ts <= end)
+            order = np.argsort(ts[keep], kind='stable')
+            frames[source] = pd.DataFrame(
+                {'value': vals[keep][order]},
+                index=pd.DatetimeIndex(ts[keep][order], name='timestamp')
+            )
+        return frames
+    
+    def _fetch_document_arrays(self, start_date, end_date, source, batch_size):
+        query = {'timestamp': {'$gte': start_date, '$lte': end_date}}
         if source:
             query['source'] = source
+        cursor = (self.db.consumption
+                  .find(query, {'_id': 0, 'timestamp': 1, 'value': 1})
+                  .sort('timestamp', ASCENDING)
+                  .batch_size(batch_size))
         
+        timestamps = np.empty(batch_size, dtype='datetime64[ms]')
+        values = np.empty(batch_size, dtype=np.float64)
+        size = 0
+        while True:
+            chunk = list(islice(cursor, batch_size))
+            if not chunk:
+                break
+            if size + len(chunk) > len(values):
+                capacity = max(2 * len(values), size + len(chunk))
+                timestamps = np.resize(timestamps, capacity)
+                values = np.resize(values, capacity)
+            timestamps[size:size + len(chunk)] = [doc['timestamp'] for doc in chunk]
+            values[size:size + len(chunk)] = [doc['value'] for doc in chunk]
+            size += len(chunk)
+        return timestamps[:size], values[:size]
+    
+    def _fetch_bucket_arrays(self, start_date, end_date, source, batch_size):
+        query = {'day': {'$gte': bucket_start(start_date, 'day'), '$lte': end_date}}
+        if source:
+            query['source'] = source
+        cursor = (self.db.consumption_buckets
+                  .find(query, {'_id': 0, 'day': 1, 'offsets': 1, 'values': 1})
+                  .batch_size(max(1, batch_size // 24)))
+        
+        # Les offsets d'un bucket se convertissent en bloc, sans boucle par relevé
+        timestamp_parts, value_parts = [], []
+        for bucket in cursor:
+            day = np.datetime64(bucket['day'], 'ms')
+            timestamp_parts.append(day + np.asarray(bucket['offsets'], dtype='timedelta64[ms]'))
+            value_parts.append(np.asarray(bucket['values'], dtype=np.float64))
+        if not timestamp_parts:
+            return np.empty(0, dtype='datetime64[ms]'), np.empty(0)
+        
+        timestamps = np.concatenate(timestamp_parts)
+        values = np.concatenate(value_parts)
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, values = timestamps[order], values[order]
+        keep = (timestamps >= np.datetime64(start_date, 'ms')) & (timestamps <= np.datetime64(end_date, 'ms'))
+        return timestamps[keep], values[keep]
+    
+    def _raw_consumption_stages(self, start_date=None, end_date=None, source=None):
+        """Collection et étapes produisant des relevés {timestamp, value, source, user_id}
+        
+        Permet à rebuild_rollups() de réagréger quel que soit le mode de stockage.
+        """
+        match = {'source': source} if source else {}
+        time_range = {}
+        if start_date:
+            time_range['$gte'] = start_date
+        if end_date:
+            time_range['$lte'] = end_date
+        
+        if self.storage_mode == 'documents':
+            if time_range:
+                match['timestamp'] = time_range
+            return self.db.consumption, [{'$match': match}]
+        
+        day_range = {}
+        if start_date:
+            day_range['$gte'] = bucket_start(start_date, 'day')
+        if end_date:
+            day_range['$lte'] = end_date
+        if day_range:
+            match['day'] = day_range
+        stages = [
+            {'$match': match},
+            {'$unwind': {'path': '$offsets', 'includeArrayIndex': 'position'}},
+            {'$project': {
+                '_id': 0,
+                'source': 1,
+                'user_id': 1,
+                'timestamp': {'$add': ['$day', '$offsets']},
+                'value': {'$arrayElemAt': ['$values', '$position']}
+            }}
+        ]
+        if time_range:
+            stages.append({'$match': {'timestamp': time_range}})
+        return self.db.consumption_buckets, stages
+    
+    def insert_consumption(self, data_points, ordered=True):
+        """Insérer des relevés et mettre à jour les cumuls horaires/journaliers
+        
+        En cas d'échec partiel (BulkWriteError), les cumuls des relevés
+        effectivement écrits sont mis à jour avant de relancer l'erreur.
+        """
+        stored, error = self.store_readings(data_points, ordered)
+        if stored:
+            self.update_rollups(stored)
+        if error:
+            raise error
+        return len(stored)
+    
+    def store_readings(self, data_points, ordered=True):
+        """Écrire les relevés bruts sans toucher aux cumuls
+        
+        Returns:
+            (relevés écrits, BulkWriteError ou None) : avec ordered=False, une
+            erreur sur un relevé n'empêche pas l'écriture des autres
+        """
+        if not data_points:
+            return [], None
+        if self.storage_mode == 'buckets':
+            keys, operations = self._bucket_operations(data_points)
+            try:
+                self.db.consumption_buckets.bulk_write(operations, ordered=ordered)
+                return data_points, None
+            except BulkWriteError as e:
+                failed = self._failed_indexes(e, len(operations), ordered)
+                failed_keys = {keys[i] for i in failed}
+                return [point for point in data_points if self._bucket_key(point) not in failed_keys], e
         try:
-            return list(collection.find(query).sort('timestamp', ASCENDING))
+            self.db.consumption.insert_many(data_points, ordered=ordered)
+            return data_points, None
+        except BulkWriteError as e:
+            failed = self._failed_indexes(e, len(data_points), ordered)
+            return [point for i, point in enumerate(data_points) if i not in failed], e
+    
+    @staticmethod
+    def _failed_indexes(error, size, ordered):
+        """Opérations non appliquées d'un bulk (en mode ordonné, tout ce qui suit la première erreur)"""
+        failed = {write_error['index'] for write_error in error.details.get('writeErrors', [])}
+        if ordered and failed:
+            failed = set(range(min(failed), size))
+        return failed
+    
+    @staticmethod
+    def _bucket_key(point):
+        return (point.get('source'), point.get('user_id'), bucket_start(point['timestamp'], 'day'))
+    
+    def _insert_buckets(self, data_points):
+        """Ajouter des relevés aux buckets journaliers ($push des offsets/valeurs)"""
+        _, operations = self._bucket_operations(data_points)
+        self.db.consumption_buckets.bulk_write(operations, ordered=False)
+        return len(data_points)
+    
+    def _bucket_operations(self, data_points):
+        """Un upsert par bucket (source, user_id, jour), avec la clé de chaque opération
+        
+        Les offsets sont en millisecondes depuis minuit (champ 'day').
+        """
+        buckets = {}
+        for point in data_points:
+            key = self._bucket_key(point)
+            day = key[2]
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = {'unit': point.get('unit', 'kWh'), 'offsets': [], 'values': []}
+            bucket['offsets'].append((point['timestamp'] - day) // timedelta(milliseconds=1))
+            bucket['values'].append(point['value'])
+        
+        operations = [
+            UpdateOne(
+                {'source': source, 'user_id': user_id, 'day': day},
+                {
+                    '$push': {'offsets': {'$each': bucket['offsets']},
+                              'values': {'$each': bucket['values']}},
+                    '$inc': {'count': len(bucket['values'])},
+                    '$setOnInsert': {'unit': bucket['unit'], 'created_at': datetime.utcnow()}
+                },
+                upsert=True
+            )
+            for (source, user_id, day), bucket in buckets.items()
+        ]
+        return list(buckets), operations
+    
+    def migrate_to_buckets(self, source=None, batch_size=10000, delete_raw=False):
+        """Convertir les relevés existants (un document par relevé) en buckets
+        
+        Les buckets des sources migrées sont recréés, la migration peut donc
+        être relancée tant que les relevés bruts sont conservés.
+        
+        Returns:
+            Nombre de relevés migrés
+        """
+        query = {'source': source} if source else {}
+        self.db.consumption_buckets.delete_many(query)
+        
+        cursor = self.db.consumption.find(
+            query, {'_id': 0, 'timestamp': 1, 'value': 1, 'unit': 1, 'source': 1, 'user_id': 1}
+        ).batch_size(batch_size)
+        
+        migrated = 0
+        batch = []
+        for point in cursor:
+            batch.append(point)
+            if len(batch) >= batch_size:
+                migrated += self._insert_buckets(batch)
+                batch = []
+        if batch:
+            migrated += self._insert_buckets(batch)
+        
+        if delete_raw:
+            self.db.consumption.delete_many(query)
+        return migrated
+    
+    def update_rollups(self, data_points):
+        """Incrémenter les cumuls ($inc upserts) pour une liste de relevés
+        
+        Les relevés sont d'abord regroupés par bucket en mémoire pour
+        n'envoyer qu'une mise à jour par (source, user_id, bucket).
+        """
+        for unit, collection_name in ROLLUP_COLLECTIONS.items():
+            buckets = {}
+            for point in data_points:
+                key = (point.get('source'), point.get('user_id'), bucket_start(point['timestamp'], unit))
+                value = point['value']
+                bucket = buckets.get(key)
+                if bucket is None:
+                    buckets[key] = [value, 1, value, value]
+                else:
+                    bucket[0] += value
+                    bucket[1] += 1
+                    bucket[2] = min(bucket[2], value)
+                    bucket[3] = max(bucket[3], value)
+            
+            self._write_rollups(collection_name, (
+                (source, user_id, bucket, total, count, low, high)
+                for (source, user_id, bucket), (total, count, low, high) in buckets.items()
+            ), increment=True)
+    
+    def _write_rollups(self, collection_name, rows, increment, batch_size=1000):
+        """Écrire des cumuls par lots ; increment=False remplace les valeurs"""
+        collection = self.db[collection_name]
+        now = datetime.utcnow()
+        operations = []
+        for source, user_id, bucket, total, count, low, high in rows:
+            if increment:
+                update = {
+                    '$inc': {'sum': total, 'count': count},
+                    '$min': {'min': low},
+                    '$max': {'max': high},
+                    '$set': {'updated_at': now}
+                }
+            else:
+                update = {'$set': {'sum': total, 'count': count, 'min': low, 'max': high,
+                                   'updated_at': now}}
+            operations.append(UpdateOne(
+                {'source': source, 'user_id': user_id, 'bucket': bucket}, update, upsert=True
+            ))
+            if len(operations) >= batch_size:
+                collection.bulk_write(operations, ordered=False)
+                operations = []
+        if operations:
+            collection.bulk_write(operations, ordered=False)
+    
+    def rebuild_rollups(self, source=None, start_date=None, end_date=None):
+        """Recalculer les cumuls à partir des relevés bruts (backfill et réparation)
+        
+        L'écriture des relevés et l'$inc des cumuls sont deux écritures
+        distinctes : si la seconde échoue (rollup_failed de l'ingestion,
+        erreur d'insert_consumption), les cumuls restent faux jusqu'à ce
+        recalcul. Avec start_date/end_date, seuls les jours entiers couvrant
+        la période sont supprimés puis recalculés.
+        
+        Returns:
+            Dictionnaire {unité: nombre de buckets écrits}
+        """
+        query = {'source': source} if source else {}
+        raw_start = raw_end = None
+        if start_date or end_date:
+            bucket_range = {}
+            if start_date:
+                raw_start = bucket_range['$gte'] = bucket_start(start_date, 'day')
+            if end_date:
+                bucket_range['$lt'] = bucket_ceil(end_date, 'day')
+                raw_end = bucket_range['$lt'] - timedelta(milliseconds=1)
+            query['bucket'] = bucket_range
+        collection, stages = self._raw_consumption_stages(raw_start, raw_end, source)
+        written = {}
+        for unit, collection_name in ROLLUP_COLLECTIONS.items():
+            self.db[collection_name].delete_many(query)
+            parts = {
+                'year': {'$year': '$timestamp'},
+                'month': {'$month': '$timestamp'},
+                'day': {'$dayOfMonth': '$timestamp'}
+            }
+            if unit == 'hour':
+                parts['hour'] = {'$hour': '$timestamp'}
+            pipeline = stages + [
+                {'$group': {
+                    '_id': {'source': '$source', 'user_id': '$user_id',
+                            'bucket': {'$dateFromParts': parts}},
+                    'sum': {'$sum': '$value'},
+                    'count': {'$sum': 1},
+                    'min': {'$min': '$value'},
+                    'max': {'$max': '$value'}
+                }}
+            ]
+            rows = [
+                (doc['_id'].get('source'), doc['_id'].get('user_id'), doc['_id']['bucket'],
+                 doc['sum'], doc['count'], doc['min'], doc['max'])
+                for doc in collection.aggregate(pipeline, allowDiskUse=True)
+            ]
+            self._write_rollups(collection_name, rows, increment=False)
+            written[unit] = len(rows)
+        return written
+    
+    def _rollup_match(self, start_date, end_date, unit, source=None):
+        """Buckets commençant dans [start_date, end_date]
+        
+        Le premier bucket partiel est exclu (bucket_ceil), mais le dernier
+        peut déborder après end_date : il est compté en entier.
+        """
+        match = {'bucket': {'$gte': bucket_ceil(start_date, unit), '$lte': end_date}}
+        if source:
+            match['source'] = source
+        return {'$match': match}
+    
+    def get_rollup_buckets(self, start_date, end_date, unit='day', source=None):
+        """Lire les cumuls horaires ou journaliers, toutes sources confondues
+        
+        Returns:
+            Liste triée de {'bucket', 'total', 'count', 'min', 'max'}
+        """
+        pipeline = [
+            self._rollup_match(start_date, end_date, unit, source),
+            {'$group': {
+                '_id': '$bucket',
+                'total': {'$sum': '$sum'},
+                'count': {'$sum': '$count'},
+                'min': {'$min': '$min'},
+                'max': {'$max': '$max'}
+            }},
+            {'$sort': {'_id': ASCENDING}},
+            {'$project': {'_id': 0, 'bucket': '$_id', 'total': 1, 'count': 1, 'min': 1, 'max': 1}}
+        ]
+        
+        try:
+            return list(self.db[ROLLUP_COLLECTIONS[unit]].aggregate(pipeline))
         except Exception as e:
-            print(f"Erreur lors de la récupération des données: {e}")
+            print(f"Erreur lors de la lecture des cumuls: {e}")
             return []
     
+    def get_rollup_summary(self, start_date, end_date, source=None):
+        """Total, nombre de points et heure de pointe à partir des cumuls horaires"""
+        buckets = self.get_rollup_buckets(start_date, end_date, unit='hour', source=source)
+        
+        hourly_totals = {}
+        for bucket in buckets:
+            hour = bucket['bucket'].hour
+            hourly_totals[hour] = hourly_totals.get(hour, 0) + bucket['total']
+        
+        return {
+            'total': sum(bucket['total'] for bucket in buckets),
+            'count': sum(bucket['count'] for bucket in buckets),
+            'peak_hour': max(hourly_totals, key=hourly_totals.get) if hourly_totals else None
+        }
+    
+    def get_daily_totals_by_user(self, start_date, end_date, source=None):
+        """Consommation journalière de chaque utilisateur, lue dans les cumuls
+        
+        Returns:
+            (user_ids, jours, tableau utilisateurs x jours) ; NaN pour un jour
+            sans relevé, afin que chaque colonne corresponde au même jour
+        """
+        pipeline = [
+            self._rollup_match(start_date, end_date, 'day', source),
+            {'$group': {'_id': {'user_id': '$user_id', 'bucket': '$bucket'}, 'total': {'$sum': '$sum'}}}
+        ]
+        try:
+            rows = list(self.db[ROLLUP_COLLECTIONS['day']].aggregate(pipeline))
+        except Exception as e:
+            print(f"Erreur lors de la lecture des cumuls par utilisateur: {e}")
+            rows = []
+        
+        days = pd.date_range(bucket_ceil(start_date, 'day'), bucket_start(end_date, 'day'), freq='D',
+                             inclusive='left')
+        if not rows:
+            return [], days, np.empty((0, len(days)))
+        
+        frame = pd.DataFrame({
+            'user_id': [row['_id'].get('user_id') for row in rows],
+            'bucket': [row['_id']['bucket'] for row in rows],
+            'total': [row['total'] for row in rows]
+        })
+        # Un pivot pandas écarterait user_id None : placer les valeurs par position
+        user_ids = list(dict.fromkeys(frame['user_id']))
+        positions = {user_id: i for i, user_id in enumerate(user_ids)}
+        rows = np.array([positions[user_id] for user_id in frame['user_id']], dtype=int)
+        columns = days.get_indexer(pd.to_datetime(frame['bucket']))
+        keep = columns >= 0
+        totals = np.full((len(user_ids), len(days)), np.nan)
+        totals[rows[keep], columns[keep]] = frame['total'].to_numpy()[keep]
+        return user_ids, days, totals
+    
     def get_user_by_id(self, user_id):
-        """Récupérer un utilisateur par son ID"""
+        """Récupérer un utilisateur par son ID (via le cache des utilisateurs)"""
         collection = self.db.users
-        return collection.find_one({'_id': user_id})
+        if self.user_cache is None:
+            return collection.find_one({'_id': user_id})
+        
+        user = self.user_cache.get_or_compute(('user', user_id), lambda: collection.find_one({'_id': user_id}))
+        # Copie : l'appelant ne doit pas modifier l'entrée partagée
+        return dict(user) if user else user
     
     def get_user_by_username(self, username):
         """Récupérer un utilisateur par son nom d'utilisateur"""
@@ -81,10 +577,28 @@ class MongoDBHandler:
         
         try:
             result = collection.insert_one(user_data)
+            self.invalidate_user(result.inserted_id)
             return result.inserted_id, "Utilisateur créé avec succès"
         except Exception as e:
             return None, f"Erreur lors de la création: {e}"
     
+    def update_user(self, user_id, fields):
+        """Modifier un utilisateur et retirer son entrée du cache"""
+        collection = self.db.users
+        try:
+            result = collection.update_one({'_id': user_id}, {'$set': fields})
+            return result.modified_count
+        except Exception as e:
+            print(f"Erreur lors de la mise à jour de l'utilisateur: {e}")
+            return 0
+        finally:
+            self.invalidate_user(user_id)
+    
+    def invalidate_user(self, user_id):
+        """Oublier l'utilisateur en cache (à appeler après toute écriture directe sur users)"""
+        if self.user_cache is not None:
+            self.user_cache.discard(('user', user_id))
+    
     def get_notifications(self, user_id, limit=50, unread_only=False):
         """Récupérer les notifications d'un utilisateur"""
         collection = self.db.notifications
@@ -122,6 +636,85 @@ class MongoDBHandler:
             print(f"Erreur lors de la création de la notification: {e}")
             return None
     
+    def create_notifications(self, notifications):
+        """Créer un lot de notifications en un seul bulk_write
+        
+        Une notification portant une dedupe_key n'est écrite que si aucune
+        autre ne porte déjà cette clé (upsert avec $setOnInsert) : relancer
+        l'analyse ne duplique rien, même sans l'index unique sur dedupe_key.
+        Celui-ci (create_indexes) protège en plus des écritures concurrentes,
+        dont les erreurs de doublon sont ignorées.
+        
+        Returns:
+            Liste des notifications effectivement insérées (avec leur _id)
+        """
+        collection = self.db.notifications
+        created_at = datetime.utcnow()
+        documents, operations = [], []
+        for notification in notifications:
+            document = {
+                'user_id': notification['user_id'],
+                'title': notification['title'],
+                'message': notification['message'],
+                'level': notification.get('level', 'info'),
+                'read': False,
+                'created_at': created_at,
+                'metadata': notification.get('metadata') or {}
+            }
+            dedupe_key = notification.get('dedupe_key')
+            if dedupe_key is None:
+                operations.append(InsertOne(document))
+            else:
+                # dedupe_key est renseigné par le filtre de l'upsert
+                operations.append(UpdateOne({'dedupe_key': dedupe_key}, {'$setOnInsert': document}, upsert=True))
+                document = {**document, 'dedupe_key': dedupe_key}
+            documents.append(document)
+        if not operations:
+            return []
+        
+        try:
+            result = collection.bulk_write(operations, ordered=False)
+            upserted, errors = result.upserted_ids, []
+        except BulkWriteError as e:
+            upserted = {entry['index']: entry['_id'] for entry in e.details.get('upserted', [])}
+            errors = e.details.get('writeErrors', [])
+            others = [error for error in errors if error.get('code') != 11000]
+            if others:
+                print(f"Erreur lors de la création des notifications: {others[0].get('errmsg')}")
+        except Exception as e:
+            print(f"Erreur lors de la création des notifications: {e}")
+            return []
+        
+        failed = {error['index'] for error in errors}
+        inserted = []
+        for i, (document, operation) in enumerate(zip(documents, operations)):
+            if i in failed:
+                continue
+            if isinstance(operation, UpdateOne):
+                if i not in upserted:
+                    continue  # déjà notifiée
+                document['_id'] = upserted[i]
+            inserted.append(document)  # InsertOne a renseigné _id dans le document
+        return inserted
+    
+    def get_notifications_since(self, user_ids, since):
+        """Notifications de ces utilisateurs créées après since, des plus anciennes aux plus récentes"""
+        query = {'user_id': {'$in': list(user_ids)}, 'created_at': {'$gt': since}}
+        try:
+            return list(self.db.notifications.find(query).sort('created_at', ASCENDING))
+        except Exception as e:
+            print(f"Erreur lors de la récupération des notifications: {e}")
+            return []
+    
+    def count_unread_notifications(self, user_id):
+        """Nombre de notifications non lues (index user_id/read)"""
+        collection = self.db.notifications
+        try:
+            return collection.count_documents({'user_id': user_id, 'read': False})
+        except Exception as e:
+            print(f"Erreur lors du comptage des notifications: {e}")
+            return 0
+    
     def mark_notification_read(self, notification_id, user_id):
         """Marquer une notification comme lue"""
         collection = self.db.notifications
@@ -139,25 +732,67 @@ class MongoDBHandler:
         )
     
     def save_prediction(self, user_id, predictions_data, model_version="1.0"):
-        """Sauvegarder une prédiction dans la base de données"""
+        """Sauvegarder une prédiction dans la base de données
+        
+        predictions_data peut aussi être une liste : toutes les prédictions sont
+        alors écrites en un seul insert_many et la liste des ids est retournée.
+        """
         collection = self.db.predictions
         
-        prediction_doc = {
+        created_at = datetime.utcnow()
+        prediction_docs = [{
             'user_id': user_id,
-            'predictions': predictions_data.get('predictions', []),
-            'dates': predictions_data.get('dates', []),
+            'predictions': item.get('predictions', []),
+            'dates': item.get('dates', []),
             'model_version': model_version,
-            'created_at': datetime.utcnow(),
-            'metadata': predictions_data.get('metadata', {})
-        }
+            'created_at': created_at,
+            'metadata': item.get('metadata', {})
+        } for item in (predictions_data if isinstance(predictions_data, list) else [predictions_data])]
         
         try:
-            result = collection.insert_one(prediction_doc)
+            if isinstance(predictions_data, list):
+                return collection.insert_many(prediction_docs, ordered=False).inserted_ids if prediction_docs else []
+            result = collection.insert_one(prediction_docs[0])
             return result.inserted_id
         except Exception as e:
             print(f"Erreur lors de la sauvegarde de la prédiction: {e}")
             return None
     
+    def get_latest_forecast(self, days, max_age=None):
+        """Dernière prévision précalculée couvrant au moins `days` jours"""
+        query = {'metadata.kind': 'scheduled', 'metadata.days': {'$gte': days}}
+        if max_age is not None:
+            query['created_at'] = {'$gte': datetime.utcnow() - max_age}
+        try:
+            return self.db.predictions.find_one(query, sort=[('created_at', DESCENDING)])
+        except Exception as e:
+            print(f"Erreur lors de la récupération de la prévision: {e}")
+            return None
+    
+    def create_prediction_job(self, job):
+        """Enregistrer un job de prévision ad hoc (document avec _id)"""
+        try:
+            self.db.prediction_jobs.insert_one(job)
+            return True
+        except Exception as e:
+            print(f"Erreur lors de l'enregistrement du job: {e}")
+            return False
+    
+    def update_prediction_job(self, job_id, fields):
+        """Mettre à jour l'état d'un job (status, result, error)"""
+        try:
+            self.db.prediction_jobs.update_one({'_id': job_id}, {'$set': fields})
+        except Exception as e:
+            print(f"Erreur lors de la mise à jour du job: {e}")
+    
+    def get_prediction_job(self, job_id):
+        """État d'un job, quel que soit le processus qui l'exécute"""
+        try:
+            return self.db.prediction_jobs.find_one({'_id': job_id})
+        except Exception as e:
+            print(f"Erreur lors de la récupération du job: {e}")
+            return None
+    
     def get_user_predictions(self, user_id, limit=20):
         """Récupérer les prédictions d'un utilisateur"""
         collection = self.db.predictions
@@ -165,96 +800,138 @@ class MongoDBHandler:
                    .sort('created_at', DESCENDING)
                    .limit(limit))
     
-    def generate_demo_data(self, days=90, user_id=None):
-        """Générer des données de démonstration réalistes"""
-        collection = self.db.consumption
-        
-        # Supprimer les anciennes données de démo
-        collection.delete_many({'source': 'demo'})
-        
-        # Générer les dates
-        end_date = datetime.utcnow()
-        start_date = end_date - timedelta(days=days)
-        
-        data_points = []
-        current_date = start_date
-        
-        # Coefficients saisonniers (simulation)
-        seasonal_coeff = {
-            0: 1.0,  # Janvier
-            1: 1.0,  # Février
-            2: 0.9,  # Mars
-            3: 0.8,  # Avril
-            4: 0.7,  # Mai
-            5: 0.7,  # Juin
-            6: 0.8,  # Juillet
-            7: 0.9,  # Août
-            8: 1.0,  # Septembre
-            9: 1.1,  # Octobre
-            10: 1.2, # Novembre
-            11: 1.3  # Décembre
-        }
+    def generate_demo_data(self, days=90, user_id=None, sources=('demo',), user_ids=None,
+                           batch_size=10000, workers=4, seed=None):
+        """Générer des données de démonstration réalistes
         
-        while current_date <= end_date:
-            # Coefficient basé sur le mois
-            month = current_date.month - 1
-            seasonal = seasonal_coeff.get(month, 1.0)
-            
-            # Variation jour/semaine
-            day_of_week = current_date.weekday()
-            is_weekend = day_of_week >= 5
-            day_factor = 1.2 if is_weekend else 1.0
-            
-            # Valeur de base
-            base_value = 100 * seasonal * day_factor
-            
-            # Ajouter des variations aléatoires
-            for hour in range(24):
-                hour_date = current_date + timedelta(hours=hour)
-                
-                # Variation horaire (pic en soirée)
-                if 18 <= hour < 22:
-                    hour_factor = 1.5  # Pic du soir
-                elif 8 <= hour < 12:
-                    hour_factor = 1.2  # Matinée
-                elif 0 <= hour < 6:
-                    hour_factor = 0.6  # Nuit
-                else:
-                    hour_factor = 1.0
-                
-                # Variation aléatoire
-                random_variation = random.uniform(-15, 20)
-                
-                # Valeur finale
-                value = max(10, base_value * hour_factor + random_variation)
-                
-                data_point = {
-                    'timestamp': hour_date,
-                    'value': round(value, 2),
-                    'unit': 'kWh',
-                    'source': 'demo',
-                    'created_at': datetime.utcnow(),
-                    'user_id': user_id
-                }
-                
-                data_points.append(data_point)
-            
-            # Passer au jour suivant
-            current_date += timedelta(days=1)
-            
-            # Insérer par lots pour éviter les problèmes de mémoire
-            if len(data_points) >= 1000:
-                collection.insert_many(data_points)
-                data_points = []
+        Les valeurs de toutes les séries (source x utilisateur) sont calculées
+        d'un bloc avec NumPy, puis écrites par lots insert_many non ordonnés
+        répartis sur `workers` threads. Les cumuls sont agrégés en mémoire
+        et écrits directement, sans passer par les $inc de update_rollups.
+        
+        Returns:
+            Nombre total de relevés insérés
+        """
+        sources = list(sources)
+        user_ids = list(user_ids) if user_ids is not None else [user_id]
+        
+        # Supprimer les anciennes données de démo et leurs cumuls
+        query = {'source': {'$in': sources}}
+        self.db.consumption.delete_many(query)
+        self.db.consumption_buckets.delete_many(query)
+        for collection_name in ROLLUP_COLLECTIONS.values():
+            self.db[collection_name].delete_many(query)
+        
+        # Un relevé par heure sur les `days` derniers jours
+        end_date = np.datetime64(datetime.utcnow(), 'us')
+        timestamps = end_date - np.arange(days * 24, -1, -1) * np.timedelta64(1, 'h')
+        series = [(source, owner) for source in sources for owner in user_ids]
+        values = self._demo_values(timestamps, len(series), np.random.default_rng(seed))
+        
+        created_at = datetime.utcnow()
+        if self.storage_mode == 'buckets':
+            collection = self.db.consumption_buckets
+            documents = self._demo_bucket_documents(timestamps, values, series, created_at)
+        else:
+            collection = self.db.consumption
+            documents = self._demo_documents(timestamps, values, series, created_at, batch_size)
+        self._insert_parallel(collection, documents, workers)
         
-        # Insérer les données restantes
-        if data_points:
-            collection.insert_many(data_points)
+        for unit, collection_name in ROLLUP_COLLECTIONS.items():
+            self._insert_parallel(self.db[collection_name],
+                                  self._demo_rollup_documents(timestamps, values, series, unit, batch_size),
+                                  workers)
         
         # Créer des statistiques résumées
         self.create_demo_stats()
         
-        return len(data_points)
+        return values.size
+    
+    @staticmethod
+    def _demo_values(timestamps, n_series, rng):
+        """Consommations (n_series, len(timestamps)) : saison, week-end, heure et bruit"""
+        # Coefficients saisonniers par mois (janvier à décembre)
+        seasonal = np.array([1.0, 1.0, 0.9, 0.8, 0.7, 0.7, 0.8, 0.9, 1.0, 1.1, 1.2, 1.3])
+        # Variation horaire : nuit, matinée, pic du soir
+        hourly = np.ones(24)
+        hourly[0:6] = 0.6
+        hourly[8:12] = 1.2
+        hourly[18:22] = 1.5
+        
+        months = timestamps.astype('datetime64[M]').astype(np.int64) % 12
+        days = timestamps.astype('datetime64[D]').astype(np.int64)
+        hours = timestamps.astype('datetime64[h]').astype(np.int64) % 24
+        weekend = (days + 3) % 7 >= 5  # 1970-01-01 était un jeudi
+        base = 100 * seasonal[months] * np.where(weekend, 1.2, 1.0) * hourly[hours]
+        
+        noise = rng.uniform(-15, 20, size=(n_series, len(timestamps)))
+        return np.maximum(10, base + noise).round(2)
+    
+    @staticmethod
+    def _demo_documents(timestamps, values, series, created_at, batch_size):
+        """Lots de documents (un par relevé), construits au fil de l'écriture"""
+        for i, (source, owner) in enumerate(series):
+            for start in range(0, len(timestamps), batch_size):
+                chunk = slice(start, start + batch_size)
+                yield [
+                    {'timestamp': timestamp, 'value': value, 'unit': 'kWh', 'source': source,
+                     'created_at': created_at, 'user_id': owner}
+                    for timestamp, value in zip(timestamps[chunk].tolist(), values[i, chunk].tolist())
+                ]
+    
+    @staticmethod
+    def _demo_bucket_documents(timestamps, values, series, created_at):
+        """Lots de buckets journaliers (un lot par série), au format de _insert_buckets"""
+        days = timestamps.astype('datetime64[D]')
+        # Offsets en millisecondes depuis minuit, comme _insert_buckets
+        offsets = ((timestamps - days) // np.timedelta64(1, 'ms')).tolist()
+        bounds = np.flatnonzero(np.diff(days.astype(np.int64))) + 1
+        starts = np.concatenate(([0], bounds)).tolist()
+        ends = np.concatenate((bounds, [len(days)])).tolist()
+        day_starts = days[starts].astype('datetime64[us]').tolist()
+        for i, (source, owner) in enumerate(series):
+            row = values[i].tolist()
+            yield [
+                {'source': source, 'user_id': owner, 'day': day, 'unit': 'kWh',
+                 'offsets': offsets[lo:hi], 'values': row[lo:hi], 'count': hi - lo,
+                 'created_at': created_at}
+                for day, lo, hi in zip(day_starts, starts, ends)
+            ]
+    
+    @staticmethod
+    def _demo_rollup_documents(timestamps, values, series, unit, batch_size):
+        """Lots de cumuls par bucket, agrégés par reduceat sur toutes les séries"""
+        keys = timestamps.astype('datetime64[h]' if unit == 'hour' else 'datetime64[D]')
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(keys.astype(np.int64))) + 1))
+        totals = np.add.reduceat(values, starts, axis=1).tolist()
+        lows = np.minimum.reduceat(values, starts, axis=1).tolist()
+        highs = np.maximum.reduceat(values, starts, axis=1).tolist()
+        counts = np.diff(np.concatenate((starts, [len(keys)]))).tolist()
+        buckets = keys[starts].astype('datetime64[us]').tolist()
+        now = datetime.utcnow()
+        for i, (source, owner) in enumerate(series):
+            for start in range(0, len(buckets), batch_size):
+                chunk = slice(start, start + batch_size)
+                yield [
+                    {'source': source, 'user_id': owner, 'bucket': bucket, 'sum': total,
+                     'count': count, 'min': low, 'max': high, 'updated_at': now}
+                    for bucket, total, count, low, high in zip(
+                        buckets[chunk], totals[i][chunk], counts[chunk], lows[i][chunk], highs[i][chunk])
+                ]
+    
+    @staticmethod
+    def _insert_parallel(collection, batches, workers):
+        """insert_many non ordonnés en parallèle, avec au plus 2 lots en attente par thread"""
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = set()
+            for batch in batches:
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+                pending.add(executor.submit(collection.insert_many, batch, ordered=False))
+            for future in pending:
+                future.result()
     
     def create_demo_stats(self):
         """Créer des statistiques de démonstration"""
@@ -287,25 +964,56 @@ class MongoDBHandler:
         return stats
     
     def create_indexes(self):
-        """Créer les index pour optimiser les requêtes"""
-        try:
+        """Créer les index (idempotent) ; appelé au démarrage de l'application
+        
+        Plusieurs garanties en dépendent : un bucket par (source, user_id,
+        jour) malgré des upserts concurrents, un cumul par bucket, des
+        comptages de non lues sans parcours de collection. Chaque index est
+        créé indépendamment : un échec (doublons existants) n'empêche pas
+        les autres.
+        
+        Returns:
+            True si tous les index existent
+        """
+        indexes = [
             # Index pour les données de consommation
-            self.db.consumption.create_index([('timestamp', ASCENDING)])
-            self.db.consumption.create_index([('user_id', ASCENDING)])
-            
+            ('consumption', [('timestamp', ASCENDING)], {}),
+            ('consumption', [('user_id', ASCENDING)], {}),
+            ('consumption', [('source', ASCENDING), ('timestamp', ASCENDING)], {}),
+            # Index pour le stockage en buckets journaliers
+            ('consumption_buckets', [('source', ASCENDING), ('user_id', ASCENDING), ('day', ASCENDING)],
+             {'unique': True}),
+            ('consumption_buckets', [('day', ASCENDING)], {}),
             # Index pour les utilisateurs
-            self.db.users.create_index([('username', ASCENDING)], unique=True)
-            self.db.users.create_index([('email', ASCENDING)], unique=True)
-            
+            ('users', [('username', ASCENDING)], {'unique': True}),
+            ('users', [('email', ASCENDING)], {'unique': True}),
             # Index pour les notifications
-            self.db.notifications.create_index([('user_id', ASCENDING), ('created_at', DESCENDING)])
-            self.db.notifications.create_index([('read', ASCENDING)])
-            
+            ('notifications', [('user_id', ASCENDING), ('created_at', DESCENDING)], {}),
+            ('notifications', [('user_id', ASCENDING), ('read', ASCENDING)], {}),
+            # Une alerte de tendance par utilisateur, type et jour (notifications unitaires exclues)
+            ('notifications', [('dedupe_key', ASCENDING)],
+             {'unique': True, 'partialFilterExpression': {'dedupe_key': {'$type': 'string'}}}),
+            ('notifications', [('read', ASCENDING)], {}),
             # Index pour les prédictions
-            self.db.predictions.create_index([('user_id', ASCENDING), ('created_at', DESCENDING)])
-            
-            print("✅ Index créés avec succès!")
-            return True
-        except Exception as e:
-            print(f"❌ Erreur lors de la création des index: {e}")
-            return False
\ No newline at end of file
+            ('predictions', [('user_id', ASCENDING), ('created_at', DESCENDING)], {}),
+            ('predictions', [('metadata.kind', ASCENDING), ('created_at', DESCENDING)], {}),
+            # Jobs de prévision ad hoc, supprimés par MongoDB après une semaine
+            ('prediction_jobs', [('created_at', ASCENDING)], {'expireAfterSeconds': PREDICTION_JOB_TTL}),
+        ]
+        # Index pour les cumuls horaires et journaliers
+        for collection_name in ROLLUP_COLLECTIONS.values():
+            indexes.append((collection_name, [('source', ASCENDING), ('user_id', ASCENDING), ('bucket', ASCENDING)],
+                            {'unique': True}))
+            indexes.append((collection_name, [('bucket', ASCENDING)], {}))
+        
+        failed = 0
+        for collection_name, keys, options in indexes:
+            try:
+                self.db[collection_name].create_index(keys, **options)
+            except Exception as e:
+                failed += 1
+                print(f"❌ Erreur lors de la création de l'index {collection_name} {keys}: {e}")
+        if failed:
+            return False
+        print("✅ Index créés avec succès!")
+        return True
\ No newline at end of file
@@ -0,0 +1,76 @@
+import numpy as np
+
+# Méthodes de réduction des séries temporelles : Largest-Triangle-Three-Buckets
+# (allure visuelle) ou min/max par bucket (tous les pics conservés)
+METHODS = ('lttb', 'minmax')
+
+
+def downsample(x, y, max_points, method='lttb'):
+    """Indices des points à garder pour tracer (x, y) en au plus `max_points` points
+    
+    lttb conserve toujours le premier et le dernier point ; minmax garde
+    les extrêmes de chaque bucket, qui ne les incluent pas forcément. Les
+    indices sont triés : ils s'appliquent aussi aux autres colonnes de la série.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Méthode inconnue {method!r}, attendue parmi {METHODS}")
+    if method == 'minmax':
+        return minmax(y, max_points)
+    return lttb(x, y, max_points)
+
+
+def lttb(x, y, max_points):
+    """Largest-Triangle-Three-Buckets
+    
+    Les points intérieurs sont répartis en max_points - 2 buckets ; dans
+    chacun, on garde le point formant le plus grand triangle avec le point
+    retenu précédemment et la moyenne du bucket suivant. Bornes et moyennes
+    des buckets sont calculées d'un bloc ; seule la sélection, qui dépend du
+    point précédent, parcourt les buckets.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)  # bucket i : [edges[i], edges[i + 1])
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    mean_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Le dernier bucket se compare au dernier point
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+    
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax(y, max_points):
+    """Minimum et maximum de chaque bucket (max_points // 2 buckets)
+    
+    Extrêmes calculés par reduceat puis localisés par comparaison, en temps
+    linéaire : aucun pic ni creux ne disparaît.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 2:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    starts = np.linspace(0, n, max_points // 2 + 1).astype(np.int64)[:-1]
+    sizes = np.diff(np.append(starts, n))
+    bucket = np.repeat(np.arange(len(starts)), sizes)
+    
+    indices = []
+    for extreme in (np.minimum.reduceat(y, starts), np.maximum.reduceat(y, starts)):
+        hits = np.flatnonzero(y == np.repeat(extreme, sizes))
+        # Première occurrence de l'extrême dans chaque bucket
+        _, first = np.unique(bucket[hits], return_index=True)
+        indices.append(hits[first])
+    return np.unique(np.concatenate(indices))
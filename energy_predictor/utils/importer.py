@@ -0,0 +1,133 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+class ConsumptionImporter:
+    """Import en flux d'exports CSV de compteurs
+    
+    Reprend le nettoyage du notebook (doublons, asfreq('h'), interpolation
+    temporelle, écrêtage aux quantiles) lot par lot, en mémoire constante :
+    
+    - les lignes sont retenues dans une fenêtre de réordonnancement de
+      `reorder_hours` avant d'être émises, ce qui absorbe le désordre local
+      du fichier ; une ligne plus ancienne que le dernier point émis est
+      ignorée (doublon ou retard au-delà de la fenêtre) ;
+    - le dernier point émis est reporté sur le lot suivant, si bien que les
+      trous à cheval sur deux lots sont interpolés comme sur le fichier entier ;
+    - les quantiles d'écrêtage sont estimés lors d'une première passe sur un
+      échantillon aléatoire de taille fixe (`sample_size` valeurs).
+    """
+    
+    def __init__(self, db_handler, source, user_id=None, unit='kWh', time_column='Datetime',
+                 value_column=None, chunksize=50000, reorder_hours=168, quantiles=(0.01, 0.99),
+                 sample_size=100000, seed=None):
+        self.db_handler = db_handler
+        self.source = source
+        self.user_id = user_id
+        self.unit = unit
+        self.time_column = time_column
+        self.value_column = value_column
+        self.chunksize = chunksize
+        self.reorder_window = pd.Timedelta(hours=reorder_hours)
+        self.quantiles = quantiles
+        self.sample_size = sample_size
+        self.rng = np.random.default_rng(seed)
+    
+    def import_csv(self, path):
+        """Nettoyer et insérer un fichier ; retourne les compteurs de l'import"""
+        stats = {'rows': 0, 'duplicates': 0, 'late': 0, 'filled': 0, 'clipped': 0, 'inserted': 0}
+        lower, upper = self.clip_bounds(path) if self.quantiles else (None, None)
+        stats['lower'], stats['upper'] = lower, upper
+        
+        for series in self.clean(path, stats):
+            if lower is not None:
+                stats['clipped'] += int(((series < lower) | (series > upper)).sum())
+                series = series.clip(lower, upper)
+            created_at = datetime.utcnow()
+            data_points = [
+                {'timestamp': timestamp, 'value': value, 'unit': self.unit, 'source': self.source,
+                 'user_id': self.user_id, 'created_at': created_at}
+                for timestamp, value in zip(series.index.to_pydatetime().tolist(), series.tolist())
+            ]
+            stats['inserted'] += self.db_handler.insert_consumption(data_points, ordered=False)
+        return stats
+    
+    def clip_bounds(self, path):
+        """Quantiles d'écrêtage estimés sur un échantillon uniforme des valeurs
+        
+        Chaque valeur reçoit une clé aléatoire et seules les `sample_size`
+        plus petites clés sont conservées : l'échantillon reste uniforme quel
+        que soit le nombre de lignes.
+        """
+        keys, sample = np.empty(0), np.empty(0)
+        for chunk in self._read(path):
+            values = chunk['value'].dropna().to_numpy(dtype=np.float64)
+            keys = np.concatenate((keys, self.rng.random(len(values))))
+            sample = np.concatenate((sample, values))
+            if len(keys) > self.sample_size:
+                keep = np.argpartition(keys, self.sample_size)[:self.sample_size]
+                keys, sample = keys[keep], sample[keep]
+        if not len(sample):
+            return None, None
+        lower, upper = np.quantile(sample, self.quantiles)
+        return float(lower), float(upper)
+    
+    def clean(self, path, stats=None):
+        """Séries horaires nettoyées (sans écrêtage), un lot à la fois"""
+        stats = stats if stats is not None else {'rows': 0, 'duplicates': 0, 'late': 0, 'filled': 0}
+        pending = pd.DataFrame({'value': []}, index=pd.DatetimeIndex([], name='timestamp'))
+        carry = None  # dernier point émis (timestamp, valeur)
+        for chunk in self._read(path):
+            stats['rows'] += len(chunk)
+            rows = pd.concat((pending, chunk.dropna()))
+            if carry is not None:
+                late = rows.index <= carry[0]
+                stats['late'] += int(late.sum())
+                rows = rows[~late]
+            # Tri stable : parmi des doublons, la première ligne du fichier est gardée
+            rows = rows.sort_index(kind='stable')
+            if rows.empty:
+                continue
+            watermark = rows.index[-1] - self.reorder_window
+            ready, pending = rows[rows.index <= watermark], rows[rows.index > watermark]
+            series, carry = self._regularize(ready, carry, stats)
+            if series is not None:
+                yield series
+        series, carry = self._regularize(pending, carry, stats)
+        if series is not None:
+            yield series
+    
+    def _regularize(self, rows, carry, stats):
+        """Dédoublonner, passer au pas horaire et interpoler en reprenant le point reporté"""
+        duplicated = rows.index.duplicated(keep='first')
+        stats['duplicates'] += int(duplicated.sum())
+        series = rows['value'][~duplicated]
+        if series.empty:
+            return None, carry
+        if carry is not None:
+            series = pd.concat((pd.Series([carry[1]], index=pd.DatetimeIndex([carry[0]])), series))
+        # asfreq part du premier point : le point reporté garde la grille du fichier
+        series = series.asfreq('h')
+        stats['filled'] += int(series.isna().sum())
+        series = series.interpolate(method='time')
+        if carry is not None:
+            series = series.iloc[1:]
+        if series.empty:
+            return None, carry
+        return series, (series.index[-1], series.iloc[-1])
+    
+    def _read(self, path):
+        """Lots bruts (index timestamp, colonne 'value') lus avec read_csv(chunksize)"""
+        value_column = self.value_column
+        if value_column is None:
+            header = pd.read_csv(path, nrows=0).columns
+            value_column = next(column for column in header if column != self.time_column)
+        for chunk in pd.read_csv(path, usecols=[self.time_column, value_column],
+                                 chunksize=self.chunksize):
+            timestamps = pd.to_datetime(chunk[self.time_column], errors='coerce')
+            values = pd.to_numeric(chunk[value_column], errors='coerce')
+            frame = pd.DataFrame({'value': values.to_numpy(dtype=np.float64)},
+                                 index=pd.DatetimeIndex(timestamps, name='timestamp'))
+            yield frame[frame.index.notna()]
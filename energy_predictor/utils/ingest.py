@@ -0,0 +1,195 @@
+from collections import deque
+from datetime import datetime, timedelta
+import io
+import numbers
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+# Noms longs et compacts acceptés pour chaque champ d'un relevé
+FIELDS = {'timestamp': ('timestamp', 'ts'), 'value': ('value', 'v'),
+          'source': ('source', 's'), 'user_id': ('user_id', 'u')}
+MAX_CLOCK_SKEW = timedelta(minutes=5)
+MIN_TIMESTAMP = datetime(2000, 1, 1)  # plus ancien relevé accepté
+
+
+def parse_readings(body, content_type):
+    """Décoder un lot en DataFrame (JSON lines, ou msgpack lignes/colonnes)
+    
+    msgpack accepte une liste de relevés ou un dictionnaire de colonnes
+    ({'ts': [...], 'v': [...], 's': 'compteur-1'}), une valeur scalaire
+    s'appliquant à tout le lot.
+    """
+    if 'msgpack' in content_type:
+        import msgpack
+        payload = msgpack.unpackb(body, timestamp=3)
+        if isinstance(payload, dict):
+            length = max((len(v) for v in payload.values() if isinstance(v, list)), default=0)
+            payload = {key: value if isinstance(value, list) else [value] * length
+                       for key, value in payload.items()}
+        frame = pd.DataFrame(payload)
+    else:
+        frame = pd.read_json(io.BytesIO(body), lines=True, dtype=False, convert_dates=False)
+    
+    # Nom long ou compact choisi relevé par relevé : un lot peut mélanger les deux
+    columns = {}
+    for field, names in FIELDS.items():
+        column = pd.Series(None, index=frame.index, dtype=object)
+        for name in names:
+            if name in frame.columns:
+                column = column.where(column.notna(), frame[name].astype(object))
+        columns[field] = column
+    return pd.DataFrame(columns)
+
+
+def parse_timestamps(raw):
+    """Horodatages UTC naïfs, élément par élément : nombre = epoch en secondes, texte = ISO 8601
+    
+    Les valeurs d'un autre type ou illisibles donnent NaT.
+    """
+    if pd.api.types.is_numeric_dtype(raw):
+        return pd.to_datetime(raw, unit='s', errors='coerce', utc=True).dt.tz_localize(None)
+    
+    is_number = raw.map(lambda v: isinstance(v, numbers.Real) and not isinstance(v, bool) and v == v)
+    is_text = raw.map(lambda v: isinstance(v, (str, datetime)))
+    parsed = pd.concat([
+        pd.to_datetime(raw[is_number].astype(np.float64), unit='s', errors='coerce', utc=True),
+        pd.to_datetime(raw[is_text], errors='coerce', utc=True, format='mixed')
+    ])
+    return parsed.reindex(raw.index).dt.tz_localize(None)
+
+
+def validate_readings(frame, now=None):
+    """Valider un lot d'un bloc ; retourne (relevés valides, nombre de rejets)
+    
+    Horodatage ISO 8601 ou epoch en secondes (les deux peuvent se mélanger),
+    postérieur à MIN_TIMESTAMP et pas dans le futur ; valeur numérique finie
+    et positive ; source non vide.
+    """
+    now = now or datetime.utcnow()
+    timestamps = parse_timestamps(frame['timestamp'])
+    values = pd.to_numeric(frame['value'], errors='coerce').to_numpy(dtype=np.float64)
+    sources = frame['source']
+    
+    valid = (timestamps.notna().to_numpy()
+             & (timestamps >= MIN_TIMESTAMP).to_numpy()
+             & (timestamps <= now + MAX_CLOCK_SKEW).to_numpy()
+             & np.isfinite(values) & (values >= 0)
+             & sources.map(lambda source: isinstance(source, str) and source != '').to_numpy(dtype=bool))
+    readings = pd.DataFrame({
+        'timestamp': timestamps[valid],
+        'value': values[valid],
+        'source': sources[valid],
+        'user_id': frame['user_id'][valid].astype(object).where(frame['user_id'][valid].notna(), None)
+    })
+    return readings, int((~valid).sum())
+
+
+class IngestBuffer:
+    """Tampon d'écriture différée vers MongoDB
+    
+    Les requêtes d'ingestion ne font que déposer leurs relevés ; un thread
+    les écrit par lots (store_readings, insert_many non ordonné) dès que
+    `batch_size` relevés attendent ou toutes les `flush_interval` secondes.
+    Au-delà de `max_pending` relevés en attente, submit() refuse le lot :
+    l'appelant répond 429 et la passerelle réessaie plus tard. Les cumuls
+    sont ensuite mis à jour pour les seuls relevés écrits, et on_flush est
+    appelé avec eux (invalidation des caches).
+    """
+    
+    def __init__(self, db_handler, batch_size=5000, flush_interval=1.0, max_pending=100000,
+                 on_flush=None):
+        self.db_handler = db_handler
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+        self.queued = 0
+        self.flushed = 0
+        self.dropped = 0  # refusés faute de place
+        self.failed = 0   # perdus sur une erreur d'écriture
+        self.rollup_failed = 0  # écrits, mais absents des cumuls (rebuild-rollups)
+        self._pending = deque()
+        self._condition = threading.Condition()
+        self._stop = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+    
+    def submit(self, readings, unit='kWh'):
+        """Mettre un lot validé en attente ; False si le tampon est plein"""
+        if len(self._pending) + len(readings) > self.max_pending:
+            with self._condition:
+                self.dropped += len(readings)
+            return False
+        created_at = datetime.utcnow()
+        documents = [
+            {'timestamp': timestamp, 'value': value, 'unit': unit, 'source': source,
+             'user_id': user_id, 'created_at': created_at}
+            for timestamp, value, source, user_id in zip(
+                readings['timestamp'].dt.to_pydatetime().tolist(), readings['value'].tolist(),
+                readings['source'].tolist(), readings['user_id'].tolist())
+        ]
+        with self._condition:
+            if len(self._pending) + len(documents) > self.max_pending:
+                self.dropped += len(documents)
+                return False
+            self._pending.extend(documents)
+            self.queued += len(documents)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+        return True
+    
+    def stats(self):
+        """Compteurs de l'ingestion"""
+        with self._condition:
+            pending = len(self._pending)
+        return {'queued': self.queued, 'flushed': self.flushed, 'dropped': self.dropped,
+                'failed': self.failed, 'rollup_failed': self.rollup_failed, 'pending': pending,
+                'max_pending': self.max_pending}
+    
+    def close(self):
+        """Écrire les relevés en attente puis arrêter le thread"""
+        with self._condition:
+            self._stop = True
+            self._condition.notify()
+        self._thread.join()
+    
+    def _run(self):
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self._condition:
+                while not self._stop and len(self._pending) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    self._condition.wait(timeout)
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                stop = self._stop and not self._pending
+            if batch:
+                self._flush(batch)
+            if len(batch) < self.batch_size:
+                deadline = time.monotonic() + self.flush_interval
+            if stop:
+                return
+    
+    def _flush(self, batch):
+        try:
+            stored, error = self.db_handler.store_readings(batch, ordered=False)
+        except Exception as e:
+            stored, error = [], e
+        if error:
+            print(f"Erreur lors de l'écriture des relevés: {len(batch) - len(stored)} rejetés ({error})")
+        self.flushed += len(stored)
+        self.failed += len(batch) - len(stored)
+        if not stored:
+            return
+        
+        try:
+            self.db_handler.update_rollups(stored)
+        except Exception as e:
+            self.rollup_failed += len(stored)
+            print(f"Erreur lors de la mise à jour des cumuls: {e}")
+        if self.on_flush:
+            self.on_flush(stored)
@@ -1,66 +1,261 @@
-from datetime import datetime
+from datetime import datetime, timedelta
+import threading
+import time
+import numpy as np
+
+# Seuils des alertes (prévisions et historiques journaliers, en kWh/jour)
+TREND_UP = 5  # pente au-delà de laquelle la hausse est signalée
+TREND_DOWN = -3
+TREND_MIN_POINTS = 3
+PEAK_FACTOR = 1.5  # pic : valeur supérieure de 50 % à la moyenne de la série
+WEEK_INCREASE = 1.2  # semaine en hausse de plus de 20 % sur la précédente
+
+def trend_slopes(series, min_points=TREND_MIN_POINTS):
+    """Pente des moindres carrés de chaque ligne (unités par pas), NaN ignorés
+    
+    Les positions conservent leur rang : un jour manquant ne décale pas les suivants.
+    """
+    y = np.asarray(series, dtype=float)
+    valid = ~np.isnan(y)
+    x = np.where(valid, np.arange(y.shape[1]), 0.0)
+    y = np.where(valid, y, 0.0)
+    n = valid.sum(axis=1)
+    sx, sy = x.sum(axis=1), y.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = (n * (x * y).sum(axis=1) - sx * sy) / (n * (x * x).sum(axis=1) - sx * sx)
+    return np.where(n >= min_points, slopes, np.nan)
+
+def first_peaks(series, factor=PEAK_FACTOR):
+    """Indice de la première valeur dépassant factor fois la moyenne de sa ligne (-1 sinon)"""
+    y = np.asarray(series, dtype=float)
+    if y.shape[1] == 0:
+        return np.full(len(y), -1)
+    n = (~np.isnan(y)).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.nansum(y, axis=1) / n
+    above = y > factor * mean[:, None]  # faux pour les NaN
+    return np.where(above.any(axis=1), above.argmax(axis=1), -1)
+
+def week_over_week(series, period=7):
+    """Variation (%) de la moyenne des period dernières valeurs sur les period précédentes
+    
+    NaN si l'une des deux fenêtres est incomplète ou si la précédente est nulle.
+    """
+    y = np.asarray(series, dtype=float)
+    if y.shape[1] < 2 * period:
+        return np.full(len(y), np.nan)
+    last = y[:, -period:].mean(axis=1)  # NaN dès qu'une valeur manque
+    previous = y[:, -2 * period:-period].mean(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (last - previous) / previous * 100
+    return np.where(previous > 0, change, np.nan)
+
+# Niveau, titre et message des alertes de tendance, pour des prévisions ou
+# pour des consommations passées (scan_users)
+FORECAST_MESSAGES = {
+    'trend_up': ('warning', 'Tendance à la hausse détectée', 'Augmentation prévue de {slope:.1f} kWh/jour'),
+    'trend_down': ('info', 'Tendance à la baisse détectée', 'Baisse prévue de {slope:.1f} kWh/jour'),
+    'peak': ('critical', 'Pic de consommation prévu', 'Pic de {value:.1f} kWh prévu le jour {day}'),
+}
+HISTORICAL_MESSAGES = {
+    'trend_up': ('warning', 'Consommation en hausse', 'Hausse de {slope:.1f} kWh/jour sur les {days} derniers jours'),
+    'trend_down': ('info', 'Consommation en baisse', 'Baisse de {slope:.1f} kWh/jour sur les {days} derniers jours'),
+    'peak': ('critical', 'Pic de consommation', 'Pic de {value:.1f} kWh le {date:%d/%m/%Y}'),
+}
 
 class NotificationManager:
-    def __init__(self, db_handler):
+    def __init__(self, db_handler, broker=None):
         self.db_handler = db_handler
+        # Broker pub/sub (utils.pubsub.PubSub) du processus, pour les remises à zéro
+        # des badges ; les nouvelles notifications passent par NotificationRelay
+        self.broker = broker
+    
+    @staticmethod
+    def channel(user_id):
+        """Canal pub/sub des notifications d'un utilisateur"""
+        return f'notifications:{user_id}'
+    
+    def create_notification(self, user_id, title, message, level='info', metadata=None):
+        """Enregistrer une notification ; NotificationRelay la pousse aux onglets ouverts"""
+        return self.db_handler.create_notification(user_id, title, message, level, metadata)
+    
+    def mark_all_read(self, user_id):
+        """Marquer toutes les notifications comme lues et remettre les badges à zéro"""
+        result = self.db_handler.mark_all_notifications_read(user_id)
+        if self.broker is not None:
+            self.broker.publish(self.channel(user_id), {'event': 'unread', 'unread_count': 0})
+        return result
     
     def check_trends(self, predictions):
         """Vérifier les tendances dans les prédictions"""
-        notifications = []
+        return [finding for _, _, finding in self.trend_findings(np.atleast_2d(predictions))]
+    
+    def check_historical_trends(self, historical_data):
+        """Vérifier les tendances dans les données historiques"""
+        values = np.array([[d['value'] for d in historical_data]], dtype=float)
+        return [finding for _, _, finding in self.historical_findings(values)]
+    
+    def trend_findings(self, series, dates=None):
+        """Hausse/baisse et premier pic de chaque ligne d'un tableau 2-D (valeurs journalières)
         
-        # Vérifier la tendance à la hausse
-        if len(predictions) >= 3:
-            # Calculer la pente
-            from scipy import stats
-            x = list(range(len(predictions[:3])))
-            slope, _, _, _, _ = stats.linregress(x, predictions[:3])
-            
-            if slope > 5:  # Hausse significative
-                notifications.append({
-                    'level': 'warning',
-                    'title': 'Tendance à la hausse détectée',
-                    'message': f'Augmentation prévue de {slope:.1f} kWh/jour'
-                })
-            elif slope < -3:  # Baisse significative
-                notifications.append({
-                    'level': 'info',
-                    'title': 'Tendance à la baisse détectée',
-                    'message': f'Baisse prévue de {abs(slope):.1f} kWh/jour'
-                })
+        Sans dates, les séries sont des prévisions (« prévu le jour N ») ;
+        avec les dates de leurs colonnes, ce sont des consommations passées
+        et les messages citent la période et la date du pic.
         
-        # Vérifier les pics
-        avg_prediction = sum(predictions) / len(predictions)
-        for i, pred in enumerate(predictions):
-            if pred > avg_prediction * 1.5:  # Pic de plus de 50%
-                notifications.append({
-                    'level': 'critical',
-                    'title': 'Pic de consommation prévu',
-                    'message': f'Pic de {pred:.1f} kWh prévu le jour {i+1}'
-                })
-                break
+        Returns:
+            Liste de (ligne, type, alerte) ; les alertes d'une même ligne
+            gardent l'ordre tendance puis pic
+        """
+        series = np.asarray(series, dtype=float)
+        slopes = trend_slopes(series)
+        peaks = first_peaks(series)
+        messages = FORECAST_MESSAGES if dates is None else HISTORICAL_MESSAGES
+        findings = []
         
-        return notifications
+        for kind, rows in (('trend_up', np.flatnonzero(slopes > TREND_UP)),
+                           ('trend_down', np.flatnonzero(slopes < TREND_DOWN))):
+            for row in rows:
+                level, title, message = messages[kind]
+                findings.append((row, kind, {
+                    'level': level,
+                    'title': title,
+                    'message': message.format(slope=abs(slopes[row]), days=series.shape[1])
+                }))
+        for row in np.flatnonzero(peaks >= 0):
+            day = peaks[row]
+            level, title, message = messages['peak']
+            findings.append((row, 'peak', {
+                'level': level,
+                'title': title,
+                'message': message.format(value=series[row, day], day=day + 1,
+                                          date=dates[day] if dates is not None else None)
+            }))
+        
+        findings.sort(key=lambda finding: finding[0])  # tri stable : ordre par ligne conservé
+        return findings
     
-    def check_historical_trends(self, historical_data):
-        """Vérifier les tendances dans les données historiques"""
-        notifications = []
+    def historical_findings(self, series):
+        """Hausse d'une semaine sur l'autre pour chaque ligne (séries alignées sur le dernier jour)"""
+        change = week_over_week(series)
+        return [(row, 'week_increase', {
+            'level': 'warning',
+            'title': 'Augmentation de consommation',
+            'message': f'Augmentation de {change[row]:.1f}% cette semaine'
+        }) for row in np.flatnonzero(change > (WEEK_INCREASE - 1) * 100)]
+    
+    def scan_users(self, days=28, end_date=None, source=None):
+        """Analyse nocturne des consommations journalières de tous les utilisateurs
+        
+        Une agrégation sur les cumuls journaliers donne un tableau
+        utilisateurs x jours analysé en une passe ; les alertes sont écrites
+        en un seul insert, une seule fois par utilisateur, type et jour.
+        
+        Returns:
+            Nombre de notifications créées
+        """
+        end_date = end_date or datetime.utcnow()
+        user_ids, dates, totals = self.db_handler.get_daily_totals_by_user(
+            end_date - timedelta(days=days), end_date, source=source
+        )
+        if not user_ids:
+            return 0
+        
+        findings = self.historical_findings(totals) + self.trend_findings(totals, dates)
+        day = end_date.strftime('%Y-%m-%d')
+        notifications = [{
+            'user_id': user_ids[row],
+            **finding,
+            'metadata': {'kind': kind, 'day': day},
+            'dedupe_key': f'{user_ids[row]}:{kind}:{day}'
+        } for row, kind, finding in findings if user_ids[row] is not None]
+        return len(self.create_notifications(notifications))
+    
+    def create_notifications(self, notifications):
+        """Écrire un lot de notifications (doublons ignorés) ; NotificationRelay prévient les onglets"""
+        return self.db_handler.create_notifications(notifications)
+
+
+# Recouvrement entre deux passages du relais : une notification écrite par
+# un autre processus (ou une autre horloge) juste avant le passage n'est pas manquée
+RELAY_OVERLAP = timedelta(seconds=10)
+
+class NotificationRelay:
+    """Pousse aux onglets de ce processus les notifications écrites ailleurs
+    
+    Les notifications sont créées par le planificateur (flask
+    run-scheduler) ou la commande scan-trends, chacun dans son processus :
+    la collection notifications sert de canal. Un thread par worker web
+    relit toutes les `interval` secondes, pour les seuls utilisateurs dont
+    un onglet écoute, les notifications créées depuis le passage précédent
+    (index user_id/created_at), puis publie la plus récente de chacun avec
+    son compteur de non lues sur le PubSub local.
+    """
+    
+    def __init__(self, db_handler, broker, interval=2.0):
+        self.db_handler = db_handler
+        self.broker = broker
+        self.interval = interval
+        self.relayed = 0
+        self._listeners = {}  # user_id -> nombre d'onglets abonnés
+        self._since = datetime.utcnow()
+        self._seen = set()  # ids déjà relayés dans la fenêtre de recouvrement
+        self._lock = threading.Lock()
+        self._thread = None
+    
+    def subscribe(self, user_id):
+        """File recevant les événements de user_id ; démarre le relais au premier abonné"""
+        with self._lock:
+            self._listeners[user_id] = self._listeners.get(user_id, 0) + 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return self.broker.subscribe(NotificationManager.channel(user_id))
+    
+    def unsubscribe(self, user_id, subscription):
+        self.broker.unsubscribe(NotificationManager.channel(user_id), subscription)
+        with self._lock:
+            self._listeners[user_id] -= 1
+            if not self._listeners[user_id]:
+                del self._listeners[user_id]
+    
+    def poll(self):
+        """Publier les notifications créées depuis le dernier passage ; retourne le nombre d'envois"""
+        now = datetime.utcnow()
+        with self._lock:
+            user_ids = list(self._listeners)
+        if not user_ids:
+            self._since, self._seen = now, set()
+            return 0
         
-        if len(historical_data) >= 7:
-            # Calculer la moyenne sur 7 jours
-            last_7_days = historical_data[-7:]
-            avg_last_7 = sum(d['value'] for d in last_7_days) / 7
-            
-            # Comparer avec la semaine précédente
-            if len(historical_data) >= 14:
-                previous_7_days = historical_data[-14:-7]
-                avg_previous_7 = sum(d['value'] for d in previous_7_days) / 7
-                
-                if avg_last_7 > avg_previous_7 * 1.2:
-                    increase = ((avg_last_7 - avg_previous_7) / avg_previous_7) * 100
-                    notifications.append({
-                        'level': 'warning',
-                        'title': 'Augmentation de consommation',
-                        'message': f'Augmentation de {increase:.1f}% cette semaine'
-                    })
+        notifications = self.db_handler.get_notifications_since(user_ids, self._since - RELAY_OVERLAP)
+        latest = {}
+        for notification in notifications:
+            if notification['_id'] not in self._seen:
+                latest[notification['user_id']] = notification
+        self._seen = {notification['_id'] for notification in notifications
+                      if notification['created_at'] >= now - RELAY_OVERLAP}
+        self._since = now
         
-        return notifications
\ No newline at end of file
+        for user_id, notification in latest.items():
+            self.broker.publish(NotificationManager.channel(user_id), {
+                'event': 'notification',
+                'notification': {
+                    '_id': str(notification['_id']),
+                    'title': notification['title'],
+                    'message': notification['message'],
+                    'level': notification['level'],
+                    'read': False,
+                    'created_at': notification['created_at'].isoformat()
+                },
+                'unread_count': self.db_handler.count_unread_notifications(user_id)
+            })
+        self.relayed += len(latest)
+        return len(latest)
+    
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Erreur lors du relais des notifications: {e}")
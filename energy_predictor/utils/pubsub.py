@@ -0,0 +1,61 @@
+import queue
+import threading
+
+
+class PubSub:
+    """Pub/sub en mémoire par canal (ex. 'notifications:<user_id>')
+    
+    Remplace localement un broker (Redis pub/sub...) avec la même interface
+    publish/subscribe/unsubscribe : il ne relie que les clients d'un même
+    processus. Chaque abonné a sa propre file bornée ; un client qui ne lit
+    plus perd des messages au lieu de bloquer l'émetteur, et se resynchronise
+    à la reconnexion.
+    """
+    
+    def __init__(self, maxsize=100):
+        self.maxsize = maxsize
+        self.published = 0
+        self.dropped = 0
+        self._channels = {}  # canal -> ensemble des files abonnées
+        self._lock = threading.Lock()
+    
+    def subscribe(self, channel):
+        """Nouvelle file recevant les messages publiés sur channel"""
+        q = queue.Queue(maxsize=self.maxsize)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(q)
+        return q
+    
+    def unsubscribe(self, channel, q):
+        with self._lock:
+            subscribers = self._channels.get(channel)
+            if subscribers is not None:
+                subscribers.discard(q)
+                if not subscribers:
+                    del self._channels[channel]
+    
+    def has_subscribers(self, channel):
+        """Vrai si au moins un client écoute channel (évite de préparer des messages perdus)"""
+        with self._lock:
+            return bool(self._channels.get(channel))
+    
+    def publish(self, channel, message):
+        """Distribuer message aux abonnés de channel, sans bloquer ; retourne le nombre de destinataires"""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+            self.published += 1
+        delivered = 0
+        for q in subscribers:
+            try:
+                q.put_nowait(message)
+                delivered += 1
+            except queue.Full:
+                self.dropped += 1
+        return delivered
+    
+    def stats(self):
+        """Compteurs du broker"""
+        with self._lock:
+            return {'channels': len(self._channels),
+                    'subscribers': sum(len(s) for s in self._channels.values()),
+                    'published': self.published, 'dropped': self.dropped}
@@ -0,0 +1,97 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import threading
+import time
+import uuid
+
+import schedule
+
+
+class ForecastScheduler:
+    """Précalcul périodique des prévisions et exécution de jobs à la demande
+    
+    compute(days) retourne le document de prévision à enregistrer
+    ({'predictions', 'dates', 'metadata'}) et sa version de modèle ;
+    save(user_id, forecast, model_version) l'enregistre.
+    
+    Les tâches périodiques (start/every) ne doivent tourner que dans un seul
+    processus (flask run-scheduler) ; submit() fonctionne dans chaque worker.
+    L'état des jobs est enregistré par jobs (MongoDBHandler) : il se lit
+    depuis n'importe quel worker, pas seulement celui qui a lancé le job.
+    """
+    
+    def __init__(self, compute, save, jobs, interval_minutes=60, horizons=(7,), workers=2):
+        self.compute = compute
+        self.save = save
+        self.jobs = jobs
+        self.interval_minutes = interval_minutes
+        self.horizons = tuple(horizons)
+        self.last_run = None
+        self._scheduler = schedule.Scheduler()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='forecast')
+        self._lock = threading.Lock()
+        self._started = False
+    
+    def start(self, background=True):
+        """Démarrer la planification (une seule fois) ; background=False bloque le thread courant"""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        self._scheduler.every(self.interval_minutes).minutes.do(self.refresh)
+        if background:
+            threading.Thread(target=self._run, daemon=True).start()
+        else:
+            self._run()
+    
+    def every(self, minutes, job, name):
+        """Planifier une tâche périodique supplémentaire (ex. réestimation du modèle)"""
+        def run():
+            try:
+                job()
+            except Exception as e:
+                print(f"Erreur lors de la tâche planifiée {name}: {e}")
+        self._scheduler.every(minutes).minutes.do(run)
+    
+    def refresh(self):
+        """Recalculer et enregistrer les prévisions de chaque horizon"""
+        for days in self.horizons:
+            try:
+                forecast, model_version = self.compute(days)
+                forecast['metadata']['kind'] = 'scheduled'
+                self.save(None, forecast, model_version)
+            except Exception as e:
+                print(f"Erreur lors du précalcul des prévisions ({days} jours): {e}")
+        self.last_run = datetime.utcnow()
+    
+    def submit(self, days, user_id):
+        """Lancer une prévision ad hoc en arrière-plan et retourner l'id du job"""
+        job_id = uuid.uuid4().hex
+        job = {'_id': job_id, 'user_id': user_id, 'days': days, 'status': 'pending',
+               'created_at': datetime.utcnow(), 'result': None, 'error': None}
+        if not self.jobs.create_prediction_job(job):
+            raise RuntimeError("Impossible d'enregistrer le job de prévision")
+        self._executor.submit(self._run_job, job_id, days, user_id)
+        return job_id
+    
+    def get_job(self, job_id):
+        """État d'un job lancé par n'importe quel worker, ou None s'il est inconnu"""
+        return self.jobs.get_prediction_job(job_id)
+    
+    def _run_job(self, job_id, days, user_id):
+        self.jobs.update_prediction_job(job_id, {'status': 'running'})
+        try:
+            forecast, model_version = self.compute(days)
+            forecast['metadata']['kind'] = 'job'
+            self.save(user_id, forecast, model_version)
+            result = {'predictions': forecast['predictions'], 'dates': forecast['dates'],
+                      'model_version': model_version}
+            self.jobs.update_prediction_job(job_id, {'status': 'done', 'result': result})
+        except Exception as e:
+            self.jobs.update_prediction_job(job_id, {'status': 'failed', 'error': str(e)})
+    
+    def _run(self):
+        self.refresh()
+        while True:
+            self._scheduler.run_pending()
+            time.sleep(max(1, min(self._scheduler.idle_seconds or 60, 60)))